@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Intraday Agent: flags exchange netflow anomalies from raw transfers as they are
+ingested, instead of waiting for the daily aggregate.
+
+Usage:
+  python agents/intraday_agent.py --transfers data/lpt_transfers_all_2025-05-01__2025-06-05.csv \
+                                  --config scripts/cex_addresses.json \
+                                  --bucket-minutes 60 --history 168 --z 4.0 --watch
+
+Each transfer is resolved to its exchange group through the label registry
+(--by label|entity) and added to that group's open bucket (inflow / outflow).
+Closed buckets feed a per-group rolling detector over --history buckets (empty
+buckets count as 0); the open bucket is scored on every poll, so a large
+inflow raises an alert within one --poll interval (see common.intraday).
+
+Memory is bounded by groups x history. Detector state, the open bucket, dedup
+keys and the CSV offset are saved to <memory>.state.json after each batch;
+alerts are deduplicated by (group, bucket, detector) in <memory>.sqlite.
+"""
+from __future__ import annotations
+import argparse, json, sys, time
+from datetime import datetime, UTC
+from pathlib import Path
+
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.alert_store import AlertStore  # noqa: E402
+from common.csv_tail import CsvTail  # noqa: E402
+from common.intraday import IntradayAlert, IntradayFlows  # noqa: E402
+from common.labels import LabelRegistry  # noqa: E402
+from common.streaming import DETECTORS  # noqa: E402
+
+def state_path_for(mem_path: Path) -> Path:
+    return mem_path.with_name(mem_path.stem + ".state.json")
+
+def load_state(state_path: Path, args) -> tuple[IntradayFlows, dict | None]:
+    """Fresh state if missing, corrupt, or bucket / history / detector changed."""
+    bucket_s = int(args.bucket_minutes * 60)
+    if state_path.exists():
+        try:
+            st = json.loads(state_path.read_text(encoding="utf-8"))
+            fl = st["flows"]
+            if (fl["bucket_s"], fl["history"], fl["detector"]) == (bucket_s, args.history, args.detector):
+                return IntradayFlows.from_dict(fl, z=args.z, min_scale=args.min_scale), st.get("tail")
+        except Exception:
+            pass
+    return IntradayFlows(bucket_s, args.history, args.detector, args.z, min_scale=args.min_scale), None
+
+def save_state(state_path: Path, flows: IntradayFlows, tail: CsvTail):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"flows": flows.to_dict(), "tail": tail.to_dict()}), encoding="utf-8")
+    tmp.replace(state_path)
+
+def to_transfers(rows, groups: dict, token: str | None = None):
+    """CSV rows -> (ts, src_group, dst_group, amount, dedup_key); rows touching no exchange are dropped."""
+    for r in rows:
+        if token and r.get("token", token) != token:
+            continue
+        src = groups.get((r.get("from") or "").lower())
+        dst = groups.get((r.get("to") or "").lower())
+        if src is None and dst is None:
+            continue
+        value = r.get("value_token") or r.get("value_LPT")
+        try:
+            ts, amount = int(float(r["timeStamp"])), float(value)
+        except (KeyError, TypeError, ValueError):
+            continue
+        key = (r.get("hash", ""), r.get("token", ""), r.get("from", ""), r.get("to", ""), value)
+        yield ts, src, dst, amount, key
+
+def write_report(alerts: list[IntradayAlert], out_docs: Path):
+    out_docs.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now(UTC).strftime("%Y-%m-%d_%H%M%SZ")
+    md = out_docs / f"intraday_report_{ts}.md"
+    i = 1
+    while md.exists():
+        i += 1
+        md = out_docs / f"intraday_report_{ts}_{i}.md"
+    lines = [
+        f"# Intraday Netflow Report — {ts} (UTC)",
+        "",
+        "| group | bucket | zscore | netflow | inflow | outflow | center | scale |",
+        "|-------|--------|--------|---------|--------|---------|--------|-------|",
+    ]
+    for a in alerts:
+        lines.append(
+            f"| {a.group} | {a.start} | {a.zscore:.3f} | {int(a.netflow):,} | {int(a.inflow):,} | "
+            f"{int(a.outflow):,} | {int(a.center):,} | {a.scale:.1f} |".replace(",", " ")
+        )
+    lines += [
+        "",
+        f"> Rule: |zscore| >= threshold on the open {alerts[0].bucket_s // 60}-minute bucket vs the previous "
+        "buckets of the same group. Generated automatically by `intraday_agent.py`.",
+    ]
+    md.write_text("\n".join(lines), encoding="utf-8")
+    return md
+
+def record_alerts(store: AlertStore, alerts: list[IntradayAlert], out_docs: Path):
+    if not alerts:
+        return []
+    with store.transaction():
+        added = store.add_many((a.group, a.start, a.detector, a.zscore, a.netflow) for a in alerts)
+        keys = {(g, d, det) for g, d, det, *_ in added}
+        new = [a for a in alerts if (a.group, a.start, a.detector) in keys]
+        if new:
+            report = write_report(new, out_docs)
+            print(f"[ALERT] {len(new)} intraday anomalies. Report: {report}")
+    return new
+
+def process(tail: CsvTail, flows: IntradayFlows, groups: dict, args, store: AlertStore,
+            out_docs: Path, state_path: Path):
+    reloaded, raw = tail.read()
+    if reloaded:
+        print(f"[WATCH] (re)loaded {tail.path} ({len(raw)} rows)")
+    alerts = flows.ingest(to_transfers(raw, groups, args.token))
+    record_alerts(store, alerts, out_docs)
+    save_state(state_path, flows, tail)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--transfers", required=True, help="raw transfers CSV (get_lpt_multi_cex.py output)")
+    p.add_argument("--config", required=True, nargs="+", help="exchange address JSON(s), as in netflow_multi_cex.py")
+    p.add_argument("--by", choices=["label", "entity"], default="label")
+    p.add_argument("--token", default=None, help="keep only this token (multi-token CSV)")
+    p.add_argument("--bucket-minutes", type=float, default=60, help="flow bucket size (minutes)")
+    p.add_argument("--history", type=int, default=168, help="baseline length, in buckets")
+    p.add_argument("--z", type=float, default=4.0)
+    p.add_argument("--detector", choices=list(DETECTORS), default="zscore")
+    p.add_argument("--min-scale", type=float, default=0.0,
+                   help="scale floor in token units (default 0 = none). Without a floor, a group whose "
+                        "baseline is flat (zero MAD/std, e.g. a quiet exchange) is never scored, so routine "
+                        "transfers there do not alert; with one, |netflow - center| >= z * min_scale alerts")
+    p.add_argument("--memory", default=".agent_memory/intraday_agent.sqlite",
+                   help="alert store; state is saved to <memory>.state.json")
+    p.add_argument("--out_docs", default="docs")
+    p.add_argument("--watch", action="store_true", help="keep polling the transfers CSV")
+    p.add_argument("--poll", type=float, default=5.0, help="stat() interval in seconds when --watch")
+    args = p.parse_args()
+
+    mem_path = Path(args.memory)
+    state_path = state_path_for(mem_path)
+    store = AlertStore(mem_path.with_suffix(".sqlite"))
+    groups = LabelRegistry.from_json(*args.config).address_map(by=args.by)
+    flows, tail_state = load_state(state_path, args)
+    tail = CsvTail.from_dict(tail_state, Path(args.transfers))
+    out_docs = Path(args.out_docs)
+
+    while True:
+        if tail.changed():
+            process(tail, flows, groups, args, store, out_docs, state_path)
+        if not args.watch:
+            break
+        time.sleep(max(args.poll, 0.1))
+    if flows.late:
+        print(f"[INFO] {flows.late} late transfers ignored (older than the open bucket)")
+
+if __name__ == "__main__":
+    main()
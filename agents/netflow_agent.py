@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Netflow Agent: watches daily total netflow CSV, flags anomalies (|z|>=Z),
-deduplicates by date via JSON memory, and writes a small daily report.
+deduplicates alerts by (series, date, detector) in a SQLite alert store, and
+writes a small daily report.
 
 Usage:
   python agents/netflow_agent.py --csv data/netflow_daily_total_2025-05-01__2025-06-05.csv \
@@ -9,15 +10,55 @@ Usage:
                                  --memory .agent_memory/netflow_agent.json \
                                  --out_docs docs
 
+Rolling statistics are streamed: the window buffer, Welford sums and the last
+processed date are saved next to the memory file (<memory>.state.json), so each
+run only folds in the rows appended since the previous one (O(1) per new row).
+
+--detector mad swaps mean/std for a rolling median/MAD (robust to the very
+spikes being flagged); its sorted window is persisted the same way (O(log w)
+search per new row).
+
+Alert memory lives in <memory>.sqlite (common.alert_store): appends and lookups
+never rewrite the history, and --retention-days / --rotate-monthly prune old
+entries with an indexed DELETE. A legacy JSON memory ({"seen_dates": [...]})
+found at --memory is imported once, then renamed to *.json.migrated.
+
+Regime changes (--changepoint cusum|bocpd, repeatable) complement the spike
+detector: a two-sided CUSUM or a truncated Bayesian online change-point detector
+(common.changepoint) is fed each new netflow value (O(1) / bounded work per row)
+and reports lasting level shifts in a "Regime changes" section of the same
+report. Their state is persisted with the rolling stats.
+
+Manifest mode (--manifest) monitors many series (total, per exchange via
+split_by, per token...) with one or more detectors each, from one long-lived
+process: an asyncio task per CSV tails it and feeds the per-series monitors,
+whose rolling state is kept in memory and saved to <memory>.manifest.state.json.
+
+Watch mode (--watch) polls the CSV with os.stat every --poll seconds and reads
+only the bytes appended since the saved offset; the file is fully reloaded only
+when it was rewritten (see common.csv_tail). Idle cost is one stat() per poll.
+
 Tip:
   Schedule via Task Scheduler (Windows) or cron (Linux) to run once per day.
 """
 from __future__ import annotations
-import argparse, csv, json, time, shutil
-from dataclasses import dataclass
-from datetime import datetime, UTC
+import argparse, asyncio, csv, json, sys, time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, UTC
 from pathlib import Path
-import math
+
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.streaming import DETECTORS, RollingStats, make_detector  # noqa: E402
+from common.csv_tail import CsvTail  # noqa: E402
+from common.alert_store import AlertStore  # noqa: E402
+from common.changepoint import CHANGEPOINTS, make_changepoint  # noqa: E402
 
 @dataclass
 class Anom:
@@ -28,59 +69,127 @@ class Anom:
     roll_mean: float
     roll_std: float
     zscore: float
+    detector: str = "zscore"
+    series: str = "total"
+
+@dataclass
+class Regime:
+    date: str
+    netflow: float
+    direction: str
+    run: int          # rows since the estimated change, current row included
+    score: float      # CUSUM statistic, or BOCPD probability of a recent change
+    before: float
+    after: float
+    method: str = "cusum"
+    series: str = "total"
+
+@dataclass
+class AgentState:
+    stats: RollingStats  # or RollingMedianMAD with --detector mad
+    last_date: str | None = None
+    tail: dict | None = field(default=None)
+    changepoints: dict = field(default_factory=dict)  # kind -> Cusum / Bocpd
+
+def normalize_row(row: dict) -> dict:
+    # tolerate different colnames; normalize
+    date = row.get("date") or row.get("Date") or row.get("timestamp") or row.get("day")
+    inflow = float(row.get("inflow", row.get("Inflow", 0)) or 0)
+    outflow = float(row.get("outflow", row.get("Outflow", 0)) or 0)
+    netflow = float(row.get("netflow", row.get("Netflow", inflow - outflow)) or 0)
+    return {"date": date, "inflow": inflow, "outflow": outflow, "netflow": netflow}
 
 def read_daily_total(csv_path: Path):
-    rows = []
     with open(csv_path, newline='', encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            # tolerate different colnames; normalize
-            date = row.get("date") or row.get("Date") or row.get("timestamp") or row.get("day")
-            inflow = float(row.get("inflow", row.get("Inflow", 0)) or 0)
-            outflow = float(row.get("outflow", row.get("Outflow", 0)) or 0)
-            netflow = float(row.get("netflow", row.get("Netflow", inflow - outflow)) or 0)
-            rows.append({"date": date, "inflow": inflow, "outflow": outflow, "netflow": netflow})
+        rows = [normalize_row(row) for row in csv.DictReader(f)]
     # sort by date
     rows.sort(key=lambda x: x["date"])
     return rows
 
 def roll_mean_std(vals, win):
-    out = []
-    for i in range(len(vals)):
-        if i+1 < win:
-            out.append((None, None))
-        else:
-            window = vals[i+1-win:i+1]
-            m = sum(window)/win
-            var = sum((v-m)**2 for v in window)/win
-            out.append((m, math.sqrt(var)))
-    return out
+    rs = RollingStats(win)
+    return [rs.push(v) for v in vals]
 
-def compute_zscore(rows, win):
-    net = [r["netflow"] for r in rows]
-    stats = roll_mean_std(net, win)
-    for r, (m, s) in zip(rows, stats):
-        r["roll_mean"] = m
-        r["roll_std"] = s
-        if m is None or (s is None) or s == 0:
-            r["zscore"] = None
-        else:
-            r["zscore"] = (r["netflow"] - m) / s
+def compute_zscore(rows, win, stats: RollingStats | None = None, detector: str = "zscore"):
+    """
+    Annotate rows with roll_mean/roll_std/zscore (median / scaled MAD for detector="mad").
+    With `stats`, rows are streamed into it (O(1) or O(log w) each); without, the whole
+    history goes through the vectorized kernel (common.rolling, numpy loaded lazily).
+    """
+    if stats is not None:
+        for r in rows:
+            r["roll_mean"], r["roll_std"], r["zscore"] = stats.zscore(r["netflow"])
+        return rows
+    if not rows:
+        return rows
+    from common.rolling import rolling_detector
+    z, m, s = rolling_detector([r["netflow"] for r in rows], win, detector=detector,
+                               min_periods=win, zero_std="nan")
+    for r, zi, mi, si in zip(rows, z.tolist(), m.tolist(), s.tolist()):
+        r["roll_mean"] = None if mi != mi else mi
+        r["roll_std"] = None if si != si else si
+        r["zscore"] = None if zi != zi else zi
     return rows
 
-def load_memory(mem_path: Path):
-    if mem_path.exists():
+def state_path_for(mem_path: Path) -> Path:
+    return mem_path.with_name(mem_path.stem + ".state.json")
+
+def store_path_for(mem_path: Path) -> Path:
+    return mem_path if mem_path.suffix in (".sqlite", ".db") else mem_path.with_suffix(".sqlite")
+
+def changepoint_specs(args, kinds=None) -> dict:
+    """{kind: params} for the change-point detectors requested (default: --changepoint)."""
+    params = {"cusum": {"warmup": args.cp_warmup, "k": args.cusum_k, "h": args.cusum_h},
+              "bocpd": {"warmup": args.cp_warmup, "hazard": args.bocpd_hazard}}
+    return {kind: params[kind] for kind in dict.fromkeys(args.changepoint or [] if kinds is None else kinds)}
+
+def restore_changepoints(specs: dict, saved: dict | None) -> dict:
+    """Change-point detectors for specs ({kind: params}); saved state is reused when its params match."""
+    out = {}
+    for kind, params in specs.items():
+        cp = make_changepoint(kind, **params)
+        st = (saved or {}).get(kind)
+        if st and all(st.get(k) == v for k, v in cp.params.items()):
+            cp = CHANGEPOINTS[kind].from_dict(st)
+        out[kind] = cp
+    return out
+
+def load_state(state_path: Path, win: int, detector: str = "zscore", changepoints: dict | None = None) -> AgentState:
+    """Fresh state if missing, corrupt, or win / detector changed."""
+    if state_path.exists():
         try:
-            return json.loads(mem_path.read_text(encoding="utf-8"))
+            st = json.loads(state_path.read_text(encoding="utf-8"))
+            if int(st["rolling"]["win"]) == win and st.get("detector", "zscore") == detector:
+                stats = DETECTORS[detector].from_dict(st["rolling"])
+                return AgentState(stats, st.get("last_date"), st.get("tail"),
+                                  restore_changepoints(changepoints or {}, st.get("changepoints")))
         except Exception:
-            return {"seen_dates": []}
-    return {"seen_dates": []}
+            pass
+    return AgentState(make_detector(detector, win), changepoints=restore_changepoints(changepoints or {}, None))
 
-def save_memory(mem_path: Path, mem):
-    mem_path.parent.mkdir(parents=True, exist_ok=True)
-    mem_path.write_text(json.dumps(mem, indent=2), encoding="utf-8")
+def save_state(state_path: Path, state: AgentState):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state_path.with_suffix(".tmp")
+    detector = next(k for k, cls in DETECTORS.items() if isinstance(state.stats, cls))
+    payload = {"last_date": state.last_date, "detector": detector,
+               "rolling": state.stats.to_dict(), "tail": state.tail}
+    if state.changepoints:
+        payload["changepoints"] = {k: cp.to_dict() for k, cp in state.changepoints.items()}
+    tmp.write_text(json.dumps(payload), encoding="utf-8")
+    tmp.replace(state_path)
 
-def detect_anomalies(rows, z_thresh: float):
+def open_store(mem_path: Path, series: str, detector: str) -> AlertStore:
+    """Open the alert store next to --memory, importing a legacy JSON memory once."""
+    store = AlertStore(store_path_for(mem_path))
+    if mem_path.suffix == ".json" and mem_path.exists():
+        n = store.import_seen_dates(mem_path, series, detector)
+        print(f"[MIGRATE] {n} seen dates imported from {mem_path} into {store.path}")
+    return store
+
+def retention_cutoff(last_date: str, days: int) -> str:
+    return (date.fromisoformat(str(last_date)[:10]) - timedelta(days=days)).isoformat()
+
+def detect_anomalies(rows, z_thresh: float, detector: str = "zscore", series: str = "total"):
     out = []
     for r in rows:
         z = r.get("zscore")
@@ -94,84 +203,413 @@ def detect_anomalies(rows, z_thresh: float):
                 netflow=r["netflow"],
                 roll_mean=r["roll_mean"],
                 roll_std=r["roll_std"],
-                zscore=z
+                zscore=z,
+                detector=detector,
+                series=series,
             ))
     return out
 
-def write_report(anoms: list[Anom], out_docs: Path):
-    if not anoms:
+def detect_regimes(rows, changepoints: dict, series: str = "total") -> list[Regime]:
+    """Stream the rows' netflow through each change-point detector; one Regime per detected shift."""
+    out = []
+    for r in rows:
+        for kind, cp in changepoints.items():
+            shift = cp.update(r["netflow"])
+            if shift is not None:
+                out.append(Regime(r["date"], r["netflow"], shift.direction, shift.run, shift.score,
+                                  shift.before, shift.after, kind, series))
+    return out
+
+def write_report(anoms: list[Anom], out_docs: Path, regimes: list[Regime] = ()):
+    if not anoms and not regimes:
         return None
     out_docs.mkdir(parents=True, exist_ok=True)
     ts = datetime.now(UTC).strftime("%Y-%m-%d_%H%M%SZ")
     md = out_docs / f"agent_report_{ts}.md"
-    lines = [
-        f"# Netflow Agent Report — {ts} (UTC)",
-        "",
-        "| date | zscore | netflow | inflow | outflow | roll_mean | roll_std |",
-        "|------|--------|---------|--------|---------|-----------|----------|",
-    ]
+    i = 1
+    while md.exists():  # several sources alerting within the same second
+        i += 1
+        md = out_docs / f"agent_report_{ts}_{i}.md"
+    # one series/detector: historical layout; several (manifest mode): keyed rows
+    mixed = len({(a.series, a.detector) for a in anoms}) > 1
+    if mixed:
+        center, scale, key = "center", "scale", "| series | detector "
+    else:
+        center, scale = ("roll_median", "roll_mad") if anoms and anoms[0].detector == "mad" else ("roll_mean", "roll_std")
+        key = ""
+    title = f"# Netflow Agent Report — {ts} (UTC)"
+    all_series = {a.series for a in anoms} | {g.series for g in regimes}
+    if not mixed and len(all_series) == 1 and next(iter(all_series)) != "total":
+        title += f" — {next(iter(all_series))}"
+    lines = [title, ""]
+    if anoms:
+        lines += [
+            f"{key}| date | zscore | netflow | inflow | outflow | {center} | {scale} |",
+            f"{'|--------|----------' if mixed else ''}"
+            f"|------|--------|---------|--------|---------|{'-' * (len(center) + 2)}|{'-' * (len(scale) + 2)}|",
+        ]
     for a in anoms:
+        prefix = f"| {a.series} | {a.detector} " if mixed else ""
         lines.append(
+            prefix +
             f"| {a.date} | {a.zscore:.3f} | {int(a.netflow):,} | {int(a.inflow):,} | {int(a.outflow):,} | "
             f"{int(a.roll_mean):,} | {a.roll_std:.1f} |".replace(",", " ")
         )
-    lines += [
-        "",
-        "> Rule: |zscore| >= threshold triggers an alert. This file was generated automatically by `netflow_agent.py`.",
-    ]
+    if regimes:
+        if anoms:
+            lines.append("")
+        lines += [
+            "## Regime changes",
+            "",
+            "| series | method | date | direction | run | score | netflow | before | after |",
+            "|--------|--------|------|-----------|-----|-------|---------|--------|-------|",
+        ]
+        for g in regimes:
+            lines.append(
+                f"| {g.series} | {g.method} | {g.date} | {g.direction} | {g.run} | {g.score:.3f} | "
+                f"{int(g.netflow):,} | {int(g.before):,} | {int(g.after):,} |".replace(",", " ")
+            )
+    lines.append("")
+    if anoms:
+        lines.append("> Rule: |zscore| >= threshold triggers an alert. "
+                     "This file was generated automatically by `netflow_agent.py`.")
+    if regimes:
+        lines.append("> Regime changes: lasting level shifts (CUSUM / Bayesian online change-point), "
+                     "run = rows since the estimated change. Generated by `netflow_agent.py`.")
     md.write_text("\n".join(lines), encoding="utf-8")
     return md
 
+def advance(rows, state: AgentState, win: int, detector: str):
+    """Annotate and return the rows newer than state.last_date, folding them into state.stats."""
+    new_rows = [r for r in rows if state.last_date is None or r["date"] > state.last_date]
+    new_rows.sort(key=lambda x: x["date"])
+    if state.last_date is None and not len(state.stats):
+        # backfill: whole history in one vectorized pass, then seed the stream
+        new_rows = compute_zscore(new_rows, win, detector=detector)
+        state.stats = DETECTORS[detector].from_dict(
+            {"win": win, "buf": [r["netflow"] for r in new_rows[-win:]]})
+    else:
+        new_rows = compute_zscore(new_rows, win, state.stats)
+    return new_rows
+
+def record_alerts(store: AlertStore, anoms: list[Anom], out_docs: Path,
+                  regimes: list[Regime] = ()) -> list[Anom]:
+    """
+    Store alerts and report the new ones; both are committed together (rolled back if the report fails).
+    Regime changes share the store, keyed by (series, date, method) with the score in the zscore column.
+    """
+    with store.transaction():
+        added = store.add_many([(a.series, a.date, a.detector, a.zscore, a.netflow) for a in anoms] +
+                               [(g.series, g.date, g.method, g.score, g.netflow) for g in regimes])
+        new_keys = {(s, d, det) for s, d, det, *_ in added}
+        new_anoms = [a for a in anoms if (a.series, a.date, a.detector) in new_keys]
+        new_regimes = [g for g in regimes if (g.series, g.date, g.method) in new_keys]
+        if new_anoms or new_regimes:
+            report = write_report(new_anoms, out_docs, new_regimes)
+            extra = f", {len(new_regimes)} regime changes" if new_regimes else ""
+            print(f"[ALERT] {len(new_anoms)} new anomalies{extra}. Report: {report}")
+        else:
+            print("[OK] No new anomalies.")
+    return new_anoms
+
+def run_once(rows, state: AgentState, args, store: AlertStore, out_docs: Path, state_path: Path):
+    """Fold rows newer than state.last_date into the rolling stats, alert, persist."""
+    new_rows = advance(rows, state, args.win, args.detector)
+    regimes = detect_regimes(new_rows, state.changepoints, args.series)
+    record_alerts(store, detect_anomalies(new_rows, args.z, args.detector, args.series), out_docs, regimes)
+    # state is committed only once alerts for the new rows are recorded
+    if new_rows:
+        state.last_date = new_rows[-1]["date"]
+    if new_rows or state.tail is not None:
+        save_state(state_path, state)
+    if args.retention_days and state.last_date:
+        store.prune(retention_cutoff(state.last_date, args.retention_days), series=args.series)
+
+def watch(csv_path: Path, state: AgentState, args, store: AlertStore, out_docs: Path, state_path: Path):
+    """Poll the CSV; only appended bytes are read unless the file was rewritten."""
+    tail = CsvTail.from_dict(state.tail, csv_path)
+    while True:
+        if tail.changed():
+            reloaded, raw = tail.read()
+            if reloaded:
+                print(f"[WATCH] (re)loaded {csv_path} ({len(raw)} rows)")
+            state.tail = tail.to_dict()
+            run_once([normalize_row(r) for r in raw], state, args, store, out_docs, state_path)
+        time.sleep(max(args.poll, 0.1))
+
+# ---------------------------------------------------------------- manifest mode
+@dataclass
+class Monitor:
+    series: str
+    detector: str
+    win: int
+    z: float
+    state: AgentState
+
+    @property
+    def key(self) -> str:
+        return f"{self.series}|{self.detector}|{self.win}"
+
+@dataclass
+class RegimeMonitor:
+    series: str
+    changepoints: dict  # kind -> Cusum / Bocpd
+    last_date: str | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.series}|regime"
+
+@dataclass
+class Source:
+    name: str
+    csv: Path
+    col: str = "netflow"
+    split_by: str | None = None
+    only: set | None = None
+    poll: float = 5.0
+    detectors: list = field(default_factory=list)  # [(detector, win, z), ...]
+    changepoints: dict = field(default_factory=dict)  # {kind: params}
+    tail: CsvTail | None = None
+
+def load_manifest(path: Path, args) -> list[Source]:
+    """
+    Manifest JSON (CLI --win/--z/--detector/--poll are the fallback defaults):
+
+      {"defaults": {"win": 7, "z": 2.0, "poll": 5},
+       "series": [
+         {"name": "total", "csv": "data/netflow_daily_total_<p>.csv",
+          "detectors": ["zscore", {"detector": "mad", "win": 14, "z": 3.0}],
+          "changepoints": ["cusum", {"changepoint": "bocpd", "hazard": 0.01}]},
+         {"name": "cex", "csv": "data/netflow_daily_by_exchange_<p>.csv",
+          "split_by": "exchange", "only": ["binance14", "kraken4"], "col": "netflow"}]}
+
+    Each (detector, win) pair may appear once per series (one monitor each).
+    A split_by source yields one series per value ("cex:binance14", ...), created
+    as rows for it show up. "changepoints" defaults to the CLI --changepoint list;
+    unspecified parameters come from the CLI (--cp-warmup, --cusum-k, ...).
+    """
+    m = json.loads(Path(path).read_text(encoding="utf-8"))
+    d = {"win": args.win, "z": args.z, "detector": args.detector, "poll": args.poll, **m.get("defaults", {})}
+    cp_defaults = changepoint_specs(args, CHANGEPOINTS)
+    sources, names = [], set()
+    for spec in m["series"]:
+        if spec["name"] in names:
+            raise ValueError(f"Duplicate series name in manifest: {spec['name']}")
+        names.add(spec["name"])
+        dets = []
+        for det in spec.get("detectors", [d["detector"]]):
+            det = {"detector": det} if isinstance(det, str) else det
+            kind = det.get("detector", d["detector"])
+            if kind not in DETECTORS:
+                raise ValueError(f"Unknown detector {kind!r} for series {spec['name']}")
+            win = int(det.get("win", spec.get("win", d["win"])))
+            if any(k == kind and w == win for k, w, _ in dets):
+                # one monitor (rolling state, alert key) per (detector, win): a second
+                # entry would feed the same rows twice and overwrite the threshold
+                raise ValueError(f"Duplicate detector {kind!r} with win={win} for series {spec['name']}")
+            dets.append((kind, win, float(det.get("z", spec.get("z", d["z"])))))
+        cps = {}
+        for cp in spec.get("changepoints", d.get("changepoints", args.changepoint or [])):
+            cp = {"changepoint": cp} if isinstance(cp, str) else dict(cp)
+            kind = cp.pop("changepoint", None)
+            if kind not in CHANGEPOINTS:
+                raise ValueError(f"Unknown changepoint {kind!r} for series {spec['name']}")
+            cps[kind] = {**cp_defaults[kind], **cp}
+        sources.append(Source(
+            name=spec["name"], csv=Path(spec["csv"]), col=spec.get("col", "netflow"),
+            split_by=spec.get("split_by"), only=set(spec["only"]) if spec.get("only") else None,
+            poll=float(spec.get("poll", d["poll"])), detectors=dets, changepoints=cps,
+        ))
+    return sources
+
+def manifest_state_path_for(mem_path: Path) -> Path:
+    return mem_path.with_name(mem_path.stem + ".manifest.state.json")
+
+class ManifestAgent:
+    """
+    Evaluates every (series, detector) of a manifest in one process. Each CSV is
+    tailed once (one asyncio task per file, one stat() per poll); rows are routed
+    to per-series monitors kept in memory, so an extra series only costs its
+    O(1) / O(log w) stream updates when new rows arrive.
+    """
+
+    def __init__(self, sources: list[Source], store: AlertStore, out_docs: Path, state_path: Path,
+                 retention_days: int | None = None):
+        self.sources = sources
+        self.store = store
+        self.out_docs = out_docs
+        self.state_path = state_path
+        self.retention_days = retention_days
+        self.monitors: dict[str, Monitor] = {}
+        self.regimes: dict[str, RegimeMonitor] = {}
+        st = {}
+        if state_path.exists():
+            try:
+                st = json.loads(state_path.read_text(encoding="utf-8"))
+            except Exception:
+                st = {}
+        self.saved: dict = st.get("monitors", {})
+        tails = st.get("tails", {})
+        for src in sources:
+            src.tail = CsvTail.from_dict(tails.get(str(src.csv)), src.csv)
+
+    def monitor(self, series: str, detector: str, win: int, z: float) -> Monitor:
+        key = f"{series}|{detector}|{win}"
+        mon = self.monitors.get(key)
+        if mon is None:
+            saved = self.saved.get(key)
+            if saved:
+                state = AgentState(DETECTORS[detector].from_dict(saved["rolling"]), saved.get("last_date"))
+            else:
+                state = AgentState(make_detector(detector, win))
+            mon = self.monitors[key] = Monitor(series, detector, win, z, state)
+        mon.z = z
+        return mon
+
+    def regime_monitor(self, series: str, specs: dict) -> RegimeMonitor:
+        key = f"{series}|regime"
+        mon = self.regimes.get(key)
+        if mon is None:
+            saved = self.saved.get(key) or {}
+            mon = self.regimes[key] = RegimeMonitor(
+                series, restore_changepoints(specs, saved.get("changepoints")), saved.get("last_date"))
+        return mon
+
+    def save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        payload = {"monitors": self.saved, "tails": {str(s.csv): s.tail.to_dict() for s in self.sources}}
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        tmp.replace(self.state_path)
+
+    def process(self, src: Source):
+        """Read what was appended to src.csv, update its monitors, alert, persist."""
+        reloaded, raw = src.tail.read()
+        if reloaded:
+            print(f"[WATCH] (re)loaded {src.csv} ({len(raw)} rows)")
+        groups: dict = {}
+        for r in raw:
+            key = r.get(src.split_by, "") if src.split_by else None
+            if src.only is not None and key not in src.only:
+                continue
+            row = normalize_row(r)
+            if src.col != "netflow":
+                row["netflow"] = float(r.get(src.col) or 0)
+            groups.setdefault(key, []).append(row)
+
+        anoms, regimes, touched, shifted = [], [], [], []
+        for key, rows in groups.items():
+            series = src.name if key is None else f"{src.name}:{key}"
+            for detector, win, z in src.detectors:
+                mon = self.monitor(series, detector, win, z)
+                new_rows = advance([dict(r) for r in rows], mon.state, win, detector)
+                anoms += detect_anomalies(new_rows, z, detector, series)
+                touched.append((mon, new_rows))
+            if src.changepoints:
+                rmon = self.regime_monitor(series, src.changepoints)
+                new_rows = sorted((r for r in rows if rmon.last_date is None or r["date"] > rmon.last_date),
+                                  key=lambda r: r["date"])
+                regimes += detect_regimes(new_rows, rmon.changepoints, series)
+                shifted.append((rmon, new_rows))
+        if touched or shifted:
+            record_alerts(self.store, anoms, self.out_docs, regimes)
+        for rmon, new_rows in shifted:
+            if new_rows:
+                rmon.last_date = new_rows[-1]["date"]
+            self.saved[rmon.key] = {"last_date": rmon.last_date,
+                                    "changepoints": {k: cp.to_dict() for k, cp in rmon.changepoints.items()}}
+        for mon, new_rows in touched:
+            if new_rows:
+                mon.state.last_date = new_rows[-1]["date"]
+            self.saved[mon.key] = {"last_date": mon.state.last_date, "rolling": mon.state.stats.to_dict()}
+            if self.retention_days and mon.state.last_date:
+                self.store.prune(retention_cutoff(mon.state.last_date, self.retention_days), series=mon.series)
+        self.save()
+
+    async def _watch(self, src: Source):
+        while True:
+            if src.tail.changed():
+                self.process(src)
+            await asyncio.sleep(max(src.poll, 0.1))
+
+    async def run(self, watch: bool = False):
+        if not watch:
+            for src in self.sources:
+                if src.tail.changed():
+                    self.process(src)
+            return
+        await asyncio.gather(*(self._watch(src) for src in self.sources))
+
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--csv", required=True, help="daily total netflow CSV")
+    p.add_argument("--csv", help="daily total netflow CSV")
+    p.add_argument("--manifest", help="JSON manifest of series/detectors to monitor in one process")
     p.add_argument("--win", type=int, default=7)
     p.add_argument("--z", type=float, default=2.0)
-    p.add_argument("--memory", default=".agent_memory/netflow_agent.json")
+    p.add_argument("--detector", choices=list(DETECTORS), default="zscore",
+                   help="zscore (rolling mean/std) or mad (rolling median/MAD, robust)")
+    p.add_argument("--memory", default=".agent_memory/netflow_agent.json",
+                   help="alert memory; the store is <memory>.sqlite (a legacy .json is migrated)")
+    p.add_argument("--series", default="total", help="series name used as the alert key")
+    p.add_argument("--retention-days", type=int, default=None,
+                   help="drop stored alerts older than N days before the last processed date")
     p.add_argument("--out_docs", default="docs")
     p.add_argument("--loop", action="store_true", help="loop forever (demo)")
     p.add_argument("--sleep", type=int, default=3600, help="sleep seconds when --loop")
+    p.add_argument("--watch", action="store_true",
+                   help="watch the CSV and process appended rows as they land (implies a loop)")
+    p.add_argument("--poll", type=float, default=5.0, help="stat() interval in seconds when --watch")
+    p.add_argument("--changepoint", action="append", choices=list(CHANGEPOINTS),
+                   help="also report regime changes (repeatable): cusum and/or bocpd")
+    p.add_argument("--cp-warmup", type=int, default=30, help="rows used to learn each regime's baseline")
+    p.add_argument("--cusum-k", type=float, default=1.0, help="CUSUM slack, in std (half the shift to detect)")
+    p.add_argument("--cusum-h", type=float, default=5.0, help="CUSUM decision threshold, in std")
+    p.add_argument("--bocpd-hazard", type=float, default=0.004,
+                   help="BOCPD prior probability of a change at each row (1 / expected regime length)")
     p.add_argument("--rotate-monthly", action="store_true",
-                   help="archive memory & reports per month")
+                   help="write reports per month and forget alerts dated before the current month")
     args = p.parse_args()
+    if not args.csv and not args.manifest:
+        p.error("one of --csv or --manifest is required")
 
-    csv_path = Path(args.csv)
     mem_path = Path(args.memory)
     out_docs = Path(args.out_docs)
+    state_path = state_path_for(mem_path)
+
+    store = open_store(mem_path, args.series, args.detector)
 
     # Monthly rotation
     if args.rotate_monthly:
         today = datetime.now(UTC)
         ym = today.strftime("%Y-%m")
 
-        # 1) Archive memory
-        if mem_path.exists():
-            archive_dir = mem_path.parent / "archive"
-            archive_dir.mkdir(parents=True, exist_ok=True)
-            shutil.copy(mem_path, archive_dir / f"netflow_agent_{ym}.json")
-            mem_path.unlink()  # reset memory
+        # 1) Forget alerts from previous months (indexed delete, no file rewrite)
+        store.prune(f"{ym}-01")
 
         # 2) Reports in monthly folder
         out_docs = out_docs / "agent_reports" / ym
 
+    if args.manifest:
+        agent = ManifestAgent(load_manifest(Path(args.manifest), args), store, out_docs,
+                              manifest_state_path_for(mem_path), args.retention_days)
+        while True:
+            asyncio.run(agent.run(watch=args.watch))
+            if not args.loop:
+                break
+            time.sleep(max(args.sleep, 5))
+        return
+
+    csv_path = Path(args.csv)
+    if args.watch:
+        watch(csv_path, load_state(state_path, args.win, args.detector, changepoint_specs(args)),
+              args, store, out_docs, state_path)
+        return
+
     while True:
         rows = read_daily_total(csv_path)
-        rows = compute_zscore(rows, args.win)
-        anoms = detect_anomalies(rows, args.z)
-
-        mem = load_memory(mem_path)
-        seen = set(mem.get("seen_dates", []))
-        new_anoms = [a for a in anoms if a.date not in seen]
-
-        if new_anoms:
-            report = write_report(new_anoms, out_docs)
-            print(f"[ALERT] {len(new_anoms)} new anomalies. Report: {report}")
-            for a in new_anoms:
-                seen.add(a.date)
-            mem["seen_dates"] = sorted(list(seen))
-            save_memory(mem_path, mem)
-        else:
-            print("[OK] No new anomalies.")
+        run_once(rows, load_state(state_path, args.win, args.detector, changepoint_specs(args)),
+                 args, store, out_docs, state_path)
 
         if not args.loop:
             break
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+backtest_detectors.py
+Rejoue un historique de netflow (quotidien ou horaire) à travers une grille de
+détecteurs (détecteur x fenêtre x seuil) et mesure, contre un fichier
+d'événements labellisés : nombre d'alertes, taux de détection (hit rate),
+précision et délai d'anticipation (lead time).
+
+- z glissant de toutes les fenêtres d'un lot en un appel du noyau
+  (common.rolling, fenêtres multiples), séries en colonnes (temps x séries) ;
+- les seuils sont évalués sur le même tableau de z (pas de recalcul) ;
+- les lots (fenêtres zscore groupées, une fenêtre MAD par lot) sont répartis
+  sur un ProcessPoolExecutor, données transmises une fois par worker.
+
+Événements : CSV avec une colonne date (+ series ou exchange optionnelle ; sans
+série, l'événement vaut pour toutes les séries). Une alerte touche un événement
+si elle tombe dans [date - horizon, date] (en pas de temps) ; lead = nombre de
+pas entre la première alerte de cette fenêtre et l'événement.
+
+Usage:
+  python scripts/backtest_detectors.py \
+    --csv data/netflow_daily_by_exchange_2025-05-01__2025-06-05.csv --by exchange \
+    --events data/events.csv --wins 5,7,10,14,21,30 --zs 2,2.5,3,3.5,4 \
+    --detectors zscore,mad --horizon 3 --workers 4 --out data/backtest_detectors.csv
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.rolling import DETECTORS, rolling_robust_zscore, rolling_zscore  # noqa: E402
+
+
+def default_min_periods(w: int) -> int:
+    """Règle des scripts d'anomalies : moitié de la fenêtre, au moins 3."""
+    return max(3, w // 2)
+
+
+def parse_list(spec: str, cast=float) -> list:
+    return [cast(x) for x in spec.split(",") if x.strip()]
+
+
+# -----------------------------------------------------------------------------
+# Données
+# -----------------------------------------------------------------------------
+def load_matrix(path: str, col: str, by: str | None):
+    """CSV -> (index temporel, noms de séries, matrice T x S)."""
+    df = pd.read_csv(path, parse_dates=["date"])
+    if col not in df.columns:
+        raise SystemExit(f"Colonne absente: {col}")
+    if by:
+        mat = df.pivot_table(index="date", columns=by, values=col, aggfunc="sum").sort_index()
+        return mat.index, [str(c) for c in mat.columns], mat.to_numpy(dtype=float)
+    s = df.groupby("date")[col].sum(min_count=1).sort_index()
+    return s.index, ["total"], s.to_numpy(dtype=float)[:, None]
+
+
+def load_events(path: str, index: pd.DatetimeIndex, names: list[str]):
+    """Événements -> (indices temps, indices série) ; 1re ligne de données >= date de l'événement."""
+    ev = pd.read_csv(path, parse_dates=["date"])
+    key = next((c for c in ("series", "exchange") if c in ev.columns), None)
+    t = index.searchsorted(ev["date"].to_numpy(), side="left")
+    pos = {n: i for i, n in enumerate(names)}
+    ev_t, ev_s, dropped = [], [], 0
+    for ti, row in zip(t, ev.itertuples(index=False)):
+        if ti >= len(index):
+            dropped += 1
+            continue
+        name = getattr(row, key) if key else None
+        if name is None or (isinstance(name, float) and np.isnan(name)) or name == "":
+            ev_t += [ti] * len(names)
+            ev_s += list(range(len(names)))
+        elif str(name) in pos:
+            ev_t.append(ti)
+            ev_s.append(pos[str(name)])
+        else:
+            dropped += 1
+    if dropped:
+        print(f"[WARN] {dropped} événement(s) hors période ou série inconnue ignoré(s)")
+    return np.asarray(ev_t, dtype=np.int64), np.asarray(ev_s, dtype=np.int64)
+
+
+def event_window_mask(shape, ev_t, ev_s, horizon: int) -> np.ndarray:
+    """Cases (t, s) couvertes par au moins une fenêtre [événement - horizon, événement]."""
+    marks = np.zeros((shape[0] + 1, shape[1]), dtype=np.int64)
+    np.add.at(marks, (np.maximum(ev_t - horizon, 0), ev_s), 1)
+    np.add.at(marks, (ev_t + 1, ev_s), -1)
+    return np.cumsum(marks, axis=0)[:-1] > 0
+
+
+# -----------------------------------------------------------------------------
+# Évaluation
+# -----------------------------------------------------------------------------
+def score_alerts(alerts: np.ndarray, ev_t, ev_s, in_window: np.ndarray, horizon: int) -> dict:
+    """Métriques d'une matrice d'alertes booléenne T x S."""
+    t_len = alerts.shape[0]
+    n_alerts = int(alerts.sum())
+    # première alerte à partir de t (T si aucune) : minimum cumulé en sens inverse
+    idx = np.where(alerts, np.arange(t_len)[:, None], t_len)
+    nxt = np.minimum.accumulate(idx[::-1], axis=0)[::-1]
+    first = nxt[np.maximum(ev_t - horizon, 0), ev_s]
+    hit = first <= ev_t
+    lead = (ev_t - first)[hit]
+    hits = int(hit.sum())
+    precision = float((alerts & in_window).sum() / n_alerts) if n_alerts else np.nan
+    hit_rate = hits / len(ev_t) if len(ev_t) else np.nan
+    f1 = (2 * precision * hit_rate / (precision + hit_rate)
+          if n_alerts and len(ev_t) and (precision + hit_rate) > 0 else np.nan)
+    return {
+        "alerts": n_alerts,
+        "events": int(len(ev_t)),
+        "hits": hits,
+        "hit_rate": hit_rate,
+        "precision": precision,
+        "f1": f1,
+        "lead_mean": float(lead.mean()) if hits else np.nan,
+        "lead_median": float(np.median(lead)) if hits else np.nan,
+    }
+
+
+_DATA: dict = {}
+
+
+def _init_worker(x, ev_t, ev_s, horizon, side, min_periods):
+    _DATA.update(x=x, ev_t=ev_t, ev_s=ev_s, horizon=horizon, side=side, min_periods=min_periods,
+                 in_window=event_window_mask(x.shape, ev_t, ev_s, horizon))
+
+
+def run_task(task) -> list[dict]:
+    """Un lot (détecteur, fenêtres, seuils) -> une ligne de métriques par configuration."""
+    detector, wins, zs = task
+    d = _DATA
+    minp = d["min_periods"] if d["min_periods"] is not None else default_min_periods
+    if detector == "zscore":
+        z = rolling_zscore(d["x"], wins, min_periods=minp, ddof=0, zero_std="inf")   # (W, T, S)
+    else:
+        z = np.stack([rolling_robust_zscore(d["x"], w, min_periods=minp, zero_std="inf") for w in wins])
+
+    out = []
+    with np.errstate(invalid="ignore"):
+        for wi, w in enumerate(wins):
+            zw = z[wi]
+            for thr in zs:
+                if d["side"] == "hi":
+                    alerts = zw >= thr
+                elif d["side"] == "lo":
+                    alerts = zw <= -thr
+                else:
+                    alerts = np.abs(zw) >= thr
+                row = {"detector": detector, "win": int(w), "z": float(thr)}
+                row.update(score_alerts(alerts, d["ev_t"], d["ev_s"], d["in_window"], d["horizon"]))
+                out.append(row)
+    return out
+
+
+def build_tasks(detectors, wins, zs, workers: int) -> list:
+    """zscore : fenêtres réparties en `workers` lots (une passe de noyau par lot) ; mad : une fenêtre par lot."""
+    tasks = []
+    for det in detectors:
+        if det == "zscore":
+            for chunk in np.array_split(np.asarray(wins), max(1, min(workers, len(wins)))):
+                if len(chunk):
+                    tasks.append((det, [int(w) for w in chunk], zs))
+        else:
+            tasks += [(det, [int(w)], zs) for w in wins]
+    return tasks
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest d'une grille de détecteurs d'anomalies de netflow.")
+    ap.add_argument("--csv", required=True, help="CSV netflow (quotidien ou horaire) : colonne date + valeur")
+    ap.add_argument("--col", default="netflow", help="colonne évaluée (défaut: netflow)")
+    ap.add_argument("--by", default=None, help="colonne de série pour une table longue (ex: exchange)")
+    ap.add_argument("--events", required=True, help="CSV d'événements (date[, series|exchange])")
+    ap.add_argument("--detectors", default="zscore,mad", help="détecteurs à évaluer (défaut: zscore,mad)")
+    ap.add_argument("--wins", default="5,7,10,14,21,30", help="fenêtres (en pas de temps)")
+    ap.add_argument("--zs", default="2,2.5,3,3.5,4", help="seuils |z|")
+    ap.add_argument("--min-periods", type=int, default=None,
+                    help="points valides minimum (défaut: max(3, fenêtre // 2))")
+    ap.add_argument("--side", choices=["both", "hi", "lo"], default="both",
+                    help="alertes sur |z| (both), z >= seuil (hi) ou z <= -seuil (lo)")
+    ap.add_argument("--horizon", type=int, default=3,
+                    help="une alerte jusqu'à N pas avant l'événement compte comme détection")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus (défaut: nb de CPU)")
+    ap.add_argument("--out", default="data/backtest_detectors.csv", help="CSV de sortie")
+    args = ap.parse_args()
+
+    detectors = [d.strip() for d in args.detectors.split(",") if d.strip()]
+    unknown = [d for d in detectors if d not in DETECTORS]
+    if unknown:
+        raise SystemExit(f"Détecteur(s) inconnu(s): {', '.join(unknown)} (choix: {', '.join(DETECTORS)})")
+    wins = sorted(set(parse_list(args.wins, int)))
+    zs = sorted(set(parse_list(args.zs, float)))
+
+    index, names, x = load_matrix(args.csv, args.col, args.by)
+    ev_t, ev_s = load_events(args.events, index, names)
+    if len(ev_t) == 0:
+        raise SystemExit("Aucun événement dans la période du CSV.")
+
+    tasks = build_tasks(detectors, wins, zs, args.workers)
+    init = (x, ev_t, ev_s, args.horizon, args.side, args.min_periods)
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=init) as ex:
+            rows = [r for chunk in ex.map(run_task, tasks) for r in chunk]
+    else:
+        _init_worker(*init)
+        rows = [r for t in tasks for r in run_task(t)]
+
+    res = pd.DataFrame(rows).sort_values(["f1", "hit_rate", "alerts"], ascending=[False, False, True])
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    res.to_csv(out, index=False)
+
+    print(f"{len(res)} configurations x {x.shape[1]} série(s) x {x.shape[0]} pas, {len(ev_t)} événement(s)")
+    print(res.head(10).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n[OK] Écrit : {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+check_rolling_numerics.py
+Contrôle de non-régression des noyaux glissants (common.rolling,
+common.correlation) :
+  - données aléatoires avec NaN : comparaison à pandas .rolling ;
+  - changement de niveau (1e7 puis ~5) et "jours baleine" (queues de Cauchy) :
+    comparaison à un calcul exact fenêtre par fenêtre (pandas dérive lui-même
+    après un changement de niveau, il n'est pas une référence fiable ici) ;
+  - médiane / MAD glissantes (common.rolling) vs calcul exact par fenêtre et vs
+    le détecteur en flux (common.streaming.RollingMedianMAD).
+
+Code retour 1 si un écart dépasse la tolérance.
+
+Usage:
+  python scripts/check_rolling_numerics.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.correlation import rolling_corr_matrix  # noqa: E402
+from common.rolling import MAD_SCALE, rolling_median_mad, rolling_zscore  # noqa: E402
+from common.streaming import RollingMedianMAD  # noqa: E402
+
+TOL = 1e-8
+
+
+def exact_zscore(y: np.ndarray, w: int, minp: int) -> np.ndarray:
+    """z (ddof=0) recalculé fenêtre par fenêtre ; NaN si écart-type nul."""
+    out = np.full(len(y), np.nan)
+    for t in range(len(y)):
+        win = y[max(0, t - w + 1):t + 1]
+        win = win[~np.isnan(win)]
+        if len(win) >= minp and win.std() > 0:
+            out[t] = (y[t] - win.mean()) / win.std()
+    return out
+
+
+def exact_corr(y: np.ndarray, w: int) -> np.ndarray:
+    """Corrélation des colonnes 0 et 1 recalculée fenêtre par fenêtre (fenêtres complètes)."""
+    out = np.full(len(y), np.nan)
+    for t in range(w - 1, len(y)):
+        out[t] = np.corrcoef(y[t - w + 1:t + 1].T)[0, 1]
+    return out
+
+
+def exact_median_mad(y: np.ndarray, w: int, minp: int) -> tuple:
+    """Médiane et MAD_SCALE * MAD recalculées fenêtre par fenêtre (NaN ignorés)."""
+    med, mad = np.full(len(y), np.nan), np.full(len(y), np.nan)
+    for t in range(len(y)):
+        win = y[max(0, t - w + 1):t + 1]
+        win = win[~np.isnan(win)]
+        if len(win) >= minp:
+            med[t] = np.median(win)
+            mad[t] = MAD_SCALE * np.median(np.abs(win - med[t]))
+    return med, mad
+
+
+def report(name: str, got: np.ndarray, ref: np.ndarray) -> bool:
+    same_nan = bool((np.isnan(got) == np.isnan(ref)).all())
+    fin = np.isfinite(ref) & np.isfinite(got)
+    err = float(np.max(np.abs(got[fin] - ref[fin]) / np.maximum(1.0, np.abs(ref[fin])))) if fin.any() else 0.0
+    ok = same_nan and err <= TOL
+    print(f"[{'OK' if ok else 'FAIL'}] {name}: écart max {err:.2e}, NaN identiques: {same_nan}")
+    return ok
+
+
+def main() -> int:
+    rng = np.random.default_rng(0)
+    ok = True
+
+    x = rng.normal(size=(1000, 5))
+    x[rng.random(x.shape) < 0.1] = np.nan
+    for w, minp in ((30, 30), (7, 3)):
+        df = pd.DataFrame(x)
+        r = df.rolling(w, min_periods=minp)
+        ref = ((df - r.mean()) / r.std(ddof=0)).to_numpy()
+        ok &= report(f"aléatoire + NaN, w={w}, min_periods={minp} vs pandas",
+                     rolling_zscore(x, w, min_periods=minp, zero_std="inf"), ref)
+
+    cases = {
+        "changement de niveau 1e7 -> 5": np.r_[np.full(50, 1e7), 5 + rng.normal(size=190)],
+        "changement de niveau bruité": np.r_[1e7 + rng.normal(size=50), 5 + rng.normal(size=190)],
+        "jours baleine (Cauchy)": np.abs(rng.standard_cauchy(2000)) * 1e3,
+    }
+    for name, y in cases.items():
+        ok &= report(f"{name} vs exact", rolling_zscore(y, 30, min_periods=5, zero_std="nan"),
+                     exact_zscore(y, 30, 5))
+
+    x = rng.normal(size=(500, 3))
+    x[rng.random(x.shape) < 0.1] = np.nan
+    ref = pd.DataFrame(x).rolling(20, min_periods=5).corr().to_numpy().reshape(len(x), 3, 3)
+    ok &= report("corrélation glissante + NaN vs pandas", rolling_corr_matrix(x, 20, 5, block=64), ref)
+
+    e = rng.normal(size=(310, 2))
+    e[:, 1] = 0.8 * e[:, 0] + 0.6 * e[:, 1]
+    y = np.r_[1e7 + e[:50], 5 + e[50:]]
+    ok &= report("corrélation, changement de niveau vs exact", rolling_corr_matrix(y, 30)[:, 0, 1],
+                 exact_corr(y, 30))
+
+    y = np.r_[rng.normal(size=300), np.round(rng.normal(size=200))]   # ex-aequo
+    y[rng.random(len(y)) < 0.1] = np.nan
+    for w, minp in ((30, 30), (8, 3)):
+        got, ref = rolling_median_mad(y, w, min_periods=minp), exact_median_mad(y, w, minp)
+        ok &= report(f"médiane glissante + NaN, w={w} vs exact", got[0], ref[0])
+        ok &= report(f"MAD glissante + NaN, w={w} vs exact", got[1], ref[1])
+    y = np.abs(rng.standard_cauchy(400))
+    rm = RollingMedianMAD(25)
+    stream = np.array([[np.nan if m is None else m, np.nan if s is None else s]
+                       for m, s in (rm.push(v) for v in y)])
+    ok &= report("MAD glissante vs détecteur en flux", rolling_median_mad(y, 25)[1], stream[:, 1])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,29 +1,48 @@
 import argparse
+import sys
 import pandas as pd
 from pathlib import Path
 
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.rolling import DETECTORS, DETECTOR_COLUMNS, rolling_detector  # noqa: E402
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv_total", required=True, help="CSV netflow_daily_total_*.csv")
     ap.add_argument("--out", default=None, help="CSV de sortie (avec flags)")
     ap.add_argument("--win", type=int, default=7, help="fenêtre rolling (jours)")
     ap.add_argument("--z", type=float, default=2.5, help="seuil z-score")
+    ap.add_argument("--col", default="netflow", help="colonne analysée (ex: netflow_ge100k avec --size-buckets)")
+    ap.add_argument("--detector", choices=DETECTORS, default="zscore",
+                    help="zscore (moyenne/écart-type) ou mad (médiane/MAD, robuste aux pics)")
     args = ap.parse_args()
 
     df = pd.read_csv(args.csv_total, parse_dates=["date"])
     df = df.sort_values("date").reset_index(drop=True)
 
-    # z-score sur netflow total
-    df["roll_mean"] = df["netflow"].rolling(args.win, min_periods=max(3, args.win//2)).mean()
-    df["roll_std"]  = df["netflow"].rolling(args.win, min_periods=max(3, args.win//2)).std(ddof=0)
-    df["zscore"]    = (df["netflow"] - df["roll_mean"]) / df["roll_std"]
+    if args.col not in df.columns:
+        raise SystemExit(f"Colonne absente: {args.col}")
+
+    # z-score sur netflow total (ou la tranche choisie)
+    # (écart-type / MAD nul -> division brute : ±inf, compté comme anomalie)
+    z, m, sd = rolling_detector(df[args.col].to_numpy(dtype=float), args.win, detector=args.detector,
+                                min_periods=max(3, args.win//2), zero_std="inf")
+    c_center, c_scale = DETECTOR_COLUMNS[args.detector]
+    df[c_center], df[c_scale], df["zscore"] = m, sd, z
     df["anomaly_hi"] = (df["zscore"] >= args.z)    # spikes d’inflow (potentielle pression de vente)
     df["anomaly_lo"] = (df["zscore"] <= -args.z)   # gros outflows (accumulation potentielle)
 
     out = args.out or (Path(args.csv_total).with_name(Path(args.csv_total).stem + "_ANOM.csv"))
     df.to_csv(out, index=False)
 
-    top = df.loc[df["anomaly_hi"] | df["anomaly_lo"], ["date","netflow","zscore","anomaly_hi","anomaly_lo"]]
+    top = df.loc[df["anomaly_hi"] | df["anomaly_lo"], ["date",args.col,"zscore","anomaly_hi","anomaly_lo"]]
     if not top.empty:
         print(top.to_string(index=False))
     else:
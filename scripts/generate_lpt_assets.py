@@ -8,19 +8,34 @@
 #     outputs/lpt_corr.png   <-- NEW (corr 60j vs BTC/ETH)
 #
 # Options:
-#   --days 180   --vs usd   --offline   --force-refresh   --param-names
+#   --days 180   --vs usd   --offline   --force-refresh   --cache-ttl 12   --param-names
+#   --provider live|cache|fixture   --seed 0
+#
+# Indicateurs : data/indicator_cache (INDICATOR_CACHE_DIR, "" pour désactiver) ;
+# seules les lignes nouvelles ou révisées sont recalculées.
+#
+# Cache : data/cache_<coin>_<vs>_<days>d.csv (+ .meta.json). Au-delà de --cache-ttl
+# heures, seuls les jours manquants sont refetchés (une petite requête par actif).
+# --provider (common.providers, défaut MARKET_PROVIDER sinon live) : cache = cache
+# local seul (= --offline), fixture = séries synthétiques déterministes (--seed),
+# sans réseau et identiques d'un run à l'autre.
 #
 # Exemples:
 #   python scripts/generate_lpt_assets.py --days 180 --vs usd
 #   python scripts/generate_lpt_assets.py --days 90 --vs eur --force-refresh
 #   python scripts/generate_lpt_assets.py --days 180 --vs usd --param-names
+#   python scripts/generate_lpt_assets.py --days 180 --provider fixture --seed 1
 
 from __future__ import annotations
 
+import os
 import sys
 import argparse
+import logging
 from pathlib import Path
 
+import pandas as pd
+
 def _ensure_src_on_path():
     here = Path(__file__).resolve()
     repo_root = here.parent.parent          # .../crypto-ai-analytics
@@ -33,6 +48,9 @@ def _ensure_src_on_path():
 _ensure_src_on_path()
 
 from common import utils   # noqa: E402
+from common.correlation import rolling_corr_matrix   # noqa: E402
+from common.indicator_cache import cached_indicators, default_cache   # noqa: E402
+from common.providers import MARKET_PROVIDERS, ProviderError, market_provider   # noqa: E402
 
 
 def ensure_dirs():
@@ -42,10 +60,9 @@ def ensure_dirs():
 
 
 def compute_metrics(df):
-    df["ema_7"]  = utils.ema(df["price"], span=7)
-    df["ema_21"] = utils.ema(df["price"], span=21)
-    df["z_60"]   = utils.zscore(df["price"], window=60)
-    df["apy_30"] = utils.rolling_apy(df["price"], window=30)
+    # ema_7, ema_21, z_60, apy_30 (common.indicators), relus / prolongés depuis le cache disque
+    for name, s in cached_indicators(df["price"], ema_spans=(7, 21), z_windows=(60,), apy_windows=(30,)).items():
+        df[name] = s
     return df
 
 
@@ -66,24 +83,27 @@ def plot_apy(df, out_path: Path):
     utils.safe_plot_series(df.index, df["apy_30"], str(out_path), title="LPT — Rolling APY (30j)", ylabel="APY", label="APY(30)")
 
 
-def plot_corr(df_lpt, vs: str, days: int, out_path: Path):
+def plot_corr(df_lpt, refs: dict, out_path: Path):
     """
     Corrélation glissante (60j) de LPT vs BTC et ETH (mêmes 'days' et 'vs').
+    refs : {"btc": DataFrame, "eth": DataFrame}, déjà chargés avec LPT ; un actif
+    absent (fetch en échec) est simplement omis du graphe.
     """
-    btc = utils.load_or_fetch_coin("BTC", vs=vs, days=days, force_refresh=False)
-    eth = utils.load_or_fetch_coin("ETH", vs=vs, days=days, force_refresh=False)
+    cols = {"lpt": df_lpt["price"]}
+    for name in ("btc", "eth"):
+        ref = refs.get(name)
+        if ref is None or ref.empty:
+            continue
+        # Aligner sur l'index de LPT
+        cols[name] = ref.reindex(df_lpt.index).interpolate()["price"]
+
+    # toutes les paires en une passe (matrice T x N x N), ligne 0 = LPT ; cache disque si actif
+    x = pd.DataFrame(cols).to_numpy(dtype=float)
+    cache = default_cache()
+    corr = cache.compute("corr", x, 60) if cache is not None else rolling_corr_matrix(x, window=60)
+    series = {f"corr_{name}_60": pd.Series(corr[:, 0, k], index=df_lpt.index)
+              for k, name in enumerate(cols) if k}
 
-    # Aligner sur l'index de LPT
-    btc = btc.reindex(df_lpt.index).interpolate()
-    eth = eth.reindex(df_lpt.index).interpolate()
-
-    corr_btc_60 = utils.shift_corr(df_lpt["price"], btc["price"], lag=0, window=60)
-    corr_eth_60 = utils.shift_corr(df_lpt["price"], eth["price"], lag=0, window=60)
-
-    series = {
-        "corr_btc_60": corr_btc_60,
-        "corr_eth_60": corr_eth_60,
-    }
     utils.safe_plot_lines(df_lpt.index, series, str(out_path),
                           title="Rolling Corr (60d) — LPT vs BTC/ETH",
                           ylabel="corr")
@@ -93,22 +113,39 @@ def main():
     ap = argparse.ArgumentParser(description="Génère les assets LPT (CSV + PNG).")
     ap.add_argument("--days", type=int, default=180)
     ap.add_argument("--vs", type=str, default="usd")
-    ap.add_argument("--offline", action="store_true", help="N'utilise que le cache local (si présent).")
+    ap.add_argument("--offline", action="store_true", help="N'utilise que le cache local (si présent) ; = --provider cache.")
+    ap.add_argument("--provider", choices=MARKET_PROVIDERS, default=os.getenv("MARKET_PROVIDER", "live"),
+                    help="Source des séries : live (cache + CoinGecko), cache, fixture (défaut: MARKET_PROVIDER, sinon live).")
+    ap.add_argument("--seed", type=int, default=0, help="Graine du provider fixture (défaut 0).")
     ap.add_argument("--force-refresh", action="store_true", help="Ignore le cache et refait les fetchs.")
+    ap.add_argument("--cache-ttl", type=float, default=None,
+                    help="Fraîcheur du cache en heures (défaut: celle de l'entrée, sinon MARKET_CACHE_TTL_HOURS=12).")
     ap.add_argument("--param-names", dest="param_names", action="store_true",
                     help="Sauvegarde aussi des variantes nommées avec days/vs.")
     args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
     ensure_dirs()
 
     coin_id = utils.resolve_coin_id("LPT")  # 'LPT' -> 'livepeer'
 
-    cache_csv = Path(f"data/cache_{coin_id}_{args.vs}_{args.days}d.csv")
-    if args.offline and not cache_csv.exists():
-        print(f"[ERROR] Mode offline: cache absent {cache_csv}. Relance sans --offline.")
-        return 2
-
-    df = utils.load_or_fetch_coin(coin_id, vs=args.vs, days=args.days, force_refresh=args.force_refresh)
+    name = "cache" if args.offline else args.provider
+    if name == "fixture":
+        provider = market_provider(name, seed=args.seed)
+    elif name == "cache":
+        provider = market_provider(name)
+    else:
+        provider = market_provider(name, force_refresh=args.force_refresh, ttl_hours=args.cache_ttl)
+
+    # LPT + références de corrélation en un lot (références en échec simplement omises)
+    frames = provider.market_charts([coin_id, "BTC", "ETH"], vs=args.vs, days=args.days, errors="skip")
+    if coin_id not in frames:
+        try:
+            frames[coin_id] = provider.market_chart(coin_id, vs=args.vs, days=args.days)
+        except ProviderError as e:
+            print(f"[ERROR] Provider {provider.name}: {e}. Relance avec --provider live.")
+            return 2
+    df = frames[coin_id]
     if df.empty:
         print("[WARN] Série vide renvoyée par CoinGecko.")
         return 1
@@ -128,7 +165,7 @@ def main():
     plot_price_ema(df, out_price_ema)
     plot_zscore(df, out_zscore)
     plot_apy(df, out_apy)
-    plot_corr(df, args.vs, args.days, out_corr)
+    plot_corr(df, {"btc": frames.get("BTC"), "eth": frames.get("ETH")}, out_corr)
 
     # Variantes paramétrées si demandé (copie simple des stables)
     if args.param_names:
@@ -4,8 +4,24 @@
 get_lpt_multi_cex.py
 - Récupère les transferts LPT (ERC-20) pour plusieurs adresses (CEX) via Etherscan.
 - Sort un CSV par adresse + un CSV combiné avec la colonne 'exchange'.
-
-ENV requis: ETHERSCAN_API_KEY
+- Mode batch (--tokens) : plusieurs tokens ERC-20 sur les mêmes adresses en un
+  seul run. Plages de blocs résolues une fois, puis une pagination tokentx
+  filtrée (contractaddress) par (token, adresse), en parallèle sur une session
+  HTTP et un budget de débit (--rps) partagés : coût = somme des pages des
+  tokens demandés, les autres tokens de l'adresse ne sont jamais téléchargés.
+  Une combinaison en échec n'interrompt pas les autres (listée en fin de run,
+  code retour 1). Sortie : un CSV "tall" avec les colonnes token / value_token
+  (erc20_transfers_all_<period>.csv).
+- Troncature : si la dernière page lue est pleine alors que --maxpages ou la
+  fenêtre Etherscan (page x offset <= 10 000 résultats) empêche d'aller plus
+  loin, la combinaison est en échec (aucun CSV incomplet) ; --allow-truncated
+  écrit quand même les lignes reçues, avec un avertissement. Réduire la plage
+  (--startblock/--endblock, dates) pour tout récupérer.
+- --provider live|cache|fixture (common.providers) : API Etherscan (réponses
+  enregistrées sous ETHERSCAN_CACHE_DIR), rejeu de ces réponses, ou transferts
+  synthétiques déterministes (--seed) pour des runs hors ligne reproductibles.
+
+ENV requis (provider live): ETHERSCAN_API_KEY
 Dépendances: requests, pandas
 
 Exemples:
@@ -14,16 +30,30 @@ python scripts/get_lpt_multi_cex.py ^
   --startdate 2025-05-01 --enddate 2025-06-05 ^
   --outdir data
 
+python scripts/get_lpt_multi_cex.py ^
+  --config scripts/cex_addresses.json ^
+  --tokens "LPT=0x58b6a8a3302369daec383334672404ee733ab239,USDC=0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48" ^
+  --startdate 2025-05-01 --enddate 2025-06-05 ^
+  --outdir data
+
 python scripts/get_lpt_multi_cex.py ^
   --addresses "binance20=0xF977...,kraken_cold1=0x22af..." ^
   --startblock 12600000 --endblock 12800000 ^
   --sort desc ^
   --outdir data
+
+python scripts/get_lpt_multi_cex.py ^
+  --config scripts/cex_addresses.json ^
+  --startdate 2025-05-01 --enddate 2025-06-05 ^
+  --provider fixture --seed 1 --outdir data/fixture
 """
 import argparse
 import json
 import os
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Tuple
@@ -31,8 +61,54 @@ from typing import Dict, List, Tuple
 import requests
 import pandas as pd
 
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.providers import TRANSFER_PROVIDERS, TransferProvider, transfer_provider  # noqa: E402
+
 LPT_CONTRACT = "0x58b6a8a3302369daec383334672404ee733ab239"  # Livepeer Token
-ETHERSCAN_API = "https://api.etherscan.io/api"
+
+# Etherscan refuse page * offset > 10 000 : au-delà, il faut découper la plage de blocs
+ETHERSCAN_MAX_RESULTS = 10_000
+
+
+class TruncatedFetch(RuntimeError):
+    """Pagination arrêtée sur une page pleine (--maxpages ou fenêtre Etherscan) ; rows = lignes reçues."""
+
+    def __init__(self, message: str, rows: List[dict]):
+        super().__init__(message)
+        self.rows = rows
+
+
+# ---------- Session / débit partagés ----------
+
+class RateLimiter:
+    """Espace les requêtes (tous threads confondus) d'au moins 1/rps seconde."""
+
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
 
 
 # ---------- Utilitaires temps / blocs ----------
@@ -42,21 +118,17 @@ def to_utc_ts(date_str: str, end: bool = False) -> int:
     hh, mm, ss = (23, 59, 59) if end else (0, 0, 0)
     return int(datetime(y, m, d, hh, mm, ss, tzinfo=timezone.utc).timestamp())
 
-def block_by_time(ts: int, closest: str, api_key: str) -> int:
+def block_by_time(ts: int, closest: str, provider: TransferProvider) -> int:
     """closest: 'before' ou 'after'"""
-    r = requests.get(
-        ETHERSCAN_API,
-        params={
+    js = provider.query(
+        {
             "module": "block",
             "action": "getblocknobytime",
             "timestamp": ts,
             "closest": closest,
-            "apikey": api_key,
         },
         timeout=30,
     )
-    r.raise_for_status()
-    js = r.json()
     if js.get("status") != "1":
         raise RuntimeError(f"getblocknobytime failed: {js}")
     return int(js["result"])
@@ -65,7 +137,7 @@ def block_by_time(ts: int, closest: str, api_key: str) -> int:
 # ---------- Récupération paginée ----------
 
 def fetch_pages_for_address(
-    api_key: str,
+    provider: TransferProvider,
     address: str,
     contract: str,
     startblock: int | None,
@@ -76,10 +148,14 @@ def fetch_pages_for_address(
     pagesize: int,
     sort: str = "desc",
     sleep_sec: float = 0.2,
+    limiter: RateLimiter | None = None,
 ) -> List[dict]:
     """
     Boucle paginée sur Etherscan pour une adresse.
-    Retourne une liste de dict (brut Etherscan).
+    Retourne une liste de dict (brut Etherscan). TruncatedFetch si la dernière
+    page est pleine et que maxpages ou ETHERSCAN_MAX_RESULTS interdit la suivante.
+    Avec un limiter partagé, c'est lui qui cadence les pages (sleep_sec ignoré) ;
+    aucune attente pour un provider hors réseau (cache, fixture).
     """
     params_base = {
         "module": "account",
@@ -87,7 +163,6 @@ def fetch_pages_for_address(
         "contractaddress": contract,
         "address": address,
         "sort": sort,              # 'desc' par défaut pour aller du plus récent au plus ancien
-        "apikey": api_key,
     }
     if startblock is not None:
         params_base["startblock"] = startblock
@@ -95,14 +170,16 @@ def fetch_pages_for_address(
         params_base["endblock"] = endblock
 
     results: List[dict] = []
-    for page in range(1, maxpages + 1):
+    last_page = min(maxpages, max(1, ETHERSCAN_MAX_RESULTS // pagesize))
+    truncated = False
+    for page in range(1, last_page + 1):
         params = dict(params_base)
         params["page"] = page
         params["offset"] = pagesize
 
-        r = requests.get(ETHERSCAN_API, params=params, timeout=45)
-        r.raise_for_status()
-        js = r.json()
+        if limiter is not None and provider.network:
+            limiter.wait()
+        js = provider.query(params, timeout=45)
         if js.get("status") != "1":
             # fin des données pour cette plage / token
             break
@@ -116,8 +193,10 @@ def fetch_pages_for_address(
         # Si moins qu'une page complète, on stoppe (fin de liste)
         if len(batch) < pagesize:
             break
+        truncated = page == last_page
 
-        time.sleep(sleep_sec)
+        if limiter is None and provider.network:
+            time.sleep(sleep_sec)
 
     # Filtrage par dates côté client (sécurité supplémentaire)
     if startdate or enddate:
@@ -136,6 +215,10 @@ def fetch_pages_for_address(
             filtered.append(tx)
         results = filtered
 
+    if truncated:
+        cap = "fenêtre Etherscan" if last_page < maxpages else "--maxpages"
+        raise TruncatedFetch(f"tronqué à {last_page} pages de {pagesize} ({cap}) : réduire la plage de blocs",
+                             results)
     return results
 
 
@@ -165,6 +248,13 @@ def normalize_rows(rows: List[dict]) -> pd.DataFrame:
     return df[["hash", "blockNumber", "timeStamp", "from", "to", "value_LPT"]].copy()
 
 
+def normalize_token_rows(rows: List[dict], token: str) -> pd.DataFrame:
+    """Comme normalize_rows, pour le mode batch : colonnes token / value_token."""
+    df = normalize_rows(rows).rename(columns={"value_LPT": "value_token"})
+    df.insert(df.columns.get_loc("value_token"), "token", token)
+    return df
+
+
 # ---------- Parsing adresses ----------
 
 def parse_addresses(addresses_str: str | None, config_path: str | None) -> List[Tuple[str, str]]:
@@ -203,6 +293,96 @@ def parse_addresses(addresses_str: str | None, config_path: str | None) -> List[
     return uniq
 
 
+def parse_tokens(tokens_str: str) -> List[Tuple[str, str]]:
+    """
+    Retourne [(symbole, contrat), ...]
+    - tokens_str: "LPT=0x58b6...,USDC=0xA0b8..." ou chemin d'un JSON {"LPT": "0x58b6...", ...}
+    """
+    if tokens_str.lower().endswith(".json") and Path(tokens_str).exists():
+        with open(tokens_str, "r", encoding="utf-8") as f:
+            items = [(k, str(v)) for k, v in json.load(f).items()]
+    else:
+        items = []
+        for item in tokens_str.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if "=" not in item:
+                raise SystemExit(f"Token mal formé (attendu SYMBOLE=contrat): {item}")
+            sym, contract = item.split("=", 1)
+            items.append((sym, contract))
+    seen = set()
+    uniq = []
+    for sym, contract in items:
+        sym, contract = sym.strip().upper(), contract.strip().lower()
+        if contract not in seen:
+            seen.add(contract)
+            uniq.append((sym, contract))
+    if not uniq:
+        raise SystemExit("Aucun token fourni dans --tokens.")
+    return uniq
+
+
+def fetch_batch(
+    provider: TransferProvider,
+    pairs: List[Tuple[str, str]],
+    tokens: List[Tuple[str, str]],
+    args,
+    limiter: RateLimiter,
+) -> Tuple[Dict[Tuple[str, str], pd.DataFrame], Dict[str, Exception]]:
+    """
+    Récupère toutes les combinaisons (token, adresse) en parallèle, sous le même
+    limiter. Retourne ({(symbole, label): DataFrame normalisé},
+    {(symbole, label): exception des combinaisons en échec}) ; une combinaison
+    tronquée est en échec sauf avec --allow-truncated (lignes gardées, averti).
+    """
+    def one(sym, contract, label, addr):
+        rows = _fetch_rows(
+            f"{sym}/{label}",
+            args.allow_truncated,
+            provider=provider,
+            address=addr,
+            contract=contract,
+            startblock=args.startblock,
+            endblock=args.endblock,
+            startdate=args.startdate,
+            enddate=args.enddate,
+            maxpages=args.maxpages,
+            pagesize=args.pagesize,
+            sort=args.sort,
+            limiter=limiter,
+        )
+        df = normalize_token_rows(rows, sym)
+        df["exchange"] = label
+        return df
+
+    results: Dict[Tuple[str, str], pd.DataFrame] = {}
+    failed: Dict[Tuple[str, str], Exception] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {(sym, label): pool.submit(one, sym, contract, label, addr)
+                   for sym, contract in tokens for label, addr in pairs}
+        for key, fut in futures.items():
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                failed[key] = e
+                print(f"   ✗ {key[0]}/{key[1]}: {e}")
+    return results, failed
+
+
+def _fetch_rows(name: str, allow_truncated: bool, **kwargs) -> List[dict]:
+    """fetch_pages_for_address ; tronqué -> avertissement + lignes reçues si allow_truncated, sinon exception."""
+    try:
+        rows = fetch_pages_for_address(**kwargs)
+    except TruncatedFetch as e:
+        if not allow_truncated:
+            raise
+        print(f"   ⚠️ {name}: {len(e.rows)} lignes, INCOMPLET ({e})")
+        return e.rows
+    print(f"   ✓ {name}: {len(rows)} lignes")
+    return rows
+
+
 # ---------- Main ----------
 
 def main():
@@ -218,13 +398,30 @@ def main():
     ap.add_argument("--pagesize", type=int, default=1000, help="Taille page (défaut 1000)")
     ap.add_argument("--sort", choices=["asc", "desc"], default="desc", help="Ordre de tri Etherscan (défaut: desc)")
     ap.add_argument("--outdir", default="data", help="Dossier de sortie CSV")
+    ap.add_argument("--tokens", help='Mode batch: "SYM=contrat,SYM2=contrat2" ou fichier JSON {SYM: contrat}')
+    ap.add_argument("--workers", type=int, default=4, help="Requêtes concurrentes en mode batch (défaut 4)")
+    ap.add_argument("--rps", type=float, default=4.0, help="Budget global de requêtes/s Etherscan en mode batch (défaut 4)")
+    ap.add_argument("--provider", choices=TRANSFER_PROVIDERS, default=os.getenv("TRANSFER_PROVIDER", "live"),
+                    help="Source des transferts : live (Etherscan), cache (réponses enregistrées), "
+                         "fixture (synthétique déterministe). Défaut: TRANSFER_PROVIDER, sinon live")
+    ap.add_argument("--seed", type=int, default=0, help="Graine du provider fixture (défaut 0)")
+    ap.add_argument("--allow-truncated", action="store_true",
+                    help="Écrit les lignes reçues quand la pagination est tronquée (--maxpages ou 10 000 "
+                         "résultats Etherscan) au lieu de mettre la combinaison en échec")
     args = ap.parse_args()
 
-    api_key = os.getenv("ETHERSCAN_API_KEY", "").strip()
-    if not api_key:
-        raise SystemExit("ETHERSCAN_API_KEY non défini (setx / $env:ETHERSCAN_API_KEY)")
+    if args.provider == "live":
+        api_key = os.getenv("ETHERSCAN_API_KEY", "").strip()
+        if not api_key:
+            raise SystemExit("ETHERSCAN_API_KEY non défini (setx / $env:ETHERSCAN_API_KEY)")
+        provider = transfer_provider("live", api_key=api_key, session=make_session(pool_size=max(1, args.workers)))
+    elif args.provider == "fixture":
+        provider = transfer_provider("fixture", seed=args.seed)
+    else:
+        provider = transfer_provider(args.provider)
 
     pairs = parse_addresses(args.addresses, args.config)
+    tokens = parse_tokens(args.tokens) if args.tokens else None
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
 
     # Si dates fournies mais pas de blocs, on convertit en plage de blocs
@@ -232,8 +429,8 @@ def main():
         ts_start = to_utc_ts(args.startdate, end=False)
         ts_end = to_utc_ts(args.enddate, end=True)
         try:
-            sblk = block_by_time(ts_start, "after", api_key)
-            eblk = block_by_time(ts_end, "before", api_key)
+            sblk = block_by_time(ts_start, "after", provider)
+            eblk = block_by_time(ts_end, "before", provider)
             print(f"[info] block range: {sblk} → {eblk}")
             args.startblock, args.endblock = sblk, eblk
         except Exception as e:
@@ -247,28 +444,51 @@ def main():
         period.append(f"blk{args.startblock or 'min'}_{args.endblock or 'max'}")
     period_str = "__".join(period) if period else "all"
 
+    if tokens:
+        print(f"→ Batch: {len(tokens)} token(s) × {len(pairs)} adresse(s)")
+        results, failed = fetch_batch(provider, pairs, tokens, args, RateLimiter(args.rps))
+        for (sym, label), df in results.items():
+            df.to_csv(outdir / f"{sym.lower()}_transfers_{label}_{period_str}.csv", index=False)
+        if results:
+            df_all = pd.concat(results.values(), ignore_index=True).sort_values(["timeStamp", "token", "exchange"])
+            out_all = outdir / f"erc20_transfers_all_{period_str}.csv"
+            df_all.to_csv(out_all, index=False)
+            print(f"✓ COMBINED: {len(df_all)} lignes ({len(tokens)} tokens) → {out_all.name}")
+        if failed:
+            raise SystemExit(f"⚠️ {len(failed)} combinaison(s) en échec (absentes du CSV combiné): "
+                             + ", ".join(f"{sym}/{label} ({e})" for (sym, label), e in failed.items()))
+        return
+
     combined = []
+    failed = {}
     for label, addr in pairs:
         print(f"→ Fetch {label} ({addr}) ...")
-        rows = fetch_pages_for_address(
-            api_key=api_key,
-            address=addr,
-            contract=args.contract,
-            startblock=args.startblock,
-            endblock=args.endblock,
-            startdate=args.startdate,
-            enddate=args.enddate,
-            maxpages=args.maxpages,
-            pagesize=args.pagesize,
-            sort=args.sort,
-        )
+        try:
+            rows = _fetch_rows(
+                label,
+                args.allow_truncated,
+                provider=provider,
+                address=addr,
+                contract=args.contract,
+                startblock=args.startblock,
+                endblock=args.endblock,
+                startdate=args.startdate,
+                enddate=args.enddate,
+                maxpages=args.maxpages,
+                pagesize=args.pagesize,
+                sort=args.sort,
+            )
+        except Exception as e:
+            failed[label] = e
+            print(f"   ✗ {label}: {e}")
+            continue
         df = normalize_rows(rows)
         df["exchange"] = label
 
         # sauvegarde par adresse
         out_file = outdir / f"lpt_transfers_{label}_{period_str}.csv"
         df.to_csv(out_file, index=False)
-        print(f"   ✓ {label}: {len(df)} lignes → {out_file.name}")
+        print(f"     → {out_file.name}")
 
         combined.append(df)
 
@@ -280,6 +500,9 @@ def main():
         print(f"✓ COMBINED: {len(df_all)} lignes → {out_all.name}")
     else:
         print("⚠️ Aucun résultat combiné.")
+    if failed:
+        raise SystemExit(f"⚠️ {len(failed)} adresse(s) en échec (absentes du CSV combiné): "
+                         + ", ".join(f"{label} ({e})" for label, e in failed.items()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+lead_lag_scan.py
+Balayage lead-lag : corrélation de chaque série X avec chaque série Y sur toute
+une plage de décalages (ex. -90..+90 jours), en un appel (common.correlation,
+corrélation croisée FFT), au lieu d'un shift_corr par lag et par paire.
+
+Convention (celle de utils.shift_corr) : corr(x_t, y_{t-lag}) ; best_lag > 0 =>
+Y précède X de best_lag pas, best_lag < 0 => X précède Y.
+
+Entrées : CSV quotidiens larges (date + colonnes) ou longs avec --x-by/--y-by
+(pivot date x groupe, ex. netflow par exchange). Chaque côté est placé sur un
+calendrier jour par jour complet (jours absents = NaN) avant transformation, et
+les deux côtés sur la même grille : un lag k vaut toujours k jours, et un
+rendement / une différence ne franchit pas un jour manquant. Les NaN sont
+ignorés paire par paire. Transformation optionnelle par côté (rendements pct,
+log-rendements, différences).
+
+Sorties :
+  - résumé : une ligne par paire (best_lag, best_corr, n, corr_lag0) ;
+  - profil : une ligne par lag, une colonne "x~y" par paire ;
+  - --rolling W : corrélation glissante de chaque paire à son best_lag.
+
+Usage:
+  python scripts/lead_lag_scan.py \
+    --x-csv data/netflow_daily_by_exchange_2025-05-01__2025-06-05.csv --x-cols netflow --x-by exchange \
+    --y-csv outputs/lpt_usage_vs_price.csv --y-cols price --y-transform pct \
+    --max-lag 90 --min-periods 30 --out data/lead_lag.csv
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.correlation import best_lag, lag_corr, rolling_lag_corr  # noqa: E402
+
+TRANSFORMS = ("none", "pct", "log", "diff")
+
+
+def load_side(path: str, cols: list[str], by: str | None, transform: str) -> pd.DataFrame:
+    """CSV -> DataFrame (index date, une colonne par série), transformé."""
+    df = pd.read_csv(path)
+    date_col = next((c for c in ("date", "ts", "timestamp") if c in df.columns), df.columns[0])
+    df[date_col] = pd.to_datetime(df[date_col])
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise SystemExit(f"Colonne(s) absente(s) de {path}: {', '.join(missing)}")
+    if by:
+        wide = df.pivot_table(index=date_col, columns=by, values=cols, aggfunc="sum").sort_index()
+        wide.columns = [f"{c}:{g}" if len(cols) > 1 else str(g) for c, g in wide.columns]
+    else:
+        wide = df.groupby(date_col)[cols].sum(min_count=1).sort_index()
+    # grille quotidienne complète : les lags et transformations comptent en jours, pas en lignes
+    wide = wide.asfreq("D")
+    wide.index.name = "date"
+
+    if transform == "pct":
+        wide = wide / wide.shift(1) - 1.0
+    elif transform == "log":
+        wide = np.log(wide.where(wide > 0)).diff()
+    elif transform == "diff":
+        wide = wide.diff()
+    return wide
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Balayage lead-lag (corrélation multi-lags, FFT) entre séries.")
+    ap.add_argument("--x-csv", required=True, help="CSV des séries X")
+    ap.add_argument("--x-cols", required=True, help="colonnes X (séparées par des virgules)")
+    ap.add_argument("--x-by", default=None, help="colonne de groupe pour une table longue X (ex: exchange)")
+    ap.add_argument("--x-transform", choices=TRANSFORMS, default="none")
+    ap.add_argument("--y-csv", default=None, help="CSV des séries Y (défaut: --x-csv)")
+    ap.add_argument("--y-cols", required=True, help="colonnes Y (séparées par des virgules)")
+    ap.add_argument("--y-by", default=None, help="colonne de groupe pour une table longue Y")
+    ap.add_argument("--y-transform", choices=TRANSFORMS, default="none")
+    ap.add_argument("--max-lag", type=int, default=90, help="lags -N..+N (défaut: 90)")
+    ap.add_argument("--min-periods", type=int, default=30,
+                    help="dates communes minimum pour une corrélation (défaut: 30)")
+    ap.add_argument("--rolling", type=int, default=None,
+                    help="fenêtre : corrélation glissante de chaque paire à son best_lag")
+    ap.add_argument("--out", default="data/lead_lag.csv",
+                    help="CSV résumé ; profil et glissant écrits à côté (_profile, _rolling)")
+    args = ap.parse_args()
+
+    split = lambda s: [c.strip() for c in s.split(",") if c.strip()]
+    xs = load_side(args.x_csv, split(args.x_cols), args.x_by, args.x_transform)
+    ys = load_side(args.y_csv or args.x_csv, split(args.y_cols), args.y_by, args.y_transform)
+    xs.columns = [f"x:{c}" if c in ys.columns else c for c in xs.columns]
+    data = xs.join(ys, how="outer").sort_index().asfreq("D")
+    x = data[xs.columns].to_numpy(dtype=float)
+    y = data[ys.columns].to_numpy(dtype=float)
+
+    lags, corr, n = lag_corr(x, y, args.max_lag, args.min_periods)       # (L, N, M)
+    lag, best = best_lag(lags, corr)
+    i0 = int(np.searchsorted(lags, 0))
+    pairs = [(i, j) for i in range(len(xs.columns)) for j in range(len(ys.columns))]
+    bi = np.argmax(np.where(np.isnan(corr), -1.0, np.abs(corr)), axis=0)
+    summary = pd.DataFrame([{
+        "x": xs.columns[i], "y": ys.columns[j],
+        "best_lag": lag[i, j], "best_corr": best[i, j], "n": int(n[bi[i, j], i, j]),
+        "corr_lag0": corr[i0, i, j],
+    } for i, j in pairs])
+    summary = summary.sort_values("best_corr", key=np.abs, ascending=False)
+    profile = pd.DataFrame({f"{xs.columns[i]}~{ys.columns[j]}": corr[:, i, j] for i, j in pairs},
+                           index=pd.Index(lags, name="lag"))
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(out, index=False)
+    out_profile = out.with_name(f"{out.stem}_profile{out.suffix}")
+    profile.to_csv(out_profile)
+
+    print(f"{len(pairs)} paire(s) x {len(lags)} lags ({lags[0]}..{lags[-1]}), {len(data)} dates")
+    print(summary.head(20).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n[OK] Écrit : {out}\n[OK] Écrit : {out_profile}")
+
+    if args.rolling:
+        rolled = {}
+        for i, j in pairs:
+            if np.isnan(lag[i, j]):
+                continue
+            k = int(lag[i, j])
+            rolled[f"{xs.columns[i]}~{ys.columns[j]}@{k}"] = rolling_lag_corr(
+                x[:, i], y[:, j], [k], args.rolling, min_periods=max(3, args.rolling // 2))[0]
+        out_rolling = out.with_name(f"{out.stem}_rolling{out.suffix}")
+        pd.DataFrame(rolled, index=data.index).to_csv(out_rolling)
+        print(f"[OK] Écrit : {out_rolling}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,38 @@
 netflow_multi_cex.py
 
 Calcule les inflows/outflows et le netflow quotidien par exchange à partir
-du CSV combiné issu de get_lpt_multi_cex.py, en utilisant un fichier JSON
-qui mappe chaque 'exchange' à son adresse (pour déterminer le sens).
+du CSV combiné issu de get_lpt_multi_cex.py, en utilisant un ou plusieurs
+fichiers JSON d'adresses labellisées (cf. common.labels.LabelRegistry).
+
+Chaque transfert est résolu côté 'from' et côté 'to' via le registre : un
+transfert entre deux adresses du même groupe (ex: hot -> cold Binance avec
+--by entity) n'est compté ni en inflow ni en outflow.
 
 Entrées:
   --combined  data/lpt_transfers_all_....csv
-  --config    scripts/cex_addresses.json (ex: {"binance20":"0xF977...","kraken_cold1":"0x22af..."})
+  --config    scripts/cex_addresses.json [autres.json ...]
+              (ex: {"binance20":"0xF977...","kraken_cold1":"0x22af..."})
+  --by        label (défaut) | entity (binance20+binance14+... -> binance)
+  --matrix    écrit aussi la matrice de flux quotidienne src x dst (cf. common.flows)
+  --prices    CSV de prix (data/lpt_market_180d.csv, data/cache_livepeer_usd_*.csv, horaire
+              possible) ou store natif data/prices/livepeer_usd.npz (intraday) ; ajoute inflow_usd / outflow_usd / netflow_usd, chaque transfert
+              étant valorisé au dernier prix connu à son horodatage.
+              Multi-token : "LPT=data/cache_livepeer_usd_180d.csv,GRT=..."
+  --size-buckets  ventile aussi inflow/outflow/netflow par tranche de taille de
+              transfert (bornes log, défaut 1e2,1e3,1e4,1e5 -> colonnes
+              inflow_lt100 ... netflow_ge100k), p.ex. pour isoler les flux "whale" ;
+              bornes explicites "1e2,1e4,1e6" ou log "lo:hi[:par_décade]" ("1e2:1e6:2").
 Sorties:
   data/netflow_daily_by_exchange_<period>.csv
   data/netflow_daily_total_<period>.csv
+  data/flow_matrix_<by>_<period>.npz (avec --matrix)
+
+Mode multi-token : si le CSV combiné vient de get_lpt_multi_cex.py --tokens
+(colonnes token / value_token), toutes les agrégations se font par
+(token, date, exchange) en une seule passe et les sorties deviennent
+  data/netflow_daily_by_token_exchange_<period>.csv
+  data/netflow_daily_total_by_token_<period>.csv
+  data/flow_matrix_<by>_<token>_<period>.npz (avec --matrix)
   docs/img/netflow_total_daily.png
   docs/img/inflow_outflow_total_daily.png
   docs/img/netflow_by_exchange.png
@@ -21,45 +44,128 @@ Dépendances: pandas, matplotlib
 """
 
 import argparse
+import sys
 from pathlib import Path
-import json
 from datetime import datetime, timezone
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 
-def load_mapping(config_path: str) -> dict:
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # normaliser en minuscule
-    return {k: str(v).lower() for k, v in data.items()}
+def _ensure_src_on_path():
+    here = Path(__file__).resolve()
+    repo_root = here.parent.parent          # .../crypto-ai-analytics
+    src_dir = repo_root / "src"
+    if src_dir.exists():
+        p = str(src_dir)
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+_ensure_src_on_path()
+
+from common.labels import LabelRegistry  # noqa: E402
+from common.flows import (  # noqa: E402
+    FlowMatrix, build_flow_matrix, read_price_csv, value_usd, parse_size_edges, size_bucket_labels,
+)
+
+DEDUP_KEYS = ["hash", "token", "from", "to", "value_LPT", "value_token"]
+
+
+def value_column(df: pd.DataFrame) -> str:
+    """Colonne de montant : value_token (CSV multi-token) sinon value_LPT."""
+    return "value_token" if "value_token" in df.columns else "value_LPT"
 
 
-def add_direction_flags(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
+def token_keys(df: pd.DataFrame) -> list[str]:
+    """Clé de groupement supplémentaire en mode multi-token."""
+    return ["token"] if "token" in df.columns else []
+
+
+def load_registry(config_paths: list[str]) -> LabelRegistry:
+    return LabelRegistry.from_json(*config_paths)
+
+
+def dedupe_transfers(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Ajoute les colonnes:
-      - exchange_addr: adresse (lower) de l'exchange
-      - direction: 'inflow' si to == exchange_addr, 'outflow' si from == exchange_addr, sinon 'other'
-      - signed_flow: +value_LPT pour inflow, -value_LPT pour outflow, 0 sinon
+    Le CSV combiné contient un transfert une fois par fichier d'adresse
+    (binance20 -> kraken apparaît côté binance20 ET côté kraken) : on garde
+    une seule ligne par transfert.
     """
-    df = df.copy()
-    df["from_l"] = df["from"].str.lower()
-    df["to_l"] = df["to"].str.lower()
+    keys = [c for c in DEDUP_KEYS if c in df.columns]
+    return df.drop_duplicates(subset=keys) if keys else df
 
-    # map label -> addr
-    df["exchange_addr"] = df["exchange"].map(mapping)
 
-    # direction
-    df["direction"] = "other"
-    df.loc[df["to_l"] == df["exchange_addr"], "direction"] = "inflow"
-    df.loc[df["from_l"] == df["exchange_addr"], "direction"] = "outflow"
+def add_direction_flags(df: pd.DataFrame, registry: LabelRegistry, by: str = "label") -> pd.DataFrame:
+    """
+    Renvoie un DataFrame long, une ligne par (transfert, côté labellisé):
+      - exchange: label (ou entité si by="entity") concerné
+      - direction: 'inflow' si 'to' appartient au groupe, 'outflow' si 'from'
+      - signed_flow: +montant pour inflow, -montant pour outflow
+    Les transferts internes à un groupe (from et to dans le même groupe) sont exclus.
+    """
+    df = dedupe_transfers(df)
+    src = registry.codes(df["from"], by=by)
+    dst = registry.codes(df["to"], by=by)
+    names = np.array(registry.names(by) + [""], dtype=object)
+
+    external = src != dst
+    value = df[value_column(df)].astype(float).to_numpy()
+    parts = []
+    for direction, codes, sign in (("inflow", dst, 1.0), ("outflow", src, -1.0)):
+        sel = external & (codes >= 0)
+        part = df.loc[sel].copy()
+        part["exchange"] = names[codes[sel]]
+        part["direction"] = direction
+        part["signed_flow"] = sign * value[sel]
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def flow_matrix(df: pd.DataFrame, registry: LabelRegistry, by: str = "label") -> FlowMatrix:
+    """
+    Matrice quotidienne src x dst (groupes + 'unlabeled') en une passe vectorisée.
+    Chaque transfert n'est compté qu'une fois (de son groupe source vers son groupe cible).
+    """
+    df = dedupe_transfers(df)
+    return build_flow_matrix(
+        df["date"],
+        registry.codes(df["from"], by=by),
+        registry.codes(df["to"], by=by),
+        df[value_column(df)].astype(float).to_numpy(),
+        registry.names(by),
+    )
 
-    # signed flow
-    df["signed_flow"] = 0.0
-    df.loc[df["direction"] == "inflow", "signed_flow"] = df.loc[df["direction"] == "inflow", "value_LPT"].astype(float)
-    df.loc[df["direction"] == "outflow", "signed_flow"] = -df.loc[df["direction"] == "outflow", "value_LPT"].astype(float)
 
+def parse_prices(prices_str: str) -> dict:
+    """
+    "data/lpt_market_180d.csv" -> {None: Series} (tous les transferts)
+    "LPT=a.csv,GRT=b.csv"      -> {"LPT": Series, "GRT": Series}
+    """
+    out = {}
+    for item in prices_str.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        sym, path = item.split("=", 1) if "=" in item else (None, item)
+        out[sym.strip().upper() if sym else None] = read_price_csv(path.strip())
+    return out
+
+
+def add_usd_value(df: pd.DataFrame, prices: dict) -> pd.DataFrame:
+    """Ajoute value_usd (jointure as-of sur timeStamp, cf. common.flows.value_usd)."""
+    df = df.copy()
+    ts = df["timeStamp"].to_numpy(dtype="int64")
+    amount = df[value_column(df)].astype(float).to_numpy()
+    usd = np.full(len(df), np.nan)
+    for sym, price in prices.items():
+        sel = np.ones(len(df), dtype=bool) if sym is None or "token" not in df.columns \
+            else (df["token"].str.upper() == sym).to_numpy()
+        usd[sel] = value_usd(ts[sel], amount[sel], price)
+    missing = int(np.isnan(usd).sum())
+    if missing:
+        print(f"[warn] {missing:,} transfert(s) sans prix (avant la série ou token sans --prices) : exclus des colonnes USD")
+    df["value_usd"] = usd
     return df
 
 
@@ -75,24 +181,58 @@ def ensure_date_column(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def aggregate_daily(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+def aggregate_daily(df: pd.DataFrame, size_edges=None) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Renvoie:
       daily_by_ex: index (date, exchange) -> inflow, outflow, netflow
       daily_total: index date -> inflow, outflow, netflow
-    """
-    # agrégation par (date, exchange, direction)
-    grp = df.groupby(["date", "exchange", "direction"], dropna=False)["value_LPT"].sum().unstack(fill_value=0)
-
-    # garantir colonnes
-    if "inflow" not in grp.columns: grp["inflow"] = 0.0
-    if "outflow" not in grp.columns: grp["outflow"] = 0.0
-
-    grp = grp[["inflow", "outflow"]].copy()
-    grp["netflow"] = grp["inflow"] - grp["outflow"]
+    (index préfixé par token en mode multi-token ; colonnes *_usd si value_usd présent)
 
-    # total par jour (somme des exchanges)
-    daily_total = grp.groupby(level="date")[["inflow", "outflow", "netflow"]].sum()
+    Une seule passe np.bincount sur (groupe, direction). Avec size_edges, chaque
+    transfert est aussi classé par np.digitize dans une tranche de taille et les
+    colonnes inflow_<tranche> / outflow_<tranche> / netflow_<tranche> sont ajoutées.
+    """
+    tok = token_keys(df)
+    keys = ["date", *tok, "exchange"]
+    vcol = value_column(df)
+    vcols = {vcol: ""}
+    if "value_usd" in df.columns:
+        vcols["value_usd"] = "_usd"
+
+    grouped = df.groupby(keys, sort=True, dropna=False)
+    gid = grouped.ngroup().to_numpy()
+    index = grouped.size().index
+    ng = len(index)
+    # 0 = inflow, 1 = outflow
+    slot = gid * 2 + (df["direction"] == "outflow").to_numpy()
+
+    grp = pd.DataFrame(index=index)
+    for col, suffix in vcols.items():
+        v = df[col].astype(float).to_numpy()
+        ok = ~np.isnan(v)
+        sums = np.bincount(slot[ok], weights=v[ok], minlength=2 * ng).reshape(ng, 2)
+        # NaN si le (groupe, sens) n'a que des montants manquants (cf. sum(min_count=1))
+        seen = np.bincount(slot, minlength=2 * ng).reshape(ng, 2) > 0
+        valid = np.bincount(slot[ok], minlength=2 * ng).reshape(ng, 2) > 0
+        sums = np.where(seen & ~valid, np.nan, sums)
+        grp["inflow" + suffix] = sums[:, 0]
+        grp["outflow" + suffix] = sums[:, 1]
+        grp["netflow" + suffix] = grp["inflow" + suffix] - grp["outflow" + suffix]
+
+    if size_edges is not None:
+        labels = size_bucket_labels(size_edges)
+        nb = len(labels)
+        v = df[vcol].astype(float).to_numpy()
+        bucket = np.digitize(v, size_edges)
+        sums = np.bincount((gid * nb + bucket) * 2 + (slot & 1), weights=v,
+                           minlength=ng * nb * 2).reshape(ng, nb, 2)
+        for i, lbl in enumerate(labels):
+            grp[f"inflow_{lbl}"] = sums[:, i, 0]
+            grp[f"outflow_{lbl}"] = sums[:, i, 1]
+            grp[f"netflow_{lbl}"] = sums[:, i, 0] - sums[:, i, 1]
+
+    # total par jour (somme des exchanges, par token le cas échéant)
+    daily_total = grp.groupby(level=["date", *tok]).sum(min_count=1)
 
     # remettre en DataFrame standard
     daily_by_ex = grp.reset_index()
@@ -111,8 +251,12 @@ def period_from_df(df: pd.DataFrame) -> str:
 
 def save_csvs(daily_by_ex: pd.DataFrame, daily_total: pd.DataFrame, out_data: Path, period: str):
     out_data.mkdir(parents=True, exist_ok=True)
-    f1 = out_data / f"netflow_daily_by_exchange_{period}.csv"
-    f2 = out_data / f"netflow_daily_total_{period}.csv"
+    if "token" in daily_by_ex.columns:
+        f1 = out_data / f"netflow_daily_by_token_exchange_{period}.csv"
+        f2 = out_data / f"netflow_daily_total_by_token_{period}.csv"
+    else:
+        f1 = out_data / f"netflow_daily_by_exchange_{period}.csv"
+        f2 = out_data / f"netflow_daily_total_{period}.csv"
     daily_by_ex.to_csv(f1, index=False)
     daily_total.to_csv(f2, index=False)
     print(f"✓ CSV: {f1.name}, {f2.name}")
@@ -177,7 +321,15 @@ def plot_by_exchange(daily_by_ex: pd.DataFrame, out_img: Path, top_n: int = 6):
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--combined", required=True, help="CSV combiné (get_lpt_multi_cex.py)")
-    ap.add_argument("--config", required=True, help="JSON mapping {exchange: address}")
+    ap.add_argument("--config", required=True, nargs="+", help="JSON {label: address} ou {entité: {label: address}} (plusieurs fichiers possibles)")
+    ap.add_argument("--by", choices=["label", "entity"], default="label",
+                    help="Agrégation par label d'adresse (défaut) ou par entité (exclut les transferts internes)")
+    ap.add_argument("--matrix", action="store_true",
+                    help="Écrit aussi la matrice de flux inter-exchanges (data/flow_matrix_<by>_<period>.npz)")
+    ap.add_argument("--size-buckets", nargs="?", const="default", default=None,
+                    help="Ventilation par taille de transfert; bornes optionnelles \"1e2,1e3,1e4,1e5\" "
+                         "ou log \"lo:hi[:per_decade]\" (ex: \"1e2:1e6:2\")")
+    ap.add_argument("--prices", help='CSV de prix pour les colonnes USD (ou "SYM=csv,SYM2=csv" en multi-token)')
     ap.add_argument("--out_data", default="data", help="Dossier sortie CSV (défaut: data)")
     ap.add_argument("--out_img", default="docs/img", help="Dossier sortie images (défaut: docs/img)")
     args = ap.parse_args()
@@ -189,24 +341,38 @@ def main():
     df = pd.read_csv(args.combined)
     if df.empty:
         raise SystemExit("Le CSV combiné est vide — lance d’abord get_lpt_multi_cex.py avec une période qui contient des transferts.")
-    for col in ["hash","blockNumber","timeStamp","from","to","value_LPT","exchange"]:
+    for col in ["hash","blockNumber","timeStamp","from","to",value_column(df),"exchange"]:
         if col not in df.columns:
             raise SystemExit(f"Colonne manquante dans le CSV combiné: {col}")
 
-    mapping = load_mapping(args.config)
+    registry = load_registry(args.config)
 
     # 2) Préparer date & direction
     df = ensure_date_column(df)
-    df = add_direction_flags(df, mapping)
+    if args.prices:
+        df = add_usd_value(df, parse_prices(args.prices))
+    flows = add_direction_flags(df, registry, by=args.by)
 
     # 3) Agrégations
-    daily_by_ex, daily_total = aggregate_daily(df)
+    size_edges = parse_size_edges(args.size_buckets) if args.size_buckets else None
+    daily_by_ex, daily_total = aggregate_daily(flows, size_edges=size_edges)
     period = period_from_df(daily_by_ex)
 
     # 4) Sauvegardes CSV
     save_csvs(daily_by_ex, daily_total, out_data, period)
-
-    # 5) Graphiques
+    if args.matrix:
+        parts = df.groupby("token") if token_keys(df) else [(None, df)]
+        for tok, part in parts:
+            fm = flow_matrix(part, registry, by=args.by)
+            tag = f"{args.by}_{str(tok).lower()}" if tok is not None else args.by
+            f3 = out_data / f"flow_matrix_{tag}_{period}.npz"
+            fm.save(f3)
+            print(f"✓ Matrix: {f3.name} ({len(fm.value):,} cellules non nulles, {len(fm.names)} groupes)")
+
+    # 5) Graphiques (unités LPT : non pertinents si plusieurs tokens)
+    if token_keys(df) and df["token"].nunique() > 1:
+        print("Done. (graphiques ignorés en mode multi-token)")
+        return
     plot_total_series(daily_total, out_img)
     plot_by_exchange(daily_by_ex, out_img, top_n=6)
 
@@ -2,7 +2,7 @@
 """
 plot_netflow_zscore.py
 - Lit un CSV "netflow_daily_total_*.csv" (colonnes: date,inflow,outflow,netflow)
-- Calcule moyenne/écart-type roulants et z-score sur 'netflow'
+- Calcule moyenne/écart-type roulants (ou médiane/MAD, --detector mad) et z-score sur 'netflow'
 - Marque les anomalies (|z| >= seuil)
 - Exporte un CSV des anomalies et 2 graphiques PNG
 
@@ -14,6 +14,7 @@ Usage:
 """
 
 import argparse
+import sys
 from pathlib import Path
 
 import numpy as np
@@ -21,6 +22,16 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.rolling import DETECTORS, DETECTOR_COLUMNS, rolling_detector  # noqa: E402
+
+
 def read_csv_robust(csv_path: str) -> pd.DataFrame:
     """Lit un CSV avec gestion d'encodage Windows/UTF-8."""
     try:
@@ -29,26 +40,29 @@ def read_csv_robust(csv_path: str) -> pd.DataFrame:
         return pd.read_csv(csv_path, parse_dates=["date"], encoding="latin1")
 
 
-def compute_zscore(df: pd.DataFrame, col: str, win: int) -> pd.DataFrame:
+def compute_zscore(df: pd.DataFrame, col: str, win: int, detector: str = "zscore") -> pd.DataFrame:
     df = df.copy()
     df = df.sort_values("date").reset_index(drop=True)
 
-    # rolling moyenne / std (min_periods = moitié de la fenêtre, min 3)
+    # rolling moyenne / std ou médiane / MAD (min_periods = moitié de la fenêtre, min 3)
+    # échelle nulle -> z = 0 (pas d'alerte) ; fenêtres incomplètes -> 0
     minp = max(3, win // 2)
-    df["roll_mean"] = df[col].rolling(win, min_periods=minp).mean()
-    df["roll_std"] = df[col].rolling(win, min_periods=minp).std(ddof=0)
-
-    # éviter division par zéro
-    safe_std = df["roll_std"].replace(0, np.nan)
-    df["zscore"] = (df[col] - df["roll_mean"]) / safe_std
+    z, m, sd = rolling_detector(df[col].to_numpy(dtype=float), win, detector=detector,
+                                min_periods=minp, zero_std="zero")
+    c_center, c_scale = DETECTOR_COLUMNS[detector]
+    df[c_center], df[c_scale], df["zscore"] = m, sd, z
     df["zscore"] = df["zscore"].fillna(0.0)
 
     return df
 
 
+def _stat_cols(df: pd.DataFrame):
+    return next(cols for cols in DETECTOR_COLUMNS.values() if cols[0] in df.columns)
+
+
 def save_anomalies(df: pd.DataFrame, z: float, out_csv: Path) -> pd.DataFrame:
     mask = df["zscore"].abs() >= z
-    anomalies = df.loc[mask, ["date", "inflow", "outflow", "netflow", "roll_mean", "roll_std", "zscore"]]
+    anomalies = df.loc[mask, ["date", "inflow", "outflow", "netflow", *_stat_cols(df), "zscore"]]
     anomalies = anomalies.sort_values("date")
     out_csv.parent.mkdir(parents=True, exist_ok=True)
     anomalies.to_csv(out_csv, index=False)
@@ -58,13 +72,14 @@ def save_anomalies(df: pd.DataFrame, z: float, out_csv: Path) -> pd.DataFrame:
 def plot_netflow_with_bands(df: pd.DataFrame, out_dir: Path, title_suffix: str = ""):
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Figure 1: netflow + moyenne mobile ± 2*std
+    # Figure 1: netflow + moyenne (ou médiane) mobile ± 2*std (ou 2*MAD normalisée)
+    c_center, c_scale = _stat_cols(df)
     plt.figure(figsize=(11, 4.5))
     plt.plot(df["date"], df["netflow"], label="Netflow total (LPT)")
-    plt.plot(df["date"], df["roll_mean"], label=f"Moyenne mobile")
+    plt.plot(df["date"], df[c_center], label="Médiane mobile" if c_center == "roll_median" else "Moyenne mobile")
     # bandes ±2σ
-    upper = df["roll_mean"] + 2 * df["roll_std"]
-    lower = df["roll_mean"] - 2 * df["roll_std"]
+    upper = df[c_center] + 2 * df[c_scale]
+    lower = df[c_center] - 2 * df[c_scale]
     plt.plot(df["date"], upper, linestyle="--", label="+2σ")
     plt.plot(df["date"], lower, linestyle="--", label="-2σ")
     plt.title(f"Netflow total avec bandes ±2σ {title_suffix}".strip())
@@ -106,6 +121,8 @@ def main():
     ap.add_argument("--out_csv", default=None, help="Chemin CSV de sortie des anomalies (par défaut: à côté du CSV source)")
     ap.add_argument("--win", type=int, default=7, help="Fenêtre rolling (jours). Défaut: 7")
     ap.add_argument("--z", type=float, default=2.5, help="Seuil z-score. Défaut: 2.5")
+    ap.add_argument("--detector", choices=DETECTORS, default="zscore",
+                    help="zscore (moyenne/écart-type) ou mad (médiane/MAD, robuste aux pics). Défaut: zscore")
     args = ap.parse_args()
 
     csv_total = Path(args.csv_total)
@@ -125,11 +142,11 @@ def main():
     if "outflow" not in df.columns:
         df["outflow"] = np.nan
 
-    df = compute_zscore(df, col="netflow", win=args.win)
+    df = compute_zscore(df, col="netflow", win=args.win, detector=args.detector)
 
     anomalies = save_anomalies(df, z=args.z, out_csv=out_csv)
-    f1 = plot_netflow_with_bands(df, out_img, title_suffix=f"(win={args.win})")
-    f2 = plot_zscore(df, args.z, out_img, title_suffix=f"(win={args.win}, z={args.z:g})")
+    f1 = plot_netflow_with_bands(df, out_img, title_suffix=f"(win={args.win}, {args.detector})")
+    f2 = plot_zscore(df, args.z, out_img, title_suffix=f"(win={args.win}, z={args.z:g}, {args.detector})")
 
     # Résumé console
     if anomalies.empty:
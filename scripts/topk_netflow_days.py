@@ -2,18 +2,67 @@
 """
 topk_netflow_days.py
 Lister les top-k jours de netflow par |z-score| (total + par exchange).
+
+Par exchange : exchange factorisé une fois (codes réutilisés pour le tri de la
+table longue et la sélection), z glissant groupé en une passe (common.rolling,
+groups=...), puis top-k par groupe via un seul np.lexsort et un rang dans le
+groupe (O(n log n), mémoire O(n)) au lieu d'une boucle groupby.
 """
 
 import argparse
+import sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def compute_z(df: pd.DataFrame, win: int):
-    df = df.sort_values("date").reset_index(drop=True)
-    df["roll_mean"] = df["netflow"].rolling(win, min_periods=max(3, win//2)).mean()
-    df["roll_std"]  = df["netflow"].rolling(win, min_periods=max(3, win//2)).std(ddof=0)
-    df["zscore"]    = (df["netflow"] - df["roll_mean"]) / df["roll_std"]
-    return df
+
+def _ensure_src_on_path():
+    src_dir = Path(__file__).resolve().parent.parent / "src"
+    if src_dir.exists() and str(src_dir) not in sys.path:
+        sys.path.insert(0, str(src_dir))
+
+_ensure_src_on_path()
+
+from common.rolling import DETECTORS, DETECTOR_COLUMNS, rolling_detector  # noqa: E402
+
+
+def compute_z(df: pd.DataFrame, win: int, detector: str = "zscore", codes: np.ndarray | None = None):
+    """
+    z glissant sur 'netflow' ; avec codes (entiers de groupe alignés sur df, cf.
+    pd.factorize), fenêtres par groupe. Renvoie (df trié, codes dans l'ordre de df
+    ou None) : table triée par groupe puis date.
+    """
+    if codes is not None:
+        # tri (groupe, date) sur une clé entière unique groupe * n_jours + jour :
+        # pas de second factorize des chaînes
+        day = df["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        day -= day.min() if len(day) else 0
+        order = np.argsort(codes.astype(np.int64) * (int(day.max(initial=0)) + 1) + day)
+        df, codes = df.iloc[order].reset_index(drop=True), codes[order]
+    else:
+        df = df.sort_values("date", kind="mergesort").reset_index(drop=True)
+    z, m, sd = rolling_detector(df["netflow"].to_numpy(dtype=float), win, detector=detector,
+                                min_periods=max(3, win//2), zero_std="inf", groups=codes)
+    c_center, c_scale = DETECTOR_COLUMNS[detector]
+    df[c_center], df[c_scale], df["zscore"] = m, sd, z
+    return df, codes
+
+
+def topk_rows(score: np.ndarray, groups: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices des k plus grands scores de chaque groupe (codes entiers), groupe par
+    groupe, score décroissant (NaN en dernier), puis position. Un np.lexsort
+    stable (groupe, -score) + rang dans le groupe < k : O(n log n), mémoire O(n).
+    """
+    n = len(score)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    key = np.where(np.isnan(score), -1.0, score)              # |z| >= 0 : NaN après les valeurs
+    order = np.lexsort((-key, groups))
+    g = groups[order]
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    rank = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+    return order[rank < k]
 
 def main():
     ap = argparse.ArgumentParser()
@@ -21,6 +70,8 @@ def main():
     ap.add_argument("--by_csv",    required=True, help="CSV netflow_daily_by_exchange")
     ap.add_argument("--k", type=int, default=10, help="nombre de jours à garder")
     ap.add_argument("--win", type=int, default=7, help="fenêtre rolling (jours)")
+    ap.add_argument("--detector", choices=DETECTORS, default="zscore",
+                    help="zscore (moyenne/écart-type) ou mad (médiane/MAD, robuste aux pics)")
     ap.add_argument("--out_data", required=True, help="répertoire de sortie CSV")
     ap.add_argument("--out_md",   required=True, help="répertoire de sortie Markdown")
     args = ap.parse_args()
@@ -32,19 +83,15 @@ def main():
 
     # --- Total ---
     dft = pd.read_csv(args.total_csv, parse_dates=["date"])
-    dft = compute_z(dft, args.win)
-    top_total = dft.reindex(dft["zscore"].abs().sort_values(ascending=False).index).head(args.k)
+    dft, _ = compute_z(dft, args.win, args.detector)
+    top_total = dft.iloc[topk_rows(dft["zscore"].abs().to_numpy(), np.zeros(len(dft), dtype=np.int64), args.k)]
     top_total.to_csv(out_data/"topk_netflow_total.csv", index=False)
 
     # --- Par exchange ---
     dfb = pd.read_csv(args.by_csv, parse_dates=["date"])
-    dfs = []
-    for ex, grp in dfb.groupby("exchange"):
-        g2 = compute_z(grp.copy(), args.win)
-        top_ex = g2.reindex(g2["zscore"].abs().sort_values(ascending=False).index).head(args.k)
-        top_ex["exchange"] = ex
-        dfs.append(top_ex)
-    top_by = pd.concat(dfs, ignore_index=True)
+    dfb, codes = compute_z(dfb, args.win, args.detector, codes=pd.factorize(dfb["exchange"], sort=True)[0])
+    top_by = dfb.iloc[topk_rows(dfb["zscore"].abs().to_numpy(), codes, args.k)]
+    top_by = top_by.reset_index(drop=True)
     top_by.to_csv(out_data/"topk_netflow_by_exchange.csv", index=False)
 
     # --- Markdown résumé ---
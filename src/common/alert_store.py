@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+alert_store.py
+
+Mémoire des alertes déjà émises (stdlib uniquement : sqlite3).
+
+Clé (series, date, detector), table WITHOUT ROWID : ajout et test d'existence
+en O(log n) sans relire ni réécrire l'historique ; la rétention est un DELETE
+sur l'index de date (pas de réécriture du fichier complet). Reste compact et
+rapide à des millions d'alertes sur de nombreuses séries.
+
+Usage :
+    store = AlertStore(".agent_memory/netflow_agent.sqlite")
+    with store.transaction():
+        new = store.add_many([("total", "2025-06-01", "zscore", 3.2, 7.3e6)])
+        ...                        # rollback si une exception est levée ici
+    store.prune(before="2025-05-01")
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# (series, date, detector, zscore, value)
+Alert = Tuple[str, str, str, Optional[float], Optional[float]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    series     TEXT NOT NULL,
+    date       TEXT NOT NULL,
+    detector   TEXT NOT NULL,
+    zscore     REAL,
+    value      REAL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (series, date, detector)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS alerts_date ON alerts (date);
+"""
+
+
+class AlertStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._depth = 0
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "AlertStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["AlertStore"]:
+        """Regroupe des écritures (commit à la sortie, rollback sur exception)."""
+        if self._depth:
+            yield self
+            return
+        self._depth += 1
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self._depth -= 1
+
+    # ------------------------------------------------------------------ write
+    def add(self, series: str, date: str, detector: str,
+            zscore: Optional[float] = None, value: Optional[float] = None) -> bool:
+        """Enregistre une alerte ; False si elle existait déjà."""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?, ?, ?)",
+            (series, date, detector, zscore, value, datetime.now(UTC).isoformat(timespec="seconds")),
+        )
+        return cur.rowcount == 1
+
+    def add_many(self, alerts: Iterable[Alert]) -> List[Alert]:
+        """Enregistre les alertes et renvoie celles qui étaient nouvelles (ordre conservé)."""
+        new = []
+        with self.transaction():
+            for a in alerts:
+                if self.add(*a):
+                    new.append(a)
+        return new
+
+    def prune(self, before: str, series: Optional[str] = None) -> int:
+        """Supprime les alertes datées avant `before` (ISO) ; renvoie le nombre supprimé."""
+        if series is None:
+            cur = self.conn.execute("DELETE FROM alerts WHERE date < ?", (before,))
+        else:
+            cur = self.conn.execute("DELETE FROM alerts WHERE date < ? AND series = ?", (before, series))
+        return cur.rowcount
+
+    # ----------------------------------------------------------------- lookup
+    def seen(self, series: str, date: str, detector: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM alerts WHERE series = ? AND date = ? AND detector = ?",
+            (series, date, detector),
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+    def dates(self, series: str, detector: Optional[str] = None) -> List[str]:
+        if detector is None:
+            rows = self.conn.execute("SELECT DISTINCT date FROM alerts WHERE series = ? ORDER BY date", (series,))
+        else:
+            rows = self.conn.execute(
+                "SELECT date FROM alerts WHERE series = ? AND detector = ? ORDER BY date", (series, detector))
+        return [r[0] for r in rows]
+
+    # -------------------------------------------------------------- migration
+    def import_seen_dates(self, json_path, series: str, detector: str) -> int:
+        """
+        Reprend l'ancienne mémoire JSON {"seen_dates": [...]} puis la renomme
+        en <nom>.migrated (migration faite une seule fois). Renvoie le nombre importé.
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        try:
+            dates: Sequence[str] = json.loads(json_path.read_text(encoding="utf-8")).get("seen_dates", [])
+        except Exception:
+            dates = []
+        n = len(self.add_many((series, str(d), detector, None, None) for d in dates))
+        json_path.replace(json_path.with_name(json_path.name + ".migrated"))
+        return n
+
+
+__all__ = ["AlertStore", "Alert"]
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+changepoint.py
+
+Détection en ligne de ruptures de régime (stdlib uniquement, cf. common.streaming).
+Là où un z glissant signale un pic isolé, ces détecteurs signalent un changement
+durable de niveau du netflow d'une série.
+
+- Cusum : CUSUM bilatéral sur le résidu standardisé par une ligne de base
+  (moyenne / écart-type des `warmup` premiers points du régime). O(1) par point.
+- Bocpd : détection bayésienne en ligne (Adams & MacKay) avec modèle normal à
+  moyenne et variance inconnues (prior normal-gamma, prédictive de Student).
+  La loi a posteriori de la longueur de run est tronquée à `max_run` hypothèses
+  (les plus longues fusionnées, les négligeables élaguées) : travail borné par point.
+
+Les deux exposent update(x) -> Optional[RegimeShift] et to_dict / from_dict
+(état JSON persistable par l'agent, comme RollingStats).
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class RegimeShift:
+    direction: str     # "up" / "down"
+    run: int           # nb de points depuis la rupture estimée (point courant inclus)
+    score: float       # CUSUM : statistique cumulée ; BOCPD : P(2 <= run <= lag)
+    before: float      # niveau du régime précédent
+    after: float       # niveau estimé du nouveau régime
+
+
+class _Warmup:
+    """Moyenne / écart-type (ddof=0) des premiers points d'un régime, par Welford."""
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def std(self) -> float:
+        return math.sqrt(max(self.m2, 0.0) / self.n) if self.n else 0.0
+
+
+def _floor_std(sd: float, mean: float) -> float:
+    # ligne de base constante (flux nuls...) : écart-type plancher pour qu'un saut reste détectable
+    return max(sd, 1e-9 * max(1.0, abs(mean)))
+
+
+class Cusum:
+    """
+    CUSUM bilatéral : S+ = max(0, S+ + z - k), S- = max(0, S- - z - k) avec
+    z = (x - moyenne de base) / écart-type de base ; rupture quand S > h
+    (k = moitié du saut visé en écarts-types : 1.0 cible un décalage de 2 sigma).
+    z est écrêté à ±clip : un pic isolé ne suffit pas à déclarer une rupture.
+    La rupture est datée au dernier passage de S à 0 (`run`), puis la ligne de
+    base est réapprise sur les `warmup` points suivants (à partir du point courant).
+    """
+
+    def __init__(self, warmup: int = 30, k: float = 1.0, h: float = 5.0, clip: float = 3.0):
+        if warmup < 2:
+            raise ValueError("warmup doit être >= 2")
+        self.warmup = int(warmup)
+        self.k = float(k)
+        self.h = float(h)
+        self.clip = float(clip)
+        self._reset()
+
+    def _reset(self) -> None:
+        self.base = _Warmup()
+        self.mean = self.std = None
+        self.hi = self.lo = 0.0
+        self.hi_n = self.lo_n = 0          # points depuis le dernier S = 0
+        self.hi_sum = self.lo_sum = 0.0
+
+    @property
+    def params(self) -> dict:
+        return {"warmup": self.warmup, "k": self.k, "h": self.h, "clip": self.clip}
+
+    def update(self, x: float) -> Optional[RegimeShift]:
+        x = float(x)
+        if self.mean is None:
+            self.base.add(x)
+            if self.base.n == self.warmup:
+                self.mean = self.base.mean
+                self.std = _floor_std(self.base.std(), self.mean)
+            return None
+
+        z = min(max((x - self.mean) / self.std, -self.clip), self.clip)
+        self.hi = max(0.0, self.hi + z - self.k)
+        self.lo = max(0.0, self.lo - z - self.k)
+        self.hi_n, self.hi_sum = (self.hi_n + 1, self.hi_sum + x) if self.hi > 0 else (0, 0.0)
+        self.lo_n, self.lo_sum = (self.lo_n + 1, self.lo_sum + x) if self.lo > 0 else (0, 0.0)
+
+        if self.hi <= self.h and self.lo <= self.h:
+            return None
+        if self.hi >= self.lo:
+            shift = RegimeShift("up", self.hi_n, self.hi, self.mean, self.hi_sum / self.hi_n)
+        else:
+            shift = RegimeShift("down", self.lo_n, self.lo, self.mean, self.lo_sum / self.lo_n)
+        self._reset()
+        self.base.add(x)
+        return shift
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {
+            **self.params, "base": [self.base.n, self.base.mean, self.base.m2],
+            "mean": self.mean, "std": self.std, "hi": [self.hi, self.hi_n, self.hi_sum],
+            "lo": [self.lo, self.lo_n, self.lo_sum],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Cusum":
+        cu = cls(d["warmup"], d["k"], d["h"], d.get("clip", 3.0))
+        cu.base.n, cu.base.mean, cu.base.m2 = int(d["base"][0]), float(d["base"][1]), float(d["base"][2])
+        cu.mean, cu.std = d.get("mean"), d.get("std")
+        cu.hi, cu.hi_n, cu.hi_sum = float(d["hi"][0]), int(d["hi"][1]), float(d["hi"][2])
+        cu.lo, cu.lo_n, cu.lo_sum = float(d["lo"][0]), int(d["lo"][1]), float(d["lo"][2])
+        return cu
+
+
+class Bocpd:
+    """
+    BOCPD tronqué. Chaque hypothèse de run (nb de points depuis la rupture) garde
+    les paramètres a posteriori (mu, kappa, beta ; alpha = alpha0 + (kappa - 1) / 2).
+    Prior : moyenne / variance des `warmup` premiers points (kappa0 = alpha0 = 1),
+    qui forment aussi le premier run.
+    Alerte quand P(2 <= run <= lag) >= p, une fois par rupture (réarmée quand la
+    probabilité retombe sous p) : le run 1 (point courant seul) est exclu pour
+    qu'un pic isolé ne soit pas pris pour un changement de régime.
+    """
+
+    ALPHA0 = 1.0
+    PRUNE = 1e-10
+
+    def __init__(self, warmup: int = 30, hazard: float = 0.004, max_run: int = 100,
+                 lag: int = 10, p: float = 0.5, outlier: float = 0.05):
+        if warmup < 2:
+            raise ValueError("warmup doit être >= 2")
+        if not 0.0 < hazard < 1.0:
+            raise ValueError("hazard doit être dans ]0, 1[")
+        if not 0.0 < outlier < 1.0:
+            raise ValueError("outlier doit être dans ]0, 1[")
+        if max_run <= lag:
+            raise ValueError("max_run doit être > lag")
+        self.warmup = int(warmup)
+        self.hazard = float(hazard)
+        self.max_run = int(max_run)
+        self.lag = int(lag)
+        self.p = float(p)
+        self.outlier = float(outlier)
+        self.base = _Warmup()
+        self.mu0: Optional[float] = None
+        self.beta0 = 0.0
+        self.alarm = False
+        # hypothèses de run, de la plus courte à la plus longue
+        self.runs: List[int] = []
+        self.probs: List[float] = []
+        self.mu: List[float] = []
+        self.kappa: List[float] = []
+        self.beta: List[float] = []
+        self._const: Dict[float, float] = {}
+
+    @property
+    def params(self) -> dict:
+        return {"warmup": self.warmup, "hazard": self.hazard, "max_run": self.max_run,
+                "lag": self.lag, "p": self.p, "outlier": self.outlier}
+
+    def _logc(self, kappa: float) -> float:
+        """Partie constante du log de la prédictive de Student (ne dépend que de kappa)."""
+        c = self._const.get(kappa)
+        if c is None:
+            a = self.ALPHA0 + 0.5 * (kappa - 1.0)
+            c = math.lgamma(a + 0.5) - math.lgamma(a) - 0.5 * math.log(2.0 * a * math.pi)
+            if len(self._const) < 4 * self.max_run:
+                self._const[kappa] = c
+        return c
+
+    def _logpred(self, x: float, mu: float, kappa: float, beta: float) -> float:
+        a = self.ALPHA0 + 0.5 * (kappa - 1.0)
+        s2 = beta * (kappa + 1.0) / (a * kappa)
+        return (self._logc(kappa) - 0.5 * math.log(s2)
+                - (a + 0.5) * math.log1p((x - mu) ** 2 * kappa / (2.0 * beta * (kappa + 1.0))))
+
+    def update(self, x: float) -> Optional[RegimeShift]:
+        x = float(x)
+        if self.mu0 is None:
+            self.base.add(x)
+            if self.base.n == self.warmup:
+                self.mu0 = self.base.mean
+                self.beta0 = self.ALPHA0 * _floor_std(self.base.std(), self.mu0) ** 2
+                # hypothèse initiale : le warm-up est le premier run (posterior du prior)
+                n = self.base.n
+                self.runs, self.probs = [n], [1.0]
+                self.mu, self.kappa, self.beta = [self.mu0], [1.0 + n], [self.beta0 + 0.5 * self.base.m2]
+            return None
+
+        log_h, log_1h = math.log(self.hazard), math.log1p(-self.hazard)
+        # croissance : chaque run s'allonge de x ; rupture : x ouvre un run sous le prior.
+        # Vraisemblance planchée à outlier * prédictive du prior : un point aberrant pour
+        # un run ne l'élimine pas à lui seul (et ne met pas à jour ses paramètres).
+        lp0 = self._logpred(x, self.mu0, 1.0, self.beta0)
+        floor = math.log(self.outlier) + lp0
+        lps = [self._logpred(x, m, k, b) for m, k, b in zip(self.mu, self.kappa, self.beta)]
+        logs = [(math.log(p) if p > 0 else -math.inf) + max(lp, floor) + log_1h
+                for p, lp in zip(self.probs, lps)]
+        cp = log_h + lp0
+        top = max(max(logs), cp)
+        grow = [math.exp(v - top) for v in logs]
+        new = math.exp(cp - top)
+        total = new + sum(grow)
+
+        runs, probs, mu, kappa, beta = [1], [new / total], [], [], []
+        mu.append((self.mu0 + x) / 2.0)
+        kappa.append(2.0)
+        beta.append(self.beta0 + (x - self.mu0) ** 2 / 4.0)
+        for r, g, lp, m, k, b in zip(self.runs, grow, lps, self.mu, self.kappa, self.beta):
+            pr = g / total
+            if pr < self.PRUNE:
+                continue
+            runs.append(r + 1)
+            probs.append(pr)
+            if lp >= floor:
+                m, k, b = (k * m + x) / (k + 1.0), k + 1.0, b + k * (x - m) ** 2 / (2.0 * (k + 1.0))
+            mu.append(m)
+            kappa.append(k)
+            beta.append(b)
+        if len(runs) > self.max_run:
+            # hypothèses les plus longues fusionnées : « run >= max_run »
+            probs[-1] += probs.pop(-2)
+            for lst in (runs, mu, kappa, beta):
+                del lst[-2]
+        self.runs, self.probs, self.mu, self.kappa, self.beta = runs, probs, mu, kappa, beta
+
+        recent = [i for i, r in enumerate(runs) if 2 <= r <= self.lag]
+        p_recent = sum(probs[i] for i in recent)
+        if not recent or p_recent < self.p:
+            self.alarm = False
+            return None
+        if self.alarm:
+            return None
+        self.alarm = True
+        i_new = max(recent, key=lambda i: probs[i])
+        old = [i for i in range(len(runs)) if runs[i] > self.lag]
+        w_old = sum(probs[i] for i in old)
+        before = sum(probs[i] * mu[i] for i in old) / w_old if w_old > 0 else self.mu0
+        after = mu[i_new]
+        return RegimeShift("up" if after >= before else "down", runs[i_new], p_recent, before, after)
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {
+            **self.params, "base": [self.base.n, self.base.mean, self.base.m2],
+            "mu0": self.mu0, "beta0": self.beta0, "alarm": self.alarm,
+            "runs": self.runs, "probs": self.probs, "mu": self.mu, "kappa": self.kappa, "beta": self.beta,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Bocpd":
+        bo = cls(d["warmup"], d["hazard"], d["max_run"], d["lag"], d["p"], d.get("outlier", 0.05))
+        bo.base.n, bo.base.mean, bo.base.m2 = int(d["base"][0]), float(d["base"][1]), float(d["base"][2])
+        bo.mu0, bo.beta0, bo.alarm = d.get("mu0"), float(d.get("beta0", 0.0)), bool(d.get("alarm"))
+        bo.runs = [int(r) for r in d.get("runs", [])]
+        bo.probs = [float(v) for v in d.get("probs", [])]
+        bo.mu = [float(v) for v in d.get("mu", [])]
+        bo.kappa = [float(v) for v in d.get("kappa", [])]
+        bo.beta = [float(v) for v in d.get("beta", [])]
+        return bo
+
+
+CHANGEPOINTS = {"cusum": Cusum, "bocpd": Bocpd}
+
+
+def make_changepoint(kind: str, warmup: int, **params):
+    """Instancie le détecteur de rupture 'cusum' ou 'bocpd' (paramètres propres en kwargs)."""
+    try:
+        cls = CHANGEPOINTS[kind]
+    except KeyError:
+        raise ValueError(f"Détecteur de rupture inconnu: {kind} (choix: {', '.join(CHANGEPOINTS)})") from None
+    return cls(warmup, **params)
+
+
+__all__ = ["RegimeShift", "Cusum", "Bocpd", "CHANGEPOINTS", "make_changepoint"]
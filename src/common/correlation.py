@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+correlation.py
+
+Matrices de corrélation / covariance / bêta glissantes sur N actifs à partir de
+sommes cumulées de produits croisés, O(N²) par pas quelle que soit la fenêtre.
+Les sommes sont internes à des tranches de `window` lignes et centrées sur une
+valeur de la partie sommée (cf. common.rolling._moments) : pas de dérive ni de
+perte de précision après un changement de niveau. Le temps est traité par blocs
+vectorisés (mémoire bloc x N x N).
+
+NaN (calendriers non alignés) : chaque paire (i, j) n'utilise que les dates où
+les deux séries sont valides, comme DataFrame.rolling(w).corr() (pairwise) ;
+min_periods porte sur ce nombre de dates communes.
+
+Sorties (T, N, N) :
+  - "corr" : corrélation de Pearson ;
+  - "cov"  : covariance (ddof=1, comme pandas) ;
+  - "beta" : beta[t, i, j] = cov(i, j) / var(j), pente de i régressé sur j.
+iter_rolling_corr produit les mêmes valeurs bloc par bloc (flux compact).
+
+Lead-lag (même convention que utils.shift_corr : corr(x_t, y_{t-lag}), lag > 0
+=> y en avance sur x) :
+  - lag_corr          : profil complet -max_lag..+max_lag pour toutes les paires
+                        (colonnes de x) x (colonnes de y), par corrélation croisée
+                        FFT des sommes masquées -> O(T log T) par paire ;
+  - rolling_lag_corr  : corrélation glissante pour une liste de lags (iter_rolling_corr) ;
+  - best_lag          : lag du |corr| maximal de chaque profil.
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from .rolling import _chunk_cumsum, _chunk_refs, _chunks
+
+# variance relative en dessous de laquelle une série est considérée constante (cf. common.rolling)
+_ZERO_VAR_RTOL = 1e-12
+
+OUTPUTS = ("corr", "cov", "beta")
+
+
+def _as_2d(x) -> np.ndarray:
+    arr = np.asarray(x, dtype=float)
+    if arr.ndim != 2:
+        raise ValueError("x doit être 2-D (temps x actifs)")
+    return arr
+
+
+def _centered(x2d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    valid = ~np.isnan(x2d)
+    center = np.where(valid, x2d, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    return np.where(valid, x2d - center, 0.0), valid.astype(float)
+
+
+def _increments(x0: np.ndarray, v: np.ndarray):
+    """Produits croisés par date : (n, sx, sxx, sxy), chacun (B, N, N)."""
+    n = v[:, :, None] * v[:, None, :]
+    sx = x0[:, :, None] * v[:, None, :]            # x_i sur les dates où j est valide
+    sxx = (x0 * x0)[:, :, None] * v[:, None, :]
+    sxy = x0[:, :, None] * x0[:, None, :]
+    return n, sx, sxx, sxy
+
+
+def _part(sums, ref: np.ndarray):
+    """
+    Sommes (n, sx, sxx, sxy) d'une partie de fenêtre, x centré sur ref (B, N) ->
+    (n, moyenne x, moyenne y, co-moments cxx, cyy, cxy, Σx², Σy²) par paire.
+    """
+    n, sx, sxx, sxy = sums
+    sy = np.swapaxes(sx, -1, -2)
+    syy = np.swapaxes(sxx, -1, -2)
+    nn = np.maximum(n, 1.0)
+    mx = ref[:, :, None] + sx / nn
+    my = ref[:, None, :] + sy / nn
+    cxx = np.maximum(sxx - sx * sx / nn, 0.0)
+    cyy = np.maximum(syy - sy * sy / nn, 0.0)
+    return n, mx, my, cxx, cyy, sxy - sx * sy / nn, sxx, syy
+
+
+def _combine(a, b):
+    """Deux parties disjointes d'une fenêtre (formule de Chan) -> (n, cxx, cyy, cxy, échelles x, y)."""
+    na, mxa, mya, cxxa, cyya, cxya, sxxa, syya = a
+    nb, mxb, myb, cxxb, cyyb, cxyb, sxxb, syyb = b
+    n = na + nb
+    both = (na > 0) & (nb > 0)
+    w = np.where(both, na * nb / np.maximum(n, 1.0), 0.0)
+    dx = np.where(both, mxb - mxa, 0.0)
+    dy = np.where(both, myb - mya, 0.0)
+    return (n, cxxa + cxxb + w * dx * dx, cyya + cyyb + w * dy * dy, cxya + cxyb + w * dx * dy,
+            sxxa + sxxb + w * dx * dx, syya + syyb + w * dy * dy)
+
+
+def _finish(n, cxx, cyy, cxy, scale_x, scale_y, minp: int, ddof: int, out: str) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zero_x = cxx <= _ZERO_VAR_RTOL * np.maximum(scale_x, np.finfo(float).tiny)
+        zero_y = cyy <= _ZERO_VAR_RTOL * np.maximum(scale_y, np.finfo(float).tiny)
+        if out == "corr":
+            res = cxy / np.sqrt(cxx * cyy)
+            res = np.where(zero_x | zero_y, np.nan, np.clip(res, -1.0, 1.0))
+        elif out == "cov":
+            res = cxy / (n - ddof)
+        else:
+            res = np.where(zero_y, np.nan, cxy / cyy)
+    ok = (n >= minp) & (n > ddof if out == "cov" else n > 0)
+    return np.where(ok, res, np.nan)
+
+
+def iter_rolling_corr(x, window: int, min_periods: Optional[int] = None, out: str = "corr",
+                      ddof: int = 1, block: int = 256) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Parcourt x (T, N) par blocs : produit (t0, res) avec res (B, N, N) pour les
+    dates t0 .. t0 + B - 1. Le temps est découpé en tranches de `window` lignes ;
+    la fenêtre [t - window + 1, t] = fin de la tranche précédente + début de celle
+    de t, chaque partie sommée dans sa tranche et centrée sur une de ses valeurs
+    (première / dernière valide), puis combinée (cf. common.rolling._moments).
+    """
+    if out not in OUTPUTS:
+        raise ValueError(f"out doit valoir {', '.join(OUTPUTS)}")
+    if window < 1:
+        raise ValueError("window doit être >= 1")
+    x2d = _as_2d(x)
+    t = x2d.shape[0]
+    minp = window if min_periods is None else int(min_periods)
+    block = -(-max(int(block), window) // window) * window      # multiple de window
+
+    for a in range(0, t, block):
+        b = min(a + block, t)
+        lo = max(a - window, 0)                                   # tranche précédente incluse
+        xs = x2d[lo:b]
+        v = ~np.isnan(xs)
+        k, off, nk = _chunks(len(xs), window)
+        rf, rl = _chunk_refs(xs, v, k, off, nk, window)
+        vf = v.astype(float)
+
+        pre = [_chunk_cumsum(q, k, off, nk, window)[a - lo:]
+               for q in _increments(np.where(v, xs - rf, 0.0), vf)]
+        rows = np.arange(a, b) - lo
+        s = np.maximum(rows - window + 1, 0)
+        two = (s < rows - off[a - lo:])[:, None, None]
+        suf = [np.where(two, _chunk_cumsum(q, k, off, nk, window, reverse=True)[s], 0.0)
+               for q in _increments(np.where(v, xs - rl, 0.0), vf)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            res = _combine(_part(pre, rf[a - lo:]), _part(suf, rl[s]))
+        yield a, _finish(*res, minp, ddof, out)
+
+
+def rolling_corr_matrix(x, window: int, min_periods: Optional[int] = None, out: str = "corr",
+                        ddof: int = 1, block: int = 256) -> np.ndarray:
+    """Matrices glissantes (T, N, N) : corrélation, covariance ou bêta (cf. out)."""
+    x2d = _as_2d(x)
+    res = np.empty((x2d.shape[0], x2d.shape[1], x2d.shape[1]))
+    for a, r in iter_rolling_corr(x2d, window, min_periods, out, ddof, block):
+        res[a:a + len(r)] = r
+    return res
+
+
+def _pearson(n, sx, sy, sxx, syy, sxy, minp: int) -> np.ndarray:
+    """Corrélation de Pearson à partir des sommes par paire (garde-fou variance nulle)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cxy = sxy - sx * sy / n
+        cxx = sxx - sx * sx / n
+        cyy = syy - sy * sy / n
+        zero = ((cxx <= _ZERO_VAR_RTOL * np.maximum(sxx, np.finfo(float).tiny))
+                | (cyy <= _ZERO_VAR_RTOL * np.maximum(syy, np.finfo(float).tiny)))
+        res = np.clip(cxy / np.sqrt(cxx * cyy), -1.0, 1.0)
+    return np.where(zero | (n < max(minp, 2)), np.nan, res)
+
+
+def _cols(x) -> Tuple[np.ndarray, bool]:
+    arr = np.asarray(x, dtype=float)
+    if arr.ndim == 1:
+        return arr[:, None], True
+    return _as_2d(arr), False
+
+
+def lag_corr(x, y, max_lag: int = 90, min_periods: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Corrélation de x_t avec y_{t-lag} pour lag = -max_lag..+max_lag, sur les dates
+    où les deux valeurs existent (= x.corr(y.shift(lag)) de pandas).
+    x (T,) ou (T, N), y (T,) ou (T, M) -> (lags, corr, n) avec corr et n de forme
+    (L,), (L, N), (L, M) ou (L, N, M) selon les dimensions d'entrée.
+    Les six sommes par lag (n, Σx, Σy, Σx², Σy², Σxy) sont des corrélations
+    croisées calculées par FFT, pour tous les lags et toutes les paires d'un coup.
+    """
+    x2d, x1 = _cols(x)
+    y2d, y1 = _cols(y)
+    if x2d.shape[0] != y2d.shape[0]:
+        raise ValueError("x et y doivent avoir la même longueur")
+    t = x2d.shape[0]
+    max_lag = int(min(max_lag, max(t - 1, 0)))
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    x0, vx = _centered(x2d)
+    y0, vy = _centered(y2d)
+    nfft = 1 << max(int(np.ceil(np.log2(max(t + max_lag, 1)))), 0)
+    fx = np.fft.rfft(np.stack([vx, x0, x0 * x0]), nfft, axis=1)     # (3, F, N)
+    fy = np.fft.rfft(np.stack([vy, y0, y0 * y0]), nfft, axis=1)     # (3, F, M)
+
+    def xc(i: int, j: int) -> np.ndarray:
+        # r[k] = Σ_t a(t) b(t - k) ; lags négatifs en fin de tampon circulaire
+        r = np.fft.irfft(fx[i][:, :, None] * np.conj(fy[j])[:, None, :], nfft, axis=0)
+        return r[lags % nfft]
+
+    n = np.rint(xc(0, 0))
+    corr = _pearson(n, xc(1, 0), xc(0, 1), xc(2, 0), xc(0, 2), xc(1, 1), min_periods)
+    if y1:
+        corr, n = corr[..., 0], n[..., 0]
+    if x1:
+        corr, n = corr[:, 0], n[:, 0]
+    return lags, corr, n.astype(np.int64)
+
+
+def best_lag(lags, corr) -> Tuple[np.ndarray, np.ndarray]:
+    """Lag du |corr| maximal le long de l'axe 0 (NaN ignorés) -> (lag, corr) ; NaN si profil vide."""
+    lags = np.asarray(lags)
+    c = np.asarray(corr, dtype=float)
+    a = np.where(np.isnan(c), -1.0, np.abs(c))
+    i = np.argmax(a, axis=0)
+    best = np.take_along_axis(c, np.expand_dims(i, 0), axis=0)[0]
+    empty = np.all(np.isnan(c), axis=0)
+    lag = np.where(empty, np.nan, lags[i].astype(float))
+    return lag, np.where(empty, np.nan, best)
+
+
+def rolling_lag_corr(x, y, lags, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """
+    Corrélation glissante de x_t avec y_{t-lag} pour chaque lag : x, y (T,) -> (L, T).
+    Valeur en t = fenêtre [t - window + 1, t] des dates de x ; une paire (x, y décalé)
+    par lag passée à iter_rolling_corr (sommes par tranche, O(T) par lag).
+    """
+    if window < 1:
+        raise ValueError("window doit être >= 1")
+    xv = np.asarray(x, dtype=float).ravel()
+    yv = np.asarray(y, dtype=float).ravel()
+    if len(xv) != len(yv):
+        raise ValueError("x et y doivent avoir la même longueur")
+    lags = np.atleast_1d(np.asarray(lags, dtype=np.int64))
+    t = len(xv)
+    minp = max(window if min_periods is None else int(min_periods), 2)
+
+    out = np.full((len(lags), t), np.nan)
+    for i, lag in enumerate(lags):
+        src = np.arange(t) - lag
+        ok = (src >= 0) & (src < t)
+        ys = np.where(ok, yv[np.clip(src, 0, max(t - 1, 0))], np.nan)
+        if t:
+            out[i] = rolling_corr_matrix(np.column_stack([xv, ys]), window, minp)[:, 0, 1]
+    return out
+
+
+__all__ = ["iter_rolling_corr", "rolling_corr_matrix", "lag_corr", "best_lag", "rolling_lag_corr", "OUTPUTS"]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+csv_tail.py
+
+Lecture incrémentale d'un CSV qui grossit par ajout de lignes (stdlib uniquement).
+
+- changed() : simple os.stat (taille / mtime / inode), quasi gratuit au repos.
+- read()    : ne lit que les octets ajoutés depuis l'offset mémorisé ; relit tout
+              le fichier seulement s'il a été réécrit (inode différent, fichier
+              plus court, ou derniers octets déjà lus modifiés).
+Une ligne finale incomplète (sans '\\n') n'est pas consommée : elle sera relue
+au prochain appel. L'état se sérialise en JSON (to_dict / from_dict).
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class CsvTail:
+    # taille de l'empreinte des octets précédant l'offset (détection de réécriture)
+    SIG_BYTES = 256
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offset = 0
+        self.header: Optional[List[str]] = None
+        self.size: Optional[int] = None
+        self.mtime_ns: Optional[int] = None
+        self.ino: Optional[int] = None
+        self.sig = ""
+
+    def _stat(self) -> Tuple[int, int, int]:
+        st = os.stat(self.path)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def changed(self) -> bool:
+        """True si le fichier a bougé depuis le dernier read() (ou n'a jamais été lu)."""
+        try:
+            return self._stat() != (self.size, self.mtime_ns, self.ino)
+        except FileNotFoundError:
+            return False
+
+    def _signature(self, f, end: int) -> str:
+        start = max(0, end - self.SIG_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+    def read(self) -> Tuple[bool, List[Dict[str, str]]]:
+        """
+        Renvoie (reloaded, rows) : rows = lignes complètes ajoutées depuis le
+        dernier appel, ou toutes les lignes si reloaded (fichier réécrit / 1re lecture).
+        """
+        size, mtime_ns, ino = self._stat()
+        with open(self.path, "rb") as f:
+            reloaded = (
+                self.header is None
+                or ino != self.ino
+                or size < self.offset
+                or self._signature(f, self.offset) != self.sig
+            )
+            start = 0 if reloaded else self.offset
+            f.seek(start)
+            data = f.read()
+            cut = data.rfind(b"\n") + 1
+            new_offset = start + cut
+            sig = self._signature(f, new_offset)
+
+        lines = data[:cut].decode("utf-8-sig" if start == 0 else "utf-8").splitlines()
+        if reloaded:
+            self.header = None
+            if lines:
+                self.header = next(csv.reader([lines[0]]))
+                lines = lines[1:]
+        rows = []
+        if self.header:
+            for vals in csv.reader(lines):
+                if vals:
+                    rows.append(dict(zip(self.header, vals)))
+            self.offset = new_offset
+        else:
+            self.offset = 0
+        self.sig = sig if self.header else ""
+        self.size, self.mtime_ns, self.ino = size, mtime_ns, ino
+        return reloaded, rows
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {"path": str(self.path), "offset": self.offset, "header": self.header,
+                "size": self.size, "mtime_ns": self.mtime_ns, "ino": self.ino, "sig": self.sig}
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict], path) -> "CsvTail":
+        tail = cls(path)
+        if d and Path(d.get("path", "")) == tail.path:
+            tail.offset = int(d.get("offset", 0))
+            tail.header = d.get("header")
+            tail.size, tail.mtime_ns, tail.ino = d.get("size"), d.get("mtime_ns"), d.get("ino")
+            tail.sig = d.get("sig", "")
+        return tail
+
+
+__all__ = ["CsvTail"]
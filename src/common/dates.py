@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+dates.py
+
+Helpers datetime UTC (timezone-aware), sans dépendance.
+"""
+from datetime import datetime, UTC, date
+
+
+def utc_today() -> date:
+    """Renvoie la date du jour (YYYY-MM-DD) en UTC."""
+    return datetime.now(UTC).date()
+
+def utc_now() -> datetime:
+    """Renvoie un datetime timezone-aware (UTC)."""
+    return datetime.now(UTC)
+
+
+__all__ = ["utc_today", "utc_now"]
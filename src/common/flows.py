@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+flows.py
+
+Matrice de flux inter-exchanges quotidienne (jour x source x destination),
+stockée sous forme creuse (COO : tableaux day/src/dst/value triés par clé).
+
+Les contreparties non labellisées sont regroupées sous "unlabeled" (dernier
+indice), de sorte que la matrice couvre à la fois les flux CEX -> CEX et
+CEX <-> reste du monde. La diagonale contient les flux internes à un groupe.
+
+Valorisation USD : jointure "as-of" triée (np.searchsorted) de chaque
+transfert sur le dernier prix connu à son horodatage (quotidien ou horaire).
+
+Tranches de taille : bornes log (10^2, 10^3, ...) -> np.digitize, pour séparer
+flux "retail" et "whale" dans la même passe d'agrégation (np.bincount).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .labels import UNLABELED
+
+
+@dataclass
+class FlowMatrix:
+    days: np.ndarray          # datetime64[D], jours distincts triés
+    names: List[str]          # groupes (labels ou entités) + "unlabeled" en dernier
+    day: np.ndarray           # int32, indice dans days
+    src: np.ndarray           # int32, indice dans names
+    dst: np.ndarray           # int32, indice dans names
+    value: np.ndarray         # float64, somme des montants
+    _keys: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._keys = self._key(self.day, self.src, self.dst)
+
+    # ----------------------------------------------------------------- index
+    def _key(self, day, src, dst):
+        k = len(self.names)
+        return (np.asarray(day, dtype=np.int64) * k + src) * k + dst
+
+    def _day_pos(self, day) -> int:
+        d = np.datetime64(pd.Timestamp(day).date(), "D")
+        i = int(np.searchsorted(self.days, d))
+        if i >= len(self.days) or self.days[i] != d:
+            return -1
+        return i
+
+    def _name_pos(self, name: str) -> int:
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError(f"Groupe inconnu: {name}") from None
+
+    # ---------------------------------------------------------------- lookups
+    def get(self, day, src: str, dst: str) -> float:
+        """Montant transféré de src vers dst le jour donné (0 si aucun)."""
+        d = self._day_pos(day)
+        if d < 0:
+            return 0.0
+        k = self._key(d, self._name_pos(src), self._name_pos(dst))
+        i = int(np.searchsorted(self._keys, k))
+        return float(self.value[i]) if i < len(self._keys) and self._keys[i] == k else 0.0
+
+    def between(self, src: str, dst: str) -> pd.Series:
+        """Série quotidienne src -> dst sur toute la période (0 les jours sans flux)."""
+        s, t = self._name_pos(src), self._name_pos(dst)
+        sel = (self.src == s) & (self.dst == t)
+        out = np.zeros(len(self.days))
+        np.add.at(out, self.day[sel], self.value[sel])
+        return pd.Series(out, index=pd.DatetimeIndex(self.days, name="date"), name=f"{src}->{dst}")
+
+    def dense(self, day=None) -> pd.DataFrame:
+        """Matrice N x N (src en lignes, dst en colonnes) d'un jour, ou de toute la période."""
+        n = len(self.names)
+        sel = slice(None)
+        if day is not None:
+            d = self._day_pos(day)
+            sel = self.day == d
+        mat = np.zeros((n, n))
+        np.add.at(mat, (self.src[sel], self.dst[sel]), self.value[sel])
+        return pd.DataFrame(mat, index=pd.Index(self.names, name="src"), columns=pd.Index(self.names, name="dst"))
+
+    def to_frame(self) -> pd.DataFrame:
+        names = np.asarray(self.names, dtype=object)
+        return pd.DataFrame({
+            "date": self.days[self.day],
+            "src": names[self.src],
+            "dst": names[self.dst],
+            "value": self.value,
+        })
+
+    # ------------------------------------------------------------ persistence
+    def save(self, path) -> None:
+        np.savez_compressed(
+            path, days=self.days.astype("datetime64[D]").astype(np.int64),
+            names=np.asarray(self.names, dtype=str),
+            day=self.day, src=self.src, dst=self.dst, value=self.value,
+        )
+
+    @classmethod
+    def load(cls, path) -> "FlowMatrix":
+        with np.load(path) as z:
+            return cls(
+                days=z["days"].astype("datetime64[D]"),
+                names=[str(n) for n in z["names"]],
+                day=z["day"], src=z["src"], dst=z["dst"], value=z["value"],
+            )
+
+
+def build_flow_matrix(days: Sequence, src_codes: np.ndarray, dst_codes: np.ndarray,
+                      values: np.ndarray, names: Sequence[str],
+                      unlabeled: Optional[str] = UNLABELED) -> FlowMatrix:
+    """
+    Construit la matrice en une passe : clé (jour, src, dst) -> np.unique + bincount.
+    src_codes / dst_codes : codes de groupe (-1 = non labellisé, cf. LabelRegistry.codes).
+    """
+    names = list(names) + [unlabeled]
+    k = len(names)
+    d = pd.to_datetime(pd.Series(days)).to_numpy().astype("datetime64[D]")
+    day_vals, day_idx = np.unique(d, return_inverse=True)
+    src = np.where(src_codes < 0, k - 1, src_codes).astype(np.int64)
+    dst = np.where(dst_codes < 0, k - 1, dst_codes).astype(np.int64)
+
+    keys = (day_idx.astype(np.int64) * k + src) * k + dst
+    ukeys, inv = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inv, weights=np.asarray(values, dtype=float), minlength=len(ukeys))
+
+    return FlowMatrix(
+        days=day_vals,
+        names=names,
+        day=(ukeys // (k * k)).astype(np.int32),
+        src=((ukeys // k) % k).astype(np.int32),
+        dst=(ukeys % k).astype(np.int32),
+        value=sums,
+    )
+
+
+# -----------------------------------------------------------------------------
+# Valorisation (jointure as-of sur une série de prix)
+# -----------------------------------------------------------------------------
+def read_price_csv(path, col: str = "price") -> pd.Series:
+    """
+    Lit une série de prix horodatée (index = 1re colonne), p.ex.
+    data/lpt_market_<days>d.csv ou data/cache_<coin>_<vs>_<days>d.csv, ou un
+    fichier du store natif data/prices/<coin>_<vs>.npz (points horaires / 5 min).
+    """
+    if str(path).endswith(".npz"):
+        with np.load(path) as z:
+            idx = pd.DatetimeIndex(z["ts"].astype("datetime64[ms]")).as_unit("ns")
+            s = pd.Series(z[col].astype(float), index=idx, name=col).dropna()
+        return s[~s.index.duplicated(keep="last")].sort_index()
+    df = pd.read_csv(path, index_col=0)
+    df.index = pd.to_datetime(df.index, utc=True).tz_convert(None)
+    s = pd.to_numeric(df[col], errors="coerce").dropna()
+    return s[~s.index.duplicated(keep="last")].sort_index()
+
+
+def asof_prices(ts_s, price: pd.Series) -> np.ndarray:
+    """
+    Prix du dernier point <= ts pour chaque horodatage UNIX (secondes).
+    NaN avant le premier point de prix. O((n + m) log m), sans tri des transferts.
+    """
+    px_ts = price.index.values.astype("datetime64[s]").astype(np.int64)
+    px = price.to_numpy(dtype=float)
+    idx = np.searchsorted(px_ts, np.asarray(ts_s, dtype=np.int64), side="right") - 1
+    out = px[np.clip(idx, 0, None)] if len(px) else np.full(len(idx), np.nan)
+    return np.where(idx >= 0, out, np.nan)
+
+
+def value_usd(ts_s, amounts, price: pd.Series) -> np.ndarray:
+    """Montants valorisés au dernier prix connu (cf. asof_prices)."""
+    return np.asarray(amounts, dtype=float) * asof_prices(ts_s, price)
+
+
+# -----------------------------------------------------------------------------
+# Tranches de taille (log)
+# -----------------------------------------------------------------------------
+DEFAULT_SIZE_EDGES = (1e2, 1e3, 1e4, 1e5)
+
+
+def log_size_edges(lo: float = 1e2, hi: float = 1e5, per_decade: int = 1) -> np.ndarray:
+    """Bornes log-espacées de lo à hi inclus (per_decade bornes par décade), à 3 chiffres significatifs."""
+    if lo <= 0 or hi <= lo or per_decade < 1:
+        raise ValueError(f"Bornes log invalides (0 < lo < hi, per_decade >= 1): {lo}, {hi}, {per_decade}")
+    n = int(round(np.log10(hi / lo) * per_decade)) + 1
+    # 316 / 1k plutôt que 316.227766 / 1000.0000000000001 : libellés de colonnes lisibles (size_bucket_labels)
+    return np.asarray([float(f"{v:.3g}") for v in np.logspace(np.log10(lo), np.log10(hi), n)])
+
+
+def parse_size_edges(spec: str | None) -> np.ndarray:
+    """
+    '1e2,1e3,1e4,1e5' -> bornes triées ; 'lo:hi[:per_decade]' (ex. '1e2:1e6:2')
+    -> log_size_edges(lo, hi, per_decade) ; 'default'/None -> DEFAULT_SIZE_EDGES.
+    """
+    if not spec or spec == "default":
+        return np.asarray(DEFAULT_SIZE_EDGES, dtype=float)
+    if ":" in spec:
+        parts = spec.split(":")
+        try:
+            if len(parts) not in (2, 3):
+                raise ValueError
+            edges = log_size_edges(float(parts[0]), float(parts[1]), int(parts[2]) if len(parts) == 3 else 1)
+        except ValueError:
+            raise ValueError(f"Bornes log invalides (attendu lo:hi[:per_decade], 0 < lo < hi): {spec}") from None
+    else:
+        edges = np.asarray([float(x) for x in spec.split(",") if x.strip()], dtype=float)
+    if edges.size == 0 or np.any(edges <= 0) or np.any(np.diff(edges) <= 0):
+        raise ValueError(f"Bornes de tranches invalides (positives, strictement croissantes): {spec}")
+    return edges
+
+
+def _fmt_size(x: float) -> str:
+    for suffix, unit in (("b", 1e9), ("m", 1e6), ("k", 1e3)):
+        if x >= unit and (x / unit) == int(x / unit):
+            return f"{int(x / unit)}{suffix}"
+    return f"{x:g}"
+
+
+def size_bucket_labels(edges) -> List[str]:
+    """[100, 1000, 1e5] -> ['lt100', '100_1k', '1k_100k', 'ge100k'] (indices de np.digitize)."""
+    e = [_fmt_size(float(x)) for x in edges]
+    return [f"lt{e[0]}"] + [f"{a}_{b}" for a, b in zip(e[:-1], e[1:])] + [f"ge{e[-1]}"]
+
+
+__all__ = [
+    "FlowMatrix", "build_flow_matrix",
+    "read_price_csv", "asof_prices", "value_usd",
+    "DEFAULT_SIZE_EDGES", "log_size_edges", "parse_size_edges", "size_bucket_labels",
+]
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+http_client.py
+
+Client HTTP CoinGecko, une seule couche de retry par appel logique :
+
+- RetryPolicy : budget total (tentatives ET secondes écoulées, attentes
+  comprises), backoff exponentiel plafonné avec jitter complet, Retry-After
+  respecté (abandon immédiat s'il dépasse le budget restant) ;
+- CircuitBreaker par hôte : après `threshold` échecs serveur consécutifs
+  (5xx, timeout, connexion), l'hôte est coupé `cooldown` secondes et les appels
+  échouent aussitôt (CircuitOpenError) ; une seule requête sonde le rouvre ;
+- RateBudget : débit partagé entre threads ; un 429 suspend tout le budget.
+
+_cg_get n'empile plus retry x bases x en-têtes : chaque variante
+d'authentification (en-tête démo, en-tête pro, paramètre) est essayée au plus
+une fois et celle qui est acceptée est mémorisée pour les appels suivants.
+Importé seulement par les fonctions qui font du réseau.
+"""
+import os
+import time
+import random
+import functools
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Politique de retry (budget, backoff + jitter, Retry-After)
+# -----------------------------------------------------------------------------
+class RetryPolicy:
+    """
+    Budget d'un appel logique : au plus max_attempts tentatives et max_elapsed
+    secondes, attentes comprises. Attente avant la tentative i + 1 : uniforme
+    dans [0, min(cap, base * 2^i)] (jitter complet, évite les rafales
+    synchronisées entre threads), jamais moins qu'un Retry-After.
+    """
+
+    def __init__(self, max_attempts: int = 6, max_elapsed: float = 90.0, base: float = 1.0,
+                 cap: float = 30.0, jitter: bool = True):
+        self.max_attempts = max(1, int(max_attempts))
+        self.max_elapsed = float(max_elapsed)
+        self.base = float(base)
+        self.cap = float(cap)
+        self.jitter = jitter
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Attente après la tentative `attempt` (0 = première) ratée."""
+        d = min(self.cap, self.base * (2 ** attempt))
+        if self.jitter:
+            d = random.uniform(0.0, d)
+        return max(d, float(retry_after or 0.0))
+
+    def allows(self, done: int, started: float, delay: float) -> bool:
+        """Une tentative de plus (après `done` tentatives et `delay` s d'attente) tient-elle dans le budget ?"""
+        return done < self.max_attempts and time.monotonic() - started + delay <= self.max_elapsed
+
+    def call(self, fn, *args, retry_on=(Exception,), **kwargs):
+        """fn(*args, **kwargs) rejouée dans le budget ; CircuitOpenError n'est jamais rejouée."""
+        started, done = time.monotonic(), 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except CircuitOpenError:
+                raise
+            except retry_on as e:
+                done += 1
+                delay = self.delay(done - 1)
+                if not self.allows(done, started, delay):
+                    raise
+                logger.warning("Retry %s/%s after error: %s; sleeping %.2fs", done, self.max_attempts - 1, e, delay)
+                time.sleep(delay)
+
+
+def retry(n: int = 3, wait: float = 1.0):
+    """
+    Décorateur retry : n tentatives, backoff exponentiel wait * 2^i avec jitter
+    (RetryPolicy sans limite de durée).
+    """
+    policy = RetryPolicy(max_attempts=n, max_elapsed=float("inf"), base=wait, cap=float("inf"))
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrap(*args, **kwargs):
+            return policy.call(fn, *args, **kwargs)
+        return wrap
+    return deco
+
+
+# budget d'un fetch CoinGecko (COINGECKO_MAX_ATTEMPTS requêtes, COINGECKO_MAX_ELAPSED secondes)
+CG_RETRY = RetryPolicy(int(os.getenv("COINGECKO_MAX_ATTEMPTS", "6") or 6),
+                       float(os.getenv("COINGECKO_MAX_ELAPSED", "90") or 90))
+
+
+def _sleep_from_retry_after(resp: requests.Response) -> Optional[int]:
+    """Parse l'en-tête Retry-After en secondes si présent et valide, sinon None."""
+    ra = resp.headers.get("Retry-After")
+    if ra:
+        try:
+            return max(1, int(float(ra)))
+        except Exception:
+            pass
+    return None
+
+
+# -----------------------------------------------------------------------------
+# Circuit breaker par hôte
+# -----------------------------------------------------------------------------
+class CircuitOpenError(requests.RequestException):
+    """Hôte coupé par son CircuitBreaker : échec immédiat, aucune requête envoyée."""
+
+
+class CircuitBreaker:
+    """
+    Fermé tant qu'il y a moins de `threshold` échecs consécutifs ; ouvert ensuite
+    pendant `cooldown` secondes (allow() = False) ; puis demi-ouvert : une seule
+    requête sonde passe, son succès referme le circuit, son échec le rouvre.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0, name: str = ""):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self.name = name
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._failures < self.threshold:
+                return "closed"
+            return "open" if time.monotonic() < self._open_until or self._probing else "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._failures < self.threshold:
+                return True
+            if time.monotonic() < self._open_until or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures, self._probing = 0, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+                logger.warning("Circuit ouvert pour %s (%s échecs consécutifs), pause %.0fs",
+                               self.name or "?", self._failures, self.cooldown)
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    """Circuit breaker partagé de l'hôte de url (HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_COOLDOWN)."""
+    host = urlsplit(url).netloc
+    with _BREAKERS_LOCK:
+        br = _BREAKERS.get(host)
+        if br is None:
+            br = _BREAKERS[host] = CircuitBreaker(int(os.getenv("HTTP_BREAKER_THRESHOLD", "5") or 5),
+                                                  float(os.getenv("HTTP_BREAKER_COOLDOWN", "60") or 60),
+                                                  name=host)
+        return br
+
+
+# -----------------------------------------------------------------------------
+# Débit partagé
+# -----------------------------------------------------------------------------
+class RateBudget:
+    """
+    Budget de requêtes partagé par tous les threads (seau à jetons) :
+    `per_min` requêtes par minute en régime, rafales jusqu'à `burst`.
+    defer(s) suspend tout le budget s secondes (Retry-After d'un 429) : les
+    autres appels attendent aussi au lieu d'enchaîner des 429.
+    """
+
+    def __init__(self, per_min: float, burst: int = 10):
+        self.rate = max(float(per_min), 1e-6) / 60.0
+        self.burst = max(1, int(burst))
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+
+    def wait(self) -> None:
+        """Bloque jusqu'à obtention d'un jeton (et fin d'une éventuelle pause globale)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if now >= self._paused_until and self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                delay = max(self._paused_until - now, (1.0 - self._tokens) / self.rate)
+            time.sleep(delay)
+
+    def defer(self, seconds: float) -> None:
+        """Suspend le budget pour tous (repousse seulement, ne raccourcit jamais une pause)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + float(seconds))
+            self._tokens = 0.0
+
+
+# budget CoinGecko commun (COINGECKO_CALLS_PER_MIN : 30 ≈ offre gratuite / demo, 500 en pro)
+_CG_BUDGET = RateBudget(float(os.getenv("COINGECKO_CALLS_PER_MIN", "30") or 30),
+                        int(os.getenv("COINGECKO_BURST", "10") or 10))
+# -----------------------------------------------------------------------------
+# HTTP helpers de base
+# -----------------------------------------------------------------------------
+def _http_get(url: str, headers: dict | None = None, timeout: float = 30) -> requests.Response:
+    """GET unique sous le budget de débit et le circuit breaker de l'hôte (5xx / réseau = échec)."""
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit ouvert pour {breaker.name} : requête non envoyée")
+    _CG_BUDGET.wait()
+    try:
+        r = requests.get(url, headers=headers or {}, timeout=timeout)
+    except requests.RequestException:
+        breaker.failure()
+        raise
+    if r.status_code >= 500:
+        breaker.failure()
+    else:
+        breaker.success()
+    return r
+
+def _cg_variants(url: str, key: str) -> List[Tuple[str, dict]]:
+    """(url, en-têtes) à essayer : public sans clé ; avec clé, démo puis pro puis paramètre démo."""
+    if "coingecko.com" not in url:
+        return [(url, {"x-cg-demo-api-key": key} if key else {})]
+    path = url.split("coingecko.com", 1)[-1]
+    if not key:
+        return [(f"https://api.coingecko.com{path}", {})]
+    sep = "&" if "?" in path else "?"
+    return [
+        (f"https://api.coingecko.com{path}", {"x-cg-demo-api-key": key}),
+        (f"https://pro-api.coingecko.com{path}", {"x-cg-pro-api-key": key}),
+        (f"https://pro-api.coingecko.com{path}{sep}x_cg_demo_api_key={key}", {}),
+    ]
+
+# variante d'authentification acceptée en dernier (réutilisée d'emblée)
+_CG_VARIANT = {"index": 0}
+
+def _cg_get(url: str, policy: Optional[RetryPolicy] = None) -> requests.Response:
+    """
+    Client CoinGecko tolérant aux rate-limits/erreurs, borné par `policy` (CG_RETRY) :
+    - 401/403 : variante d'authentification suivante, sans attente (cf. _cg_variants) ;
+    - 429 : Retry-After ou backoff, appliqué au budget commun (_CG_BUDGET) : un
+      429 suspend toutes les requêtes CoinGecko en cours ;
+    - 5xx / réseau : backoff avec jitter ; circuit breaker par hôte (échec qui
+      ouvre le circuit -> CircuitOpenError immédiate, sans backoff) ;
+    - autre 4xx : erreur immédiate.
+    """
+    policy = policy or CG_RETRY
+    variants = _cg_variants(url, os.getenv("COINGECKO_API_KEY", "").strip())
+    v = _CG_VARIANT["index"] if _CG_VARIANT["index"] < len(variants) else 0
+    rejected: set = set()
+    started, done = time.monotonic(), 0
+    last_exc: Optional[Exception] = None
+
+    while True:
+        full, headers = variants[v]
+        retry_after = None
+        try:
+            r = _http_get(full, headers=headers)
+        except CircuitOpenError:
+            raise
+        except requests.RequestException as e:
+            r, last_exc = None, e
+        done += 1
+
+        if r is not None:
+            if r.ok:
+                _CG_VARIANT["index"] = v
+                return r
+            if r.status_code in (401, 403):
+                rejected.add(v)
+                left = [i for i in range(len(variants)) if i not in rejected]
+                if not left or done >= policy.max_attempts:
+                    r.raise_for_status()
+                v = left[0]
+                continue
+            try:
+                r.raise_for_status()
+            except requests.HTTPError as e:
+                last_exc = e
+            if r.status_code == 429:
+                retry_after = _sleep_from_retry_after(r)
+            elif r.status_code < 500:
+                raise last_exc
+
+        delay = policy.delay(done - 1, retry_after)
+        if not policy.allows(done, started, delay):
+            raise last_exc
+        breaker = breaker_for(full)
+        if breaker.state == "open":
+            # cet échec a ouvert le circuit : la prochaine tentative serait refusée, inutile d'attendre
+            raise CircuitOpenError(f"Circuit ouvert pour {breaker.name} : abandon sans attente") from last_exc
+        if r is not None and r.status_code == 429:
+            logger.warning("Rate limited (429). Waiting %.1fs before retry...", delay)
+            _CG_BUDGET.defer(delay)
+        else:
+            logger.warning("CoinGecko %s/%s failed: %s; retrying in %.1fs", done, policy.max_attempts, last_exc, delay)
+            time.sleep(delay)
+
+
+__all__ = ["retry", "RetryPolicy", "CG_RETRY", "CircuitBreaker", "CircuitOpenError", "breaker_for", "RateBudget"]
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+indicator_cache.py
+
+Cache disque des indicateurs (common.indicators, common.correlation), clé =
+(empreinte du contenu de la série, indicateur, paramètre). Un fichier .npz par
+entrée (entrée x et résultat) sous INDICATOR_CACHE_DIR (data/indicator_cache ;
+"" désactive le cache).
+
+- série inchangée : résultat relu tel quel ;
+- série recouvrant une entrée en cache (lignes ajoutées, dernière(s) ligne(s)
+  révisée(s), et/ou début rogné comme la fenêtre glissante --days de
+  common.market) : on aligne la nouvelle série sur l'entrée qui partage le plus
+  long tronçon commun (x[0:m] == ancien x[d:d + m]) et seules les lignes hors
+  de ce tronçon sont calculées :
+    * fenêtres glissantes (z, apy, ret, corr) : lignes communes relues (hors
+      les `param` premières si le début a été rogné, recalculées), nouvelles
+      lignes recalculées sur les `param` dernières lignes communes + les nouvelles ;
+    * ema : début rogné -> e_new[i] = e_old[d + i] + (1 - alpha)^i (x[0] - e_old[d])
+      (récurrence linéaire, sans NaN sur le tronçon commun, sinon calcul complet),
+      puis récurrence reprise depuis l'état au dernier point commun.
+  Résultats égaux au calcul complet aux arrondis près. L'entrée source est
+  remplacée par la nouvelle : une entrée par série suivie, pas une par run.
+
+Les valeurs ne dépendent que des données (pas de l'index) : l'appelant passe
+des séries déjà alignées, comme pour compute_indicators.
+
+Usage :
+    cache = IndicatorCache("data/indicator_cache")
+    z = cache.compute("z", prices_2d, 60)                 # (T, N)
+    out = cached_indicators(df["price"], ema_spans=(7, 21), z_windows=(60,))
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .correlation import rolling_corr_matrix
+from .indicators import _ema_run, compute_indicators, ema, returns, rolling_apy, zscore
+
+# changer la version invalide les entrées existantes (format ou conventions modifiés)
+_VERSION = 1
+
+# indicateurs à fenêtre : fn(x2d, param) -> (T, ...), et nombre de lignes passées nécessaires
+_ROLLING: Dict[str, Tuple[Callable[[np.ndarray, int], np.ndarray], Callable[[int], int]]] = {
+    "z": (lambda x, p: zscore(x, [p])[0], lambda p: p),
+    "apy": (lambda x, p: rolling_apy(x, [p])[0], lambda p: p),
+    "ret": (lambda x, p: returns(x, [p])[0], lambda p: p),
+    "corr": (lambda x, p: rolling_corr_matrix(x, p), lambda p: p),
+}
+INDICATORS = ("ema", *_ROLLING)
+
+
+def _as_2d(x) -> np.ndarray:
+    arr = np.ascontiguousarray(x, dtype=float)
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    if arr.ndim != 2:
+        raise ValueError("x doit être 1-D (temps) ou 2-D (temps x actifs)")
+    return arr
+
+
+def fingerprint(x2d: np.ndarray, name: str, param: int) -> str:
+    """Empreinte (indicateur, paramètre, forme, octets de x)."""
+    h = hashlib.sha1(f"{_VERSION}|{name}|{int(param)}|{x2d.shape}".encode("utf-8"))
+    h.update(x2d.tobytes())
+    return h.hexdigest()
+
+
+# décalages testés au plus par entrée (séries constantes : beaucoup de lignes égales à x[0])
+_MAX_OFFSETS = 16
+
+
+def _common_prefix(a: np.ndarray, b: np.ndarray) -> int:
+    """Nombre de premières lignes identiques (NaN égal à NaN)."""
+    if a.shape[1:] != b.shape[1:]:
+        return 0
+    n = min(len(a), len(b))
+    eq = (a[:n] == b[:n]) | (np.isnan(a[:n]) & np.isnan(b[:n]))
+    diff = np.flatnonzero(~eq.all(axis=1))
+    return int(diff[0]) if len(diff) else n
+
+
+def _align(x2d: np.ndarray, prev_x: np.ndarray) -> Tuple[int, int]:
+    """(d, m) du plus long tronçon commun x2d[0:m] == prev_x[d:d + m] (d minimal à égalité)."""
+    if not len(x2d) or x2d.shape[1:] != prev_x.shape[1:]:
+        return 0, 0
+    first = x2d[0]
+    eq = (prev_x == first) | (np.isnan(prev_x) & np.isnan(first))
+    best = (0, 0)
+    for d in np.flatnonzero(eq.all(axis=1))[:_MAX_OFFSETS]:
+        m = _common_prefix(x2d, prev_x[d:])
+        if m > best[1]:
+            best = (int(d), m)
+    return best
+
+
+def _compute(name: str, x2d: np.ndarray, param: int) -> np.ndarray:
+    if name == "ema":
+        return ema(x2d, [param])[0]
+    return _ROLLING[name][0](x2d, param)
+
+
+def _extend(name: str, x2d: np.ndarray, param: int, prev: np.ndarray, d: int, m: int) -> Optional[np.ndarray]:
+    """
+    Résultat pour x2d à partir de `prev`, calculé sur une série dont les lignes
+    d .. d + m - 1 sont x2d[0:m] ; None si le tronçon commun n'est pas réutilisable.
+    """
+    n = len(x2d)
+    if name == "ema":
+        alpha = np.array([[2.0 / (param + 1.0)]])
+        if d == 0:
+            head = prev[:m]
+        else:
+            if np.isnan(x2d[:m]).any():
+                return None
+            # même récurrence linéaire depuis d, seul le point de départ diffère
+            g = (1.0 - alpha[0, 0]) ** np.arange(m)
+            head = prev[d:d + m] + g[:, None] * (x2d[0] - prev[d])[None]
+        if m >= n:
+            return head[:n].copy()
+        cur = head[m - 1][None]
+        # NaN consécutifs en fin de tronçon : l'ancien niveau pèse (1 - alpha)^k
+        nan_tail = np.isnan(x2d[:m][::-1])
+        k = np.where(nan_tail.all(axis=0), m, np.argmin(nan_tail, axis=0))
+        decay = np.where(np.isnan(cur), 1.0, (1.0 - alpha) ** k[None])
+        return np.concatenate([head, _ema_run(x2d[m:], alpha, cur, decay)[0]])
+
+    fn, lookback = _ROLLING[name]
+    p = lookback(param)
+    if d == 0:
+        head = prev[:m]
+    elif m > p:
+        # les `p` premières lignes dépendent du début rogné : recalculées
+        head = np.concatenate([fn(x2d[:p], param), prev[d + p:d + m]])
+    else:
+        return None
+    if m >= n:
+        return head[:n].copy()
+    lo = max(m - p, 0)
+    return np.concatenate([head, fn(x2d[lo:], param)[m - lo:]])
+
+
+class IndicatorCache:
+    """Entrées .npz sous root ; au plus max_entries par (indicateur, paramètre), plus anciennes supprimées."""
+
+    def __init__(self, root="data/indicator_cache", max_entries: int = 16):
+        self.root = Path(root)
+        self.max_entries = max_entries
+
+    def _entries(self, name: str, param: int):
+        return sorted(self.root.glob(f"{name}_{int(param)}_*.npz"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+
+    def compute(self, name: str, x, param: int) -> np.ndarray:
+        """Indicateur `name` (ema, z, apy, ret, corr) de paramètre `param` pour x (T,) ou (T, N) -> (T, N[, N])."""
+        if name not in INDICATORS:
+            raise ValueError(f"indicateur inconnu: {name} (choix: {', '.join(INDICATORS)})")
+        param = int(param)
+        x2d = _as_2d(x)
+        key = fingerprint(x2d, name, param)
+        path = self.root / f"{name}_{param}_{key[:20]}.npz"
+        if path.exists():
+            try:
+                with np.load(path) as z:
+                    res = z["result"]
+                os.utime(path)
+                return res
+            except (OSError, ValueError, KeyError):
+                pass                                            # entrée illisible : recalcul
+
+        best, best_dm = None, (0, 0)
+        for cand in self._entries(name, param):
+            try:
+                with np.load(cand) as z:
+                    d, m = _align(x2d, z["x"])
+                    if m > best_dm[1]:
+                        best, best_dm = (cand, z["result"]), (d, m)
+            except (OSError, ValueError, KeyError):
+                continue
+        res = _extend(name, x2d, param, best[1], *best_dm) if best is not None else None
+        if res is None:
+            res = _compute(name, x2d, param)
+        self._save(path, x2d, res)
+        if best is not None and best[0] != path:
+            # la nouvelle entrée couvre le tronçon réutilisé : une entrée par série suivie
+            try:
+                best[0].unlink()
+            except OSError:
+                pass
+        self._prune(name, param)
+        return res
+
+    def _save(self, path: Path, x2d: np.ndarray, res: np.ndarray) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, x=x2d, result=res)
+        os.replace(tmp, path)
+
+    def _prune(self, name: str, param: int) -> None:
+        for old in self._entries(name, param)[self.max_entries:]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+_DEFAULT: Optional[IndicatorCache] = None
+
+
+def default_cache() -> Optional[IndicatorCache]:
+    """Cache sous INDICATOR_CACHE_DIR (défaut data/indicator_cache) ; None si la variable est vide."""
+    global _DEFAULT
+    root = os.getenv("INDICATOR_CACHE_DIR", os.path.join("data", "indicator_cache"))
+    if not root:
+        return None
+    if _DEFAULT is None or _DEFAULT.root != Path(root):
+        _DEFAULT = IndicatorCache(root)
+    return _DEFAULT
+
+
+def cached_indicators(prices, ema_spans: Iterable[int] = (7, 21), z_windows: Iterable[int] = (60,),
+                      apy_windows: Iterable[int] = (30,), return_horizons: Iterable[int] = (),
+                      cache: Optional[IndicatorCache] = None) -> Dict:
+    """Comme common.indicators.compute_indicators, via le cache (défaut : default_cache())."""
+    import pandas as pd
+
+    cache = cache or default_cache()
+    if cache is None:
+        return compute_indicators(prices, ema_spans, z_windows, apy_windows, return_horizons)
+
+    series = isinstance(prices, pd.Series)
+    frame = prices.to_frame() if series else prices
+    x = frame.to_numpy(dtype=float)
+
+    out: Dict = {}
+    for prefix, params in (("ema", ema_spans), ("z", z_windows), ("apy", apy_windows), ("ret", return_horizons)):
+        for p in params:
+            df = pd.DataFrame(cache.compute(prefix, x, int(p)), index=frame.index, columns=frame.columns)
+            out[f"{prefix}_{int(p)}"] = df.iloc[:, 0].rename(prices.name) if series else df
+    return out
+
+
+__all__ = ["IndicatorCache", "INDICATORS", "cached_indicators", "default_cache", "fingerprint"]
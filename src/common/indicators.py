@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+indicators.py
+
+Moteur d'indicateurs multi-actifs : une matrice de prix (temps x actifs) et des
+listes de paramètres -> tous les indicateurs en quelques passes NumPy, sans
+boucle par actif ni par paramètre (et sans rolling().apply).
+
+- ema          : EMA (adjust=False) pour plusieurs spans à la fois, une boucle
+                 Python sur le temps, vectorisée sur (spans x actifs) ;
+- zscore       : z glissant multi-fenêtres (common.rolling, sommes cumulées) ;
+- rolling_apy  : prod(1 + r) - 1 sur la fenêtre, par somme cumulée de log1p(r) ;
+- returns      : rendements P_t / P_{t-h} - 1 pour plusieurs horizons.
+
+Formes : x 1-D (T,) ou 2-D (T, N) ; un paramètre scalaire donne un résultat de
+même forme que x, une liste ajoute un axe de tête (P, T[, N]). Conventions
+alignées sur les fonctions Series de common.metrics (ema, zscore, rolling_apy,
+pct_change de pandas sans remplissage) : mêmes valeurs, NaN aux mêmes endroits.
+
+compute_indicators(DataFrame) renvoie {"ema_7": DataFrame, "z_60": ..., ...},
+colonnes = actifs, noms identiques à ceux de generate_lpt_assets.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from .rolling import rolling_zscore
+
+
+def _as_2d(x) -> Tuple[np.ndarray, bool]:
+    arr = np.asarray(x, dtype=float)
+    if arr.ndim == 1:
+        return arr[:, None], True
+    if arr.ndim != 2:
+        raise ValueError("x doit être 1-D (temps) ou 2-D (temps x actifs)")
+    return arr, False
+
+
+def _params(p) -> Tuple[np.ndarray, bool]:
+    scalar = np.isscalar(p)
+    arr = np.atleast_1d(np.asarray(p, dtype=np.int64))
+    if np.any(arr < 1):
+        raise ValueError("les paramètres (span, fenêtre, horizon) doivent être >= 1")
+    return arr, scalar
+
+
+def _shape_out(a: np.ndarray, scalar: bool, one_d: bool) -> np.ndarray:
+    if one_d:
+        a = a[..., 0]
+    if scalar:
+        a = a[0]
+    return a
+
+
+def _ema_run(x2d: np.ndarray, alpha: np.ndarray, cur: np.ndarray, decay: np.ndarray) -> np.ndarray:
+    """
+    Récurrence EMA sur x2d (T, N) depuis l'état (cur, decay) de forme (S, N) :
+    cur = dernier niveau (NaN si pas encore démarré), decay = (1 - alpha)^(NaN sautés)
+    ou 1. Renvoie (S, T, N) ; sert aussi à prolonger une EMA déjà calculée.
+    """
+    t, n = x2d.shape
+    out = np.full((len(alpha), t, n), np.nan)
+    cur = cur.copy()
+    if t and not np.isnan(x2d).any() and not np.isnan(cur).any() and np.all(decay == 1.0):
+        # cas courant (prix interpolés) : récurrence directe, une opération par pas
+        for i in range(t):
+            cur += alpha * (x2d[i] - cur)
+            out[:, i] = cur
+        return out
+    for i in range(t):
+        xi = x2d[i]
+        ok = ~np.isnan(xi)
+        if ok.any():
+            started = ~np.isnan(cur)
+            old = decay * (1.0 - alpha)
+            upd = np.where(started, (old * cur + alpha * xi) / (old + alpha), xi)
+            cur = np.where(ok, upd, cur)
+            decay = np.where(ok | ~started, 1.0, decay * (1.0 - alpha))
+        else:
+            decay = np.where(np.isnan(cur), 1.0, decay * (1.0 - alpha))
+        out[:, i] = cur
+    return out
+
+
+def ema(x, spans) -> np.ndarray:
+    """
+    EMA adjust=False (alpha = 2 / (span + 1)), comme Series.ewm(span, adjust=False).mean() :
+    démarre au premier point valide ; après k NaN, l'ancien niveau pèse (1 - alpha)^(k+1)
+    (ignore_na=False) ; la valeur d'un NaN est celle du dernier point valide.
+    """
+    x2d, one_d = _as_2d(x)
+    s, scalar = _params(spans)
+    alpha = (2.0 / (s + 1.0))[:, None]                         # (S, 1)
+    n = x2d.shape[1]
+    if len(x2d) and not np.isnan(x2d).any():
+        cur = np.repeat(x2d[:1], len(s), axis=0)
+    else:
+        cur = np.full((len(s), n), np.nan)
+    out = _ema_run(x2d, alpha, cur, np.ones((len(s), n)))
+    return _shape_out(out, scalar, one_d)
+
+
+def zscore(x, windows, zero_std: str = "inf") -> np.ndarray:
+    """z glissant (ddof=0, min_periods = fenêtre), comme common.metrics.zscore, pour toutes les fenêtres."""
+    x2d, one_d = _as_2d(x)
+    w, scalar = _params(windows)
+    z = rolling_zscore(x2d, w, ddof=0, zero_std=zero_std)
+    return _shape_out(z, scalar, one_d)
+
+
+def _simple_returns(x2d: np.ndarray) -> np.ndarray:
+    """pct_change sans remplissage : NaN si P_t ou P_{t-1} manque."""
+    r = np.full_like(x2d, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r[1:] = x2d[1:] / x2d[:-1] - 1.0
+    return r
+
+
+def rolling_apy(x, windows) -> np.ndarray:
+    """
+    prod(1 + r) - 1 sur `window` rendements (r = pct_change), comme
+    rolling(window).apply(np.prod(x) - 1) : NaN dès qu'un rendement de la fenêtre
+    manque. Produit glissant = exp(différence de sommes cumulées de log1p(r)).
+    """
+    x2d, one_d = _as_2d(x)
+    w, scalar = _params(windows)
+    r = _simple_returns(x2d)
+    valid = ~np.isnan(r)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lr = np.where(valid, np.log1p(np.where(valid, r, 0.0)), 0.0)
+    zeros = np.zeros((1, x2d.shape[1]))
+    cl = np.concatenate([zeros, np.cumsum(lr, axis=0)])
+    cn = np.concatenate([zeros, np.cumsum(valid, axis=0, dtype=np.int64)])
+
+    t = x2d.shape[0]
+    end = np.arange(1, t + 1)
+    start = end[None, :] - w[:, None]                          # (W, T)
+    ok = start >= 0
+    start = np.maximum(start, 0)
+    full = (cn[end][None] - cn[start]) == w[:, None, None]
+    with np.errstate(invalid="ignore", over="ignore"):
+        apy = np.expm1(cl[end][None] - cl[start])
+    apy = np.where(full & ok[:, :, None], apy, np.nan)
+    return _shape_out(apy, scalar, one_d)
+
+
+def returns(x, horizons) -> np.ndarray:
+    """Rendements sur h pas : P_t / P_{t-h} - 1 (NaN si l'un des deux prix manque)."""
+    x2d, one_d = _as_2d(x)
+    h, scalar = _params(horizons)
+    out = np.full((len(h), *x2d.shape), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, hi in enumerate(h):
+            if hi < x2d.shape[0]:
+                out[i, hi:] = x2d[hi:] / x2d[:-hi] - 1.0
+    return _shape_out(out, scalar, one_d)
+
+
+def compute_indicators(prices, ema_spans: Iterable[int] = (7, 21), z_windows: Iterable[int] = (60,),
+                       apy_windows: Iterable[int] = (30,), return_horizons: Iterable[int] = ()) -> Dict:
+    """
+    prices : DataFrame (index temps, une colonne par actif) ou Series.
+    Renvoie {"ema_<span>", "z_<w>", "apy_<w>", "ret_<h>": DataFrame (ou Series)} ;
+    chaque famille est calculée en une passe pour tous les actifs et paramètres.
+    """
+    import pandas as pd
+
+    series = isinstance(prices, pd.Series)
+    frame = prices.to_frame() if series else prices
+    x = frame.to_numpy(dtype=float)
+
+    def wrap(a: np.ndarray):
+        df = pd.DataFrame(a, index=frame.index, columns=frame.columns)
+        return df.iloc[:, 0].rename(prices.name) if series else df
+
+    out: Dict = {}
+    for prefix, fn, params in (("ema", ema, ema_spans), ("z", zscore, z_windows),
+                               ("apy", rolling_apy, apy_windows), ("ret", returns, return_horizons)):
+        params = [int(p) for p in params]
+        if not params:
+            continue
+        res = fn(x, params)
+        for p, a in zip(params, res):
+            out[f"{prefix}_{p}"] = wrap(a)
+    return out
+
+
+__all__ = ["ema", "zscore", "rolling_apy", "returns", "compute_indicators"]
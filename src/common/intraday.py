@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+intraday.py
+
+Détection d'anomalies intrajournalière à partir des transferts bruts, au fil
+de l'ingestion (stdlib uniquement, cf. common.streaming).
+
+- Les transferts sont agrégés par groupe (label / entité CEX) dans des seaux
+  de `bucket_s` secondes (1 h par défaut) : inflow, outflow, netflow.
+- Chaque seau clos alimente le détecteur glissant du groupe (RollingStats ou
+  RollingMedianMAD) sur `history` seaux ; les seaux sans transfert comptent 0,
+  y compris ceux écoulés avant le premier transfert d'un groupe (sa fenêtre est
+  pré-remplie de 0 depuis le début de l'observation).
+- Le seau en cours est évalué sans être ajouté (score) dès qu'il reçoit des
+  transferts : une grosse entrée déclenche l'alerte au poll qui l'ingère, sans
+  attendre la fin du jour (ni de l'heure). Au plus une alerte par (groupe, seau).
+- Échelle plancher `min_scale` (unités de jeton, 0 par défaut = sans plancher) :
+  un groupe peu actif (fenêtre pré-remplie de 0) a une MAD, voire un écart-type,
+  nulle. Sans plancher il n'est pas scoré (pas de z infini : le moindre transfert
+  de routine alerterait) ; avec min_scale > 0, |netflow - centre| >= z * min_scale
+  alerte, ce qui fixe la taille minimale d'une alerte sur une base plate.
+
+Mémoire bornée : par groupe, la fenêtre du détecteur + les cumuls du seau
+ouvert ; les clés de déduplication ne sont gardées que pour `dedup_buckets`
+seaux. Horloge = temps des événements (max des timestamps vus) ; un transfert
+plus ancien que le seau ouvert est compté dans `late` et ignoré.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .streaming import DETECTORS, make_detector
+
+
+@dataclass
+class IntradayAlert:
+    group: str
+    bucket: int               # début du seau = bucket * bucket_s (UNIX sec)
+    bucket_s: int
+    inflow: float
+    outflow: float
+    netflow: float
+    center: float
+    scale: float
+    zscore: float
+    detector: str
+
+    @property
+    def start(self) -> str:
+        return datetime.fromtimestamp(self.bucket * self.bucket_s, UTC).strftime("%Y-%m-%dT%H:%MZ")
+
+
+class IntradayFlows:
+    def __init__(self, bucket_s: int = 3600, history: int = 168, detector: str = "zscore",
+                 z: float = 4.0, dedup_buckets: int = 2, min_scale: float = 0.0):
+        if detector not in DETECTORS:
+            raise ValueError(f"Détecteur inconnu: {detector}")
+        self.bucket_s = int(bucket_s)
+        self.history = int(history)
+        self.detector = detector
+        self.z = float(z)
+        self.dedup_buckets = max(int(dedup_buckets), 1)
+        self.min_scale = max(float(min_scale), 0.0)
+        self.start: Optional[int] = None                      # premier seau observé
+        self.bucket: Optional[int] = None                     # seau ouvert
+        self.open: Dict[str, List[float]] = {}                # groupe -> [inflow, outflow]
+        self.stats: Dict[str, object] = {}                    # groupe -> détecteur glissant
+        self.seen: Dict[int, set] = {}                        # seau -> clés de déduplication
+        self.alerted: set = set()                             # groupes déjà en alerte sur le seau ouvert
+        self.late = 0
+
+    # ----------------------------------------------------------------- clock
+    def _roll(self, bucket: int, alerts: List[IntradayAlert]) -> None:
+        """Clôt les seaux jusqu'à `bucket` (exclu) : évaluation finale puis ajout aux fenêtres."""
+        if self.bucket is None:
+            self.bucket = self.start = bucket
+            return
+        if bucket <= self.bucket:
+            return
+        alerts += self.evaluate()
+        gap = min(bucket - self.bucket, self.history + 1)      # au-delà, la fenêtre est de toute façon pleine de 0
+        for g, st in self.stats.items():
+            inflow, outflow = self.open.get(g, (0.0, 0.0))
+            st.push(inflow - outflow)
+            for _ in range(gap - 1):
+                st.push(0.0)
+        self.open = {}
+        self.alerted = set()
+        self.bucket = bucket
+        for b in [b for b in self.seen if b <= bucket - self.dedup_buckets]:
+            del self.seen[b]
+
+    # ---------------------------------------------------------------- ingest
+    def add(self, ts: int, src: Optional[str], dst: Optional[str], amount: float,
+            key: Optional[Tuple] = None, alerts: Optional[List[IntradayAlert]] = None) -> bool:
+        """
+        Ajoute un transfert (src / dst = groupe ou None si non labellisé). Les flux
+        internes à un groupe sont ignorés, comme dans netflow_multi_cex. Renvoie False
+        si le transfert est ignoré (doublon, en retard, interne ou hors CEX).
+        """
+        if src == dst or (src is None and dst is None):
+            return False
+        b = int(ts) // self.bucket_s
+        self._roll(b, alerts if alerts is not None else [])
+        if b < self.bucket:
+            self.late += 1
+            return False
+        if key is not None:
+            seen = self.seen.setdefault(b, set())
+            if key in seen:
+                return False
+            seen.add(key)
+        amount = float(amount)
+        if dst is not None:
+            self._group(dst)[0] += amount
+        if src is not None:
+            self._group(src)[1] += amount
+        return True
+
+    def _group(self, g: str) -> List[float]:
+        if g not in self.stats:
+            st = self.stats[g] = make_detector(self.detector, self.history)
+            # seaux déjà clos sans transfert de ce groupe : 0, comme les trous de _roll
+            for _ in range(min(self.bucket - self.start, self.history)):
+                st.push(0.0)
+        acc = self.open.get(g)
+        if acc is None:
+            acc = self.open[g] = [0.0, 0.0]
+        return acc
+
+    def ingest(self, transfers: Iterable[Tuple[int, Optional[str], Optional[str], float, Optional[Tuple]]]
+               ) -> List[IntradayAlert]:
+        """Ingère un lot (trié par horodatage ici) puis évalue le seau ouvert."""
+        alerts: List[IntradayAlert] = []
+        for ts, src, dst, amount, key in sorted(transfers, key=lambda t: t[0]):
+            self.add(ts, src, dst, amount, key, alerts)
+        alerts += self.evaluate()
+        return alerts
+
+    def advance_to(self, ts: int) -> List[IntradayAlert]:
+        """Avance l'horloge sans transfert (seaux vides clos à 0)."""
+        alerts: List[IntradayAlert] = []
+        self._roll(int(ts) // self.bucket_s, alerts)
+        return alerts
+
+    # -------------------------------------------------------------- evaluate
+    def evaluate(self) -> List[IntradayAlert]:
+        """
+        Score du seau ouvert pour chaque groupe actif (|z| >= seuil -> alerte) ; un
+        groupe déjà en alerte sur ce seau n'est pas réévalué (ingest puis clôture).
+        """
+        out = []
+        for g, (inflow, outflow) in self.open.items():
+            if g in self.alerted:
+                continue
+            net = inflow - outflow
+            m, s, z = self.stats[g].score(net, self.min_scale)
+            if z is not None and abs(z) >= self.z:
+                self.alerted.add(g)
+                out.append(IntradayAlert(g, self.bucket, self.bucket_s, inflow, outflow, net,
+                                         m, s, z, self.detector))
+        return out
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {
+            "bucket_s": self.bucket_s, "history": self.history, "detector": self.detector,
+            "z": self.z, "dedup_buckets": self.dedup_buckets, "min_scale": self.min_scale,
+            "start": self.start, "bucket": self.bucket, "open": self.open, "alerted": sorted(self.alerted), "stats": {g: st.to_dict() for g, st in self.stats.items()},
+            "seen": {str(b): [list(k) for k in keys] for b, keys in self.seen.items()},
+            "late": self.late,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict, z: Optional[float] = None, min_scale: Optional[float] = None) -> "IntradayFlows":
+        fl = cls(d["bucket_s"], d["history"], d["detector"], d["z"] if z is None else z, d.get("dedup_buckets", 2),
+                 d.get("min_scale", 0.0) if min_scale is None else min_scale)
+        fl.bucket = d.get("bucket")
+        fl.start = d.get("start", fl.bucket)
+        fl.alerted = set(d.get("alerted", []))
+        fl.open = {g: [float(a), float(b)] for g, (a, b) in d.get("open", {}).items()}
+        fl.stats = {g: DETECTORS[fl.detector].from_dict(st) for g, st in d.get("stats", {}).items()}
+        fl.seen = {int(b): {tuple(k) for k in keys} for b, keys in d.get("seen", {}).items()}
+        fl.late = int(d.get("late", 0))
+        return fl
+
+
+__all__ = ["IntradayFlows", "IntradayAlert"]
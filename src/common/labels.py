@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+labels.py
+
+Registre d'adresses labellisées (CEX) avec regroupement par entité.
+
+Formats JSON acceptés (cumulables, plusieurs fichiers possibles) :
+  - plat, un label par adresse (format historique de scripts/cex_addresses.json) :
+        {"binance20": "0xF977...", "kraken_cold1": "0x22af..."}
+    l'entité est déduite du préfixe alphabétique du label
+    (binance20 -> binance, kraken_cold1 -> kraken, mexC16 -> mexc).
+  - groupé par entité :
+        {"binance": {"binance20": "0xF977...", "binance14": "0x28C6..."},
+         "kraken":  ["0x22af...", "0xC06f..."]}
+    (une liste d'adresses reçoit des labels <entité>_<i>).
+
+Les recherches se font via un index hash (pd.Index) construit une seule fois :
+une colonne de 1M adresses se résout en codes entiers en une passe vectorisée.
+NumPy / pandas ne sont importés qu'à ce moment-là : le registre lui-même et
+address_map (résolution ligne à ligne des agents) restent en Python pur.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+UNLABELED = "unlabeled"
+
+_ENTITY_RE = re.compile(r"[a-z]+")
+
+
+def entity_from_label(label: str) -> str:
+    """Déduit l'entité d'un label plat : préfixe alphabétique en minuscules."""
+    m = _ENTITY_RE.match(label.strip().lower())
+    return m.group(0) if m else label.strip().lower()
+
+
+class LabelRegistry:
+    """
+    Associe de nombreuses adresses à un label puis à une entité.
+
+    - labels / entities : noms ordonnés (les codes renvoyés indexent ces listes)
+    - codes(addresses, by="label"|"entity") : codes int32, -1 si non labellisée
+    """
+
+    def __init__(self):
+        self._addr: List[str] = []
+        self._label: List[str] = []
+        self._entity: List[str] = []
+        self._index: Optional[Dict[str, int]] = None     # adresse -> rang (1re occurrence)
+        self._codes: Dict[str, List[int]] = {}
+        self._names: Dict[str, List[str]] = {}
+        self._vec = None                                # (pd.Index, {by: np.ndarray}), cf. codes()
+
+    # ------------------------------------------------------------------ build
+    def add(self, address: str, label: str, entity: Optional[str] = None) -> None:
+        """Ajoute une adresse. Une adresse déjà connue garde son premier label."""
+        addr = str(address).strip().lower()
+        if not addr:
+            return
+        label = label.strip()
+        self._addr.append(addr)
+        self._label.append(label)
+        self._entity.append((entity or entity_from_label(label)).strip().lower())
+        self._index = None
+
+    def update(self, data: dict) -> None:
+        """Ajoute le contenu d'un dict JSON (format plat ou groupé)."""
+        for key, val in data.items():
+            if isinstance(val, dict):
+                for label, addr in val.items():
+                    self.add(addr, label, entity=key)
+            elif isinstance(val, (list, tuple)):
+                for i, addr in enumerate(val, start=1):
+                    self.add(addr, f"{key}_{i}", entity=key)
+            else:
+                self.add(val, key)
+
+    @classmethod
+    def from_json(cls, *paths: str) -> "LabelRegistry":
+        reg = cls()
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                reg.update(json.load(f))
+        return reg
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, str]]) -> "LabelRegistry":
+        """pairs: [(label, address), ...] (cf. get_lpt_multi_cex.parse_addresses)."""
+        reg = cls()
+        for label, addr in pairs:
+            reg.add(addr, label)
+        return reg
+
+    def _build(self) -> None:
+        if self._index is not None:
+            return
+        first: Dict[str, int] = {}
+        for i, addr in enumerate(self._addr):
+            first.setdefault(addr, i)
+        self._index = {addr: k for k, addr in enumerate(first)}
+        self._codes, self._names, self._vec = {}, {}, None
+        for by, values in (("label", self._label), ("entity", self._entity)):
+            uniques: Dict[str, int] = {}                 # codes par ordre d'apparition (= pd.factorize)
+            self._codes[by] = [uniques.setdefault(values[i], len(uniques)) for i in first.values()]
+            self._names[by] = [str(u) for u in uniques]
+
+    # ----------------------------------------------------------------- lookup
+    def __len__(self) -> int:
+        self._build()
+        return len(self._index)
+
+    def __contains__(self, address: str) -> bool:
+        self._build()
+        return str(address).strip().lower() in self._index
+
+    def names(self, by: str = "label") -> List[str]:
+        self._build()
+        return list(self._names[by])
+
+    @property
+    def labels(self) -> List[str]:
+        return self.names("label")
+
+    @property
+    def entities(self) -> List[str]:
+        return self.names("entity")
+
+    def codes(self, addresses, by: str = "label") -> np.ndarray:
+        """
+        Résout une colonne d'adresses en codes (int32) de label ou d'entité.
+        -1 = adresse non labellisée. Insensible à la casse.
+        """
+        import numpy as np
+        import pandas as pd
+
+        self._build()
+        if by not in self._codes:
+            raise ValueError(f"by doit valoir 'label' ou 'entity' (reçu: {by!r})")
+        if self._vec is None:
+            # pos == -1 -> dernière case de la table
+            self._vec = (pd.Index(list(self._index)),
+                         {k: np.append(np.asarray(c, dtype=np.int32), np.int32(-1)) for k, c in self._codes.items()})
+        index, luts = self._vec
+        s = pd.Series(addresses, dtype=object).astype(str).str.lower()
+        return luts[by][index.get_indexer(s.to_numpy())]
+
+    def _name_of(self, address: str, by: str) -> Optional[str]:
+        self._build()
+        pos = self._index.get(str(address).lower())
+        return self._names[by][self._codes[by][pos]] if pos is not None else None
+
+    def label_of(self, address: str) -> Optional[str]:
+        return self._name_of(address, "label")
+
+    def entity_of(self, address: str) -> Optional[str]:
+        return self._name_of(address, "entity")
+
+    def address_map(self, by: str = "label") -> Dict[str, str]:
+        """{adresse (minuscules): label ou entité}, pour les résolutions ligne à ligne (flux temps réel)."""
+        self._build()
+        names = self._names[by]
+        return {addr: names[code] for addr, code in zip(self._index, self._codes[by])}
+
+    def mapping(self) -> Dict[str, str]:
+        """{label: adresse} (première adresse du label), compatible load_mapping."""
+        self._build()
+        out: Dict[str, str] = {}
+        for addr, code in zip(self._index, self._codes["label"]):
+            out.setdefault(self._names["label"][code], addr)
+        return out
+
+
+__all__ = ["LabelRegistry", "entity_from_label", "UNLABELED"]
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+market.py
+
+Données de marché CoinGecko : résolution ticker -> id, fetch natif / quotidien
+(points natifs versés dans le store common.price_store), cache local avec TTL
+et complément incrémental, fetch concurrent de plusieurs actifs.
+"""
+import os
+import time
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Iterable, Dict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .dates import utc_today, utc_now
+from .http_client import _cg_get
+from .price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Mapping ticker -> CoinGecko coin_id
+# -----------------------------------------------------------------------------
+_COINGECKO_TICKER_MAP = {
+    "LPT": "livepeer",
+    "LIVEPEER": "livepeer",
+    "AVAX": "avalanche-2",
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+}
+
+def resolve_coin_id(name: str) -> str:
+    """
+    Résout un ticker ou un id vers l'id CoinGecko.
+    Ex: 'LPT'/'lpt'/'livepeer' -> 'livepeer'
+    """
+    if not name:
+        raise ValueError("Empty coin name")
+    n = name.strip()
+    if n.lower() in (v.lower() for v in _COINGECKO_TICKER_MAP.values()):
+        return n.lower()
+    return _COINGECKO_TICKER_MAP.get(n.upper(), n.lower())
+
+# -----------------------------------------------------------------------------
+# Fetch marché (granularité native + quotidien)
+# -----------------------------------------------------------------------------
+# store des points natifs (cf. common.price_store) ; PRICE_STORE_DIR="" le désactive
+_PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join("data", "prices"))
+PRICE_STORE: Optional[PriceStore] = PriceStore(_PRICE_STORE_DIR) if _PRICE_STORE_DIR else None
+
+def cg_market_chart_native(coin_id_or_ticker: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+    """
+    Points bruts CoinGecko (5 min pour 1 jour, horaires jusqu'à 90 jours, quotidiens
+    au-delà) : colonnes = price, market_cap, volume ; index = horodatages UTC.
+    Les points sont aussi versés dans PRICE_STORE (sans refetch pour l'intraday).
+    Retries bornés par une seule politique (http_client.CG_RETRY), pas de retry imbriqué.
+    """
+    resolved_id = resolve_coin_id(coin_id_or_ticker)
+    base = os.getenv("COINGECKO_API_BASE", "https://api.coingecko.com")
+    url = f"{base}/api/v3/coins/{resolved_id}/market_chart?vs_currency={vs}&days={days}"
+    r = _cg_get(url)
+    data = r.json()
+    if not isinstance(data, dict) or "prices" not in data:
+        try:
+            data = json.loads(r.text)
+        except Exception:
+            pass
+
+    df_price = pd.DataFrame(data.get("prices", []), columns=["ts_ms", "price"])
+    df_mcap = pd.DataFrame(data.get("market_caps", []), columns=["ts_ms", "market_cap"])
+    df_vol = pd.DataFrame(data.get("total_volumes", []), columns=["ts_ms", "volume"])
+
+    if df_price.empty and df_mcap.empty and df_vol.empty:
+        logger.warning("Réponse CoinGecko vide pour %s (vs=%s, days=%s).", resolved_id, vs, days)
+        return pd.DataFrame(columns=["price", "market_cap", "volume"])
+
+    df = df_price.merge(df_mcap, on="ts_ms", how="outer").merge(df_vol, on="ts_ms", how="outer")
+    df["ts"] = pd.to_datetime(df["ts_ms"], unit="ms", utc=True).dt.tz_convert(None)
+    df = df.drop(columns=["ts_ms"]).set_index("ts").sort_index()
+    if PRICE_STORE is not None:
+        try:
+            PRICE_STORE.update(resolved_id, vs, df)
+        except Exception as e:
+            logger.warning("Store de prix non mis à jour pour %s: %s", resolved_id, e)
+    return df
+
+def _daily_snapshots(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Un point par jour : celui le plus proche de 00:00 UTC (à ±12 h), quelle que soit
+    la granularité native (quotidienne au-delà de 90 jours, horaire en deçà) ; un
+    fetch court (complément de cache) et un fetch long donnent donc les mêmes
+    valeurs. Jour dont minuit n'est pas encore atteint (point "maintenant" de
+    l'API) exclu : pas de ligne partielle. Jours sans point interpolés.
+    """
+    ts = df.index
+    day = (ts + pd.Timedelta(hours=12)).floor("1D")
+    dist = np.abs((ts - day).to_numpy())
+    done = np.asarray(day <= ts.max())
+    order = np.lexsort((dist[done], day[done]))
+    picked = df[done].iloc[order]
+    days = day[done][order]
+    first = ~days.duplicated()
+    out = picked[first].set_axis(days[first])
+    if out.empty:
+        return out
+    return out.asfreq("1D").interpolate()
+
+def cg_market_chart_range(coin_id_or_ticker: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+    """
+    Renvoie un DataFrame quotidien: colonnes = price, market_cap, volume ; index = dates.
+    Accepte 'LPT', 'livepeer', etc. (résolution automatique). Un point par jour,
+    le plus proche de 00:00 UTC (cf. _daily_snapshots), jamais de jour en cours.
+    """
+    df = cg_market_chart_native(coin_id_or_ticker, vs=vs, days=days)
+    if df.empty:
+        return df
+    return _daily_snapshots(df)
+
+# -----------------------------------------------------------------------------
+# Cache local
+# -----------------------------------------------------------------------------
+# fraîcheur par défaut d'une entrée de cache (heures), surchargée par MARKET_CACHE_TTL_HOURS
+DEFAULT_CACHE_TTL_HOURS = float(os.getenv("MARKET_CACHE_TTL_HOURS", "12") or 12)
+
+def _cache_path(resolved_id: str, vs: str, days: int) -> str:
+    return os.path.join("data", f"cache_{resolved_id}_{vs}_{days}d.csv")
+
+def _meta_path(fname: str) -> str:
+    return os.path.splitext(fname)[0] + ".meta.json"
+
+def _read_meta(fname: str) -> dict:
+    """Métadonnées du cache ; un cache sans sidecar (ancien format) est daté par son mtime."""
+    try:
+        with open(_meta_path(fname), encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"fetched_at": os.path.getmtime(fname)}
+
+def _write_cache(df: pd.DataFrame, fname: str, ttl_hours: float) -> None:
+    df.to_csv(fname)
+    meta = {"fetched_at": time.time(), "fetched_at_utc": utc_now().isoformat(timespec="seconds"),
+            "ttl_hours": ttl_hours, "rows": int(len(df)),
+            "last_date": df.index.max().date().isoformat() if len(df) else None}
+    tmp = _meta_path(fname) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _meta_path(fname))
+
+def _top_up(cached: pd.DataFrame, resolved_id: str, vs: str, days: int) -> Optional[pd.DataFrame]:
+    """
+    Complète un cache périmé avec les seuls jours manquants (+ le dernier en cache)
+    puis garde la fenêtre de `days` jours. None si un refetch complet s'impose.
+    Même échantillonnage que le fetch complet (point de 00:00, cf. _daily_snapshots)
+    bien que le fetch court soit horaire : le cache complété égale un refetch.
+    """
+    if cached.empty:
+        return None
+    last = cached.index.max().normalize()
+    gap = (pd.Timestamp(utc_today()) - last).days
+    if gap >= days:
+        return None
+    fresh = cg_market_chart_range(resolved_id, vs=vs, days=max(gap, 0) + 2)
+    if fresh.empty:
+        return cached
+    df = pd.concat([cached[cached.index < fresh.index.min()], fresh])
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    df = df.asfreq("1D").interpolate()
+    return df[df.index >= pd.Timestamp(utc_today() - timedelta(days=days))]
+
+def _read_cache(fname: str, resolved_id: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(fname):
+        return None
+    try:
+        df = pd.read_csv(fname, parse_dates=True, index_col=0)
+        df.index = pd.to_datetime(df.index)
+        return df
+    except Exception:
+        logger.warning("Cache corrompu pour %s, refetch...", resolved_id)
+        return None
+
+def load_or_fetch_coin(coin_id_or_ticker: str, vs: str = "usd", days: int = 400, force_refresh: bool = False,
+                       ttl_hours: Optional[float] = None) -> pd.DataFrame:
+    """
+    Charge depuis cache local si dispo et frais, sinon fetch depuis CoinGecko et sauvegarde.
+    Fichiers: data/cache_{resolved}_{vs}_{days}d.csv + .meta.json (fetched_at, ttl_hours).
+    Cache périmé (plus vieux que ttl_hours, par défaut celui de l'entrée puis
+    DEFAULT_CACHE_TTL_HOURS) : seuls les jours manquants sont refetchés et fusionnés.
+    ttl_hours=math.inf : cache servi tel quel (hors ligne).
+    """
+    resolved_id = resolve_coin_id(coin_id_or_ticker)
+    os.makedirs("data", exist_ok=True)
+    fname = _cache_path(resolved_id, vs, days)
+
+    cached = None if force_refresh else _read_cache(fname, resolved_id)
+    if cached is not None:
+        meta = _read_meta(fname)
+        ttl = ttl_hours if ttl_hours is not None else float(meta.get("ttl_hours", DEFAULT_CACHE_TTL_HOURS))
+        if time.time() - float(meta.get("fetched_at", 0)) <= ttl * 3600:
+            return cached
+        df = _top_up(cached, resolved_id, vs, days)
+        if df is not None:
+            _write_cache(df, fname, ttl)
+            return df
+
+    ttl = ttl_hours if ttl_hours is not None and ttl_hours != float("inf") else DEFAULT_CACHE_TTL_HOURS
+    df = cg_market_chart_range(resolved_id, vs=vs, days=days)
+    _write_cache(df, fname, ttl)
+    return df
+
+# -----------------------------------------------------------------------------
+# Fetch marché multi-actifs (concurrent, budget de débit commun)
+# -----------------------------------------------------------------------------
+def _run_batch(fn, coins: Iterable[str], workers: int, errors: str) -> Dict[str, pd.DataFrame]:
+    if errors not in ("raise", "skip"):
+        raise ValueError("errors doit valoir 'raise' ou 'skip'")
+    coins = list(dict.fromkeys(coins))
+    out: Dict[str, pd.DataFrame] = {}
+    failed: Dict[str, Exception] = {}
+    if not coins:
+        return out
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(coins)))) as pool:
+        futures = {c: pool.submit(fn, c) for c in coins}
+        for c, fut in futures.items():
+            try:
+                out[c] = fut.result()
+            except Exception as e:
+                failed[c] = e
+                logger.warning("Fetch échoué pour %s: %s", c, e)
+    if failed and errors == "raise":
+        raise next(iter(failed.values()))
+    return out
+
+def fetch_market_charts(coins: Iterable[str], vs: str = "usd", days: int = 400,
+                        workers: int = 8, errors: str = "raise") -> Dict[str, pd.DataFrame]:
+    """
+    cg_market_chart_range pour plusieurs actifs en parallèle ({nom donné: DataFrame}).
+    Toutes les requêtes partagent _CG_BUDGET : le débit total reste dans la limite
+    CoinGecko et un Retry-After suspend tout le lot, pas un seul appel.
+    errors="skip" : les actifs en échec sont absents du résultat (warning loggué).
+    """
+    return _run_batch(lambda c: cg_market_chart_range(c, vs=vs, days=days), coins, workers, errors)
+
+def load_or_fetch_coins(coins: Iterable[str], vs: str = "usd", days: int = 400, force_refresh: bool = False,
+                        workers: int = 8, errors: str = "raise",
+                        ttl_hours: Optional[float] = None) -> Dict[str, pd.DataFrame]:
+    """load_or_fetch_coin pour plusieurs actifs : cache frais lu localement, le reste fetché en lot."""
+    return _run_batch(lambda c: load_or_fetch_coin(c, vs=vs, days=days, force_refresh=force_refresh,
+                                                   ttl_hours=ttl_hours),
+                      coins, workers, errors)
+
+
+__all__ = [
+    "resolve_coin_id",
+    "cg_market_chart_native", "cg_market_chart_range",
+    "PriceStore", "PRICE_STORE", "DEFAULT_CACHE_TTL_HOURS",
+    "load_or_fetch_coin", "fetch_market_charts", "load_or_fetch_coins",
+]
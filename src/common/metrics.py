@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+
+Petites métriques sur Series pandas (APY glissant, z-score, EMA, corrélation
+décalée), adossées aux noyaux NumPy de common.rolling / common.indicators.
+"""
+import pandas as pd
+
+from .rolling import rolling_zscore
+from . import indicators
+
+def rolling_apy(price: pd.Series, window: int = 30) -> pd.Series:
+    # prod(1 + r) - 1 glissant par somme cumulée de log1p(r) (cf. common.indicators)
+    return pd.Series(indicators.rolling_apy(price.to_numpy(dtype=float), window), index=price.index, name=price.name)
+
+def zscore(s: pd.Series, window: int = 60) -> pd.Series:
+    z = rolling_zscore(s.to_numpy(dtype=float), window, ddof=0, zero_std="inf")
+    return pd.Series(z, index=s.index, name=s.name)
+
+def ema(s: pd.Series, span: int) -> pd.Series:
+    return s.ewm(span=span, adjust=False).mean()
+
+def shift_corr(a: pd.Series, b: pd.Series, lag: int = 0, window: int = 60) -> pd.Series:
+    if lag != 0:
+        b = b.shift(lag)
+    return a.rolling(window).corr(b)
+
+
+__all__ = ["rolling_apy", "zscore", "ema", "shift_corr"]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+plotting.py
+
+Helpers graphiques (matplotlib, backend Agg) : PNG de taille stable et
+placeholders lisibles quand les données manquent.
+"""
+from typing import Optional, Dict, Mapping
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+def _ensure_series_for_rolling(s, window: int, min_extra: int = 5) -> bool:
+    try:
+        series = getattr(s, "dropna", lambda: s)()
+        return len(series) >= (window + min_extra)
+    except Exception:
+        return False
+
+def savefig_stable(path: str, width: int = 1200, height: int = 700, dpi: int = 150):
+    plt.gcf().set_size_inches(width / 100, height / 100)
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, transparent=False, bbox_inches="tight")
+    plt.close()
+
+def save_placeholder_chart(path: str, title: str = "No data", message: str = "No data available",
+                           width: int = 1200, height: int = 700, dpi: int = 150):
+    """
+    Génère un graphique 'placeholder' clair lorsqu'il n'y a pas de données.
+    Évite d'obtenir des PNG vides (cadres blancs).
+    """
+    plt.figure(figsize=(width / 100, height / 100))
+    plt.title(title)
+    plt.text(0.5, 0.5, message, ha="center", va="center", fontsize=16, color="red", alpha=0.75)
+    plt.axis("off")
+    plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    plt.close()
+
+def safe_plot_series(x, y, out_path: str, title: str,
+                     xlabel: str = "Date", ylabel: str = "", label: Optional[str] = None) -> bool:
+    """
+    Trace une série si les données sont suffisantes, sinon génère un placeholder.
+    Retourne True si le tracé a eu lieu, False si placeholder.
+    """
+    try:
+        import numpy as _np
+        arr = _np.asarray(y.dropna() if hasattr(y, "dropna") else y)
+        if arr.size < 2 or _np.all(~_np.isfinite(arr)):
+            save_placeholder_chart(out_path, title, "No data available")
+            return False
+    except Exception:
+        save_placeholder_chart(out_path, title, "Data error")
+        return False
+
+    plt.figure()
+    plt.plot(x, y, label=label if label else None)
+    plt.title(title)
+    plt.xlabel(xlabel); plt.ylabel(ylabel)
+    if label:
+        plt.legend()
+    savefig_stable(out_path)
+    return True
+
+def safe_plot_lines(x, series: Mapping[str, pd.Series], out_path: str, title: str,
+                    xlabel: str = "Date", ylabel: str = "") -> bool:
+    """
+    Trace plusieurs séries (label -> Series). Filtre automatiquement les séries vides/NaN.
+    Si aucune série valide: génère un placeholder. Retourne True si tracé, False sinon.
+    """
+    valid: Dict[str, pd.Series] = {}
+    for name, s in series.items():
+        try:
+            v = s.dropna()
+            if len(v) >= 2 and np.isfinite(v.values).any():
+                valid[name] = s
+        except Exception:
+            continue
+
+    if not valid:
+        save_placeholder_chart(out_path, title, "No data available")
+        return False
+
+    plt.figure()
+    for name, s in valid.items():
+        plt.plot(x, s, label=name)
+    plt.title(title)
+    plt.xlabel(xlabel); plt.ylabel(ylabel)
+    plt.legend()
+    savefig_stable(out_path)
+    return True
+
+
+__all__ = ["savefig_stable", "save_placeholder_chart", "safe_plot_series", "safe_plot_lines"]
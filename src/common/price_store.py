@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+price_store.py
+
+Stockage des séries de marché à leur granularité native (5 min / horaire /
+quotidienne selon la fenêtre demandée à CoinGecko) : un fichier .npz compressé
+par (coin, vs) avec ts (int64, ms UTC) et price / market_cap / volume (float32).
+
+- update : fusionne de nouveaux points ; sur la période couverte par les deux,
+  la source la plus fine (pas médian le plus petit) l'emporte, de sorte qu'un
+  fetch quotidien n'écrase pas l'horaire déjà stocké ;
+- resample : agrégation à la demande vers n'importe quel pas ("15min", "1h",
+  "1D"...) en OHLC (prix) + moyennes (market_cap, volume) ou en moyennes
+  seules ; buckets alignés sur l'epoch UTC (comme DataFrame.resample), calcul
+  NumPy (reduceat), résultat mis en cache mémoire tant que le fichier ne change pas ;
+- price_series : série de prix (native ou close d'un pas) pour la valorisation
+  as-of des flux (common.flows.value_usd).
+
+Usage :
+    store = PriceStore("data/prices")
+    store.update("livepeer", "usd", df_native)     # index datetime, colonnes price/market_cap/volume
+    h1 = store.resample("livepeer", "usd", "1h")  # open/high/low/close/market_cap/volume/n
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("price", "market_cap", "volume")
+HOW = ("ohlc", "mean")
+
+Arrays = Dict[str, np.ndarray]
+
+
+def _to_arrays(df: pd.DataFrame) -> Arrays:
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is not None:
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    ts = idx.values.astype("datetime64[ms]").astype(np.int64)
+    order = np.argsort(ts, kind="stable")
+    out = {"ts": ts[order]}
+    for f in FIELDS:
+        col = df[f].to_numpy(dtype=float) if f in df.columns else np.full(len(df), np.nan)
+        out[f] = col[order].astype(np.float32)
+    keep = np.r_[out["ts"][1:] != out["ts"][:-1], True]          # doublons : dernier point
+    return {k: v[keep] for k, v in out.items()}
+
+
+def _spacing(ts: np.ndarray) -> float:
+    return float(np.median(np.diff(ts))) if len(ts) > 1 else np.inf
+
+
+def merge_points(old: Optional[Arrays], new: Arrays) -> Arrays:
+    """Union triée de deux jeux de points ; sur le chevauchement, le plus fin est conservé."""
+    if old is None or not len(old["ts"]):
+        return new
+    if not len(new["ts"]):
+        return old
+    lo, hi = new["ts"][0], new["ts"][-1]
+    inside = (old["ts"] >= lo) & (old["ts"] <= hi)
+    if _spacing(new["ts"]) <= _spacing(old["ts"][inside]):
+        parts = [{k: v[~inside] for k, v in old.items()}, new]
+    else:
+        olo, ohi = old["ts"][inside][[0, -1]]
+        outside = (new["ts"] < olo) | (new["ts"] > ohi)
+        parts = [old, {k: v[outside] for k, v in new.items()}]
+    merged = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    order = np.argsort(merged["ts"], kind="stable")
+    return {k: v[order] for k, v in merged.items()}
+
+
+def downsample(arrays: Arrays, rule: str, how: str = "ohlc", fill: bool = False) -> pd.DataFrame:
+    """
+    Agrège des points natifs par bucket de durée `rule`.
+    how="ohlc" : open/high/low/close du prix, moyennes market_cap/volume, n points ;
+    how="mean" : moyennes price/market_cap/volume (= resample(rule).mean()).
+    fill=True : grille complète, buckets vides interpolés (mean) ou close reporté (ohlc).
+    """
+    if how not in HOW:
+        raise ValueError(f"how doit valoir {', '.join(HOW)}")
+    step = int(pd.Timedelta(rule) / pd.Timedelta(milliseconds=1))
+    if step <= 0:
+        raise ValueError("rule doit être une durée positive")
+    ts = arrays["ts"]
+    cols = ["open", "high", "low", "close", "market_cap", "volume", "n"] if how == "ohlc" else list(FIELDS)
+    if not len(ts):
+        return pd.DataFrame(columns=cols, index=pd.DatetimeIndex([], name="ts"))
+
+    bucket = ts - ts % step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    counts = np.diff(np.r_[starts, len(ts)])
+
+    def mean(a: np.ndarray) -> np.ndarray:
+        a = a.astype(float)
+        ok = ~np.isnan(a)
+        s = np.add.reduceat(np.where(ok, a, 0.0), starts)
+        c = np.add.reduceat(ok.astype(np.int64), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(c > 0, s / c, np.nan)
+
+    if how == "ohlc":
+        p = arrays["price"].astype(float)
+        data = {
+            "open": p[starts], "close": p[starts + counts - 1],
+            "high": np.fmax.reduceat(p, starts), "low": np.fmin.reduceat(p, starts),
+            "market_cap": mean(arrays["market_cap"]), "volume": mean(arrays["volume"]), "n": counts,
+        }
+    else:
+        data = {f: mean(arrays[f]) for f in FIELDS}
+    idx = pd.DatetimeIndex(bucket[starts].astype("datetime64[ms]"), name="ts").as_unit("ns")
+    df = pd.DataFrame(data, index=idx)[cols]
+    if fill:
+        grid = pd.date_range(idx[0], idx[-1], freq=pd.Timedelta(milliseconds=step), name="ts")
+        df = df.reindex(grid)
+        if how == "mean":
+            df = df.interpolate()
+        else:
+            df["close"] = df["close"].ffill()
+            for c in ("open", "high", "low"):
+                df[c] = df[c].fillna(df["close"])
+            df[["market_cap", "volume"]] = df[["market_cap", "volume"]].interpolate()
+            df["n"] = df["n"].fillna(0).astype(np.int64)
+    return df
+
+
+class PriceStore:
+    """Un .npz par (coin, vs) sous root ; agrégations mises en cache par version de fichier."""
+
+    def __init__(self, root="data/prices", cache_size: int = 64):
+        self.root = Path(root)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, coin_id: str, vs: str = "usd") -> Path:
+        return self.root / f"{coin_id}_{vs}.npz"
+
+    def _version(self, path: Path):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, coin_id: str, vs: str = "usd") -> Optional[Arrays]:
+        path = self.path(coin_id, vs)
+        if not path.exists():
+            return None
+        with np.load(path) as z:
+            return {k: z[k] for k in ("ts", *FIELDS)}
+
+    def update(self, coin_id: str, vs: str, df: pd.DataFrame) -> Path:
+        """Fusionne les points natifs de df (index datetime UTC naïf ou tz-aware) dans le store."""
+        path = self.path(coin_id, vs)
+        with self._lock:
+            merged = merge_points(self.load(coin_id, vs), _to_arrays(df))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez_compressed(f, **merged)
+            os.replace(tmp, path)
+        return path
+
+    def frame(self, coin_id: str, vs: str = "usd") -> pd.DataFrame:
+        """Points natifs (index ts, colonnes price/market_cap/volume en float64)."""
+        arrays = self.load(coin_id, vs) or {"ts": np.empty(0, np.int64), **{f: np.empty(0) for f in FIELDS}}
+        idx = pd.DatetimeIndex(arrays["ts"].astype("datetime64[ms]"), name="ts").as_unit("ns")
+        return pd.DataFrame({f: arrays[f].astype(float) for f in FIELDS}, index=idx)
+
+    def resample(self, coin_id: str, vs: str = "usd", rule: str = "1h", how: str = "ohlc",
+                 fill: bool = False) -> pd.DataFrame:
+        """Agrégation à la demande (cf. downsample), recalculée seulement si le fichier a changé."""
+        path = self.path(coin_id, vs)
+        key = (str(path), rule, how, fill)
+        version = self._version(path)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == version:
+                self._cache.move_to_end(key)
+                return hit[1].copy()
+        arrays = self.load(coin_id, vs) or {"ts": np.empty(0, np.int64), **{f: np.empty(0) for f in FIELDS}}
+        df = downsample(arrays, rule, how, fill)
+        with self._lock:
+            self._cache[key] = (version, df)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return df.copy()
+
+    def price_series(self, coin_id: str, vs: str = "usd", rule: Optional[str] = None) -> pd.Series:
+        """Prix natif (rule=None) ou close par bucket, NaN retirés, pour une jointure as-of."""
+        if rule is None:
+            s = self.frame(coin_id, vs)["price"]
+        else:
+            s = self.resample(coin_id, vs, rule, "ohlc")["close"].rename("price")
+        return s.dropna()
+
+
+__all__ = ["PriceStore", "merge_points", "downsample", "FIELDS", "HOW"]
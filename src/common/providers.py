@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+providers.py
+
+Sources de données interchangeables, choisies par run (--provider ou variables
+d'environnement MARKET_PROVIDER / TRANSFER_PROVIDER) :
+
+Marché (séries quotidiennes price / market_cap / volume, index = dates) :
+  - live    : cache local + CoinGecko (common.market, TTL et complément) ;
+  - cache   : cache local data/cache_<coin>_<vs>_<days>d.csv uniquement, jamais de réseau ;
+  - fixture : fichiers <root>/<coin>_<vs>.csv s'ils existent, sinon série
+              synthétique déterministe (graine + id du coin), facteur de marché
+              commun pour des corrélations réalistes.
+
+Transferts (réponses JSON au format Etherscan, mêmes paramètres module/action) :
+  - live    : API Etherscan (ETHERSCAN_API_BASE), réponses enregistrées sous
+              ETHERSCAN_CACHE_DIR (data/etherscan_cache, "" pour désactiver) ;
+  - cache   : rejoue ces réponses enregistrées, jamais de réseau ;
+  - fixture : transferts synthétiques déterministes par (adresse, contrat),
+              paginés et triés comme l'API, blocs ↔ temps à 12 s par bloc.
+
+Avec fixture, la chaîne complète tourne hors ligne et à l'identique d'un run à
+l'autre (benchmarks, tests de bout en bout).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+MARKET_PROVIDERS = ("live", "cache", "fixture")
+TRANSFER_PROVIDERS = ("live", "cache", "fixture")
+
+# date de fin des séries fixture (fixe : les sorties ne dépendent pas du jour du run)
+FIXTURE_END_DATE = os.getenv("FIXTURE_END_DATE", "2025-06-30")
+
+
+class ProviderError(RuntimeError):
+    """Donnée indisponible pour ce provider (cache absent, réponse non enregistrée...)."""
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(str(p).lower() for p in parts).encode("utf-8"))
+
+
+# -----------------------------------------------------------------------------
+# Marché
+# -----------------------------------------------------------------------------
+class MarketProvider(ABC):
+    name = ""
+    network = False
+
+    @abstractmethod
+    def market_chart(self, coin: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+        """Série quotidienne price / market_cap / volume (index = dates)."""
+
+    def market_charts(self, coins: Iterable[str], vs: str = "usd", days: int = 400,
+                      errors: str = "raise") -> Dict[str, pd.DataFrame]:
+        """{nom donné: DataFrame} ; errors="skip" : actifs en échec absents (warning)."""
+        from .market import _run_batch
+        return _run_batch(lambda c: self.market_chart(c, vs=vs, days=days), coins,
+                          workers=8 if self.network else 1, errors=errors)
+
+
+class LiveMarket(MarketProvider):
+    """CoinGecko ; cache=True : cache local avec TTL / complément (load_or_fetch_coin)."""
+    name = "live"
+    network = True
+
+    def __init__(self, cache: bool = True, force_refresh: bool = False, ttl_hours: Optional[float] = None):
+        self.cache = cache
+        self.force_refresh = force_refresh
+        self.ttl_hours = ttl_hours
+
+    def market_chart(self, coin: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+        from . import market
+        if not self.cache:
+            return market.cg_market_chart_range(coin, vs=vs, days=days)
+        return market.load_or_fetch_coin(coin, vs=vs, days=days, force_refresh=self.force_refresh,
+                                         ttl_hours=self.ttl_hours)
+
+
+class CacheMarket(MarketProvider):
+    """Cache local seul (quel que soit son âge)."""
+    name = "cache"
+
+    def market_chart(self, coin: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+        from .market import _cache_path, _read_cache, resolve_coin_id
+        resolved = resolve_coin_id(coin)
+        fname = _cache_path(resolved, vs, days)
+        df = _read_cache(fname, resolved)
+        if df is None:
+            raise ProviderError(f"cache absent: {fname}")
+        return df
+
+
+class FixtureMarket(MarketProvider):
+    """Série quotidienne déterministe de days + 1 points se terminant à FIXTURE_END_DATE."""
+    name = "fixture"
+
+    # niveau de départ indicatif ; les autres coins partent de 10^U(-1, 2)
+    _START = {"bitcoin": 60000.0, "ethereum": 3000.0, "livepeer": 8.0}
+
+    def __init__(self, seed: int = 0, root: Optional[str] = None, end: Optional[str] = None):
+        self.seed = int(seed)
+        self.root = Path(root) if root else None
+        self.end = pd.Timestamp(end or FIXTURE_END_DATE).normalize()
+
+    def market_chart(self, coin: str, vs: str = "usd", days: int = 400) -> pd.DataFrame:
+        from .market import resolve_coin_id
+        resolved = resolve_coin_id(coin)
+        if self.root is not None:
+            path = self.root / f"{resolved}_{vs}.csv"
+            if path.exists():
+                df = pd.read_csv(path, index_col=0)
+                df.index = pd.to_datetime(df.index)
+                return df.sort_index().iloc[-(days + 1):]
+        return self._synthetic(resolved, days)
+
+    def _synthetic(self, resolved: str, days: int) -> pd.DataFrame:
+        idx = pd.date_range(end=self.end, periods=days + 1, freq="D", name="ts")
+        common_f = np.random.default_rng(self.seed).normal(0.0, 0.03, len(idx))     # facteur de marché
+        rng = np.random.default_rng([self.seed, _seed(resolved)])
+        beta = rng.uniform(0.6, 1.4)
+        r = beta * common_f + rng.normal(0.0, 0.02, len(idx))
+        r[0] = 0.0
+        p0 = self._START.get(resolved, 10 ** rng.uniform(-1, 2))
+        price = p0 * np.exp(np.cumsum(r))
+        supply = 10 ** rng.uniform(7, 9)
+        volume = price * supply * 0.02 * np.exp(rng.normal(0.0, 0.3, len(idx)))
+        return pd.DataFrame({"price": price, "market_cap": price * supply, "volume": volume}, index=idx)
+
+
+def market_provider(name: Optional[str] = None, **kwargs) -> MarketProvider:
+    """Provider de marché par nom (défaut : MARKET_PROVIDER, sinon live)."""
+    name = (name or os.getenv("MARKET_PROVIDER", "live") or "live").lower()
+    if name == "live":
+        return LiveMarket(**kwargs)
+    if name == "cache":
+        return CacheMarket()
+    if name == "fixture":
+        return FixtureMarket(**kwargs)
+    raise ValueError(f"provider de marché inconnu: {name} (choix: {', '.join(MARKET_PROVIDERS)})")
+
+
+# -----------------------------------------------------------------------------
+# Transferts (format Etherscan)
+# -----------------------------------------------------------------------------
+ETHERSCAN_API = os.getenv("ETHERSCAN_API_BASE", "https://api.etherscan.io/api")
+_ETHERSCAN_CACHE_DIR = os.getenv("ETHERSCAN_CACHE_DIR", os.path.join("data", "etherscan_cache"))
+
+
+def _response_key(params: dict) -> str:
+    """Clé d'une requête : paramètres triés, sans la clé d'API."""
+    items = sorted((k, str(v)) for k, v in params.items() if k != "apikey")
+    return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()
+
+
+def _no_data(js: dict) -> bool:
+    return js.get("status") == "0" and str(js.get("message", "")).startswith("No transactions")
+
+
+class TransferProvider(ABC):
+    name = ""
+    network = False
+
+    @abstractmethod
+    def query(self, params: dict, timeout: float = 30) -> dict:
+        """Une requête module/action Etherscan -> JSON {"status", "message", "result"}."""
+
+
+class LiveTransfers(TransferProvider):
+    name = "live"
+    network = True
+
+    def __init__(self, api_key: str, session=None, base: Optional[str] = None,
+                 record_dir: Optional[str] = _ETHERSCAN_CACHE_DIR):
+        self.api_key = api_key
+        self.session = session
+        self.base = base or ETHERSCAN_API
+        self.record_dir = Path(record_dir) if record_dir else None
+
+    def query(self, params: dict, timeout: float = 30) -> dict:
+        import requests
+        r = (self.session or requests).get(self.base, params={**params, "apikey": self.api_key}, timeout=timeout)
+        r.raise_for_status()
+        js = r.json()
+        # réponses utiles seulement (données ou fin de pagination), pas les erreurs / rate-limits
+        if self.record_dir is not None and (js.get("status") == "1" or _no_data(js)):
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+            path = self.record_dir / f"{_response_key(params)}.json"
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(json.dumps(js), encoding="utf-8")
+            os.replace(tmp, path)
+        return js
+
+
+class CacheTransfers(TransferProvider):
+    """Rejoue les réponses enregistrées par LiveTransfers ; réponse absente = ProviderError."""
+    name = "cache"
+
+    def __init__(self, record_dir: Optional[str] = None):
+        self.record_dir = Path(record_dir or _ETHERSCAN_CACHE_DIR or os.path.join("data", "etherscan_cache"))
+
+    def query(self, params: dict, timeout: float = 30) -> dict:
+        path = self.record_dir / f"{_response_key(params)}.json"
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        raise ProviderError(f"réponse non enregistrée ({params.get('module')}/{params.get('action')}) dans {self.record_dir}")
+
+
+# repère bloc <-> temps des fixtures (12 s par bloc)
+_ANCHOR_BLOCK, _ANCHOR_TS, _BLOCK_TIME = 22_000_000, 1_744_000_000, 12
+
+
+class FixtureTransfers(TransferProvider):
+    """Transferts synthétiques : ~tx_per_day par (adresse, contrat), montants log-normaux, 18 décimales."""
+    name = "fixture"
+
+    def __init__(self, seed: int = 0, tx_per_day: float = 40.0, end: Optional[str] = None):
+        self.seed = int(seed)
+        self.tx_per_day = float(tx_per_day)
+        end_ts = int((pd.Timestamp(end or FIXTURE_END_DATE) + pd.Timedelta(days=1)).timestamp()) - 1
+        self.end_block = self._block(end_ts, "before")
+
+    @staticmethod
+    def _block(ts: int, closest: str) -> int:
+        q, rem = divmod(int(ts) - _ANCHOR_TS, _BLOCK_TIME)
+        return _ANCHOR_BLOCK + q + (1 if closest == "after" and rem else 0)
+
+    def query(self, params: dict, timeout: float = 30) -> dict:
+        action = params.get("action")
+        if action == "getblocknobytime":
+            return {"status": "1", "message": "OK",
+                    "result": str(self._block(int(params["timestamp"]), params.get("closest", "before")))}
+        if action != "tokentx":
+            raise ProviderError(f"action non simulée: {action}")
+        end = int(params.get("endblock", self.end_block))
+        start = int(params.get("startblock", end - 30 * 86400 // _BLOCK_TIME))
+        rows = _fixture_transfers(self.seed, str(params["address"]).lower(),
+                                  str(params.get("contractaddress", "")).lower(), start, end, self.tx_per_day)
+        if params.get("sort", "asc") == "desc":
+            rows = rows[::-1]
+        page, offset = int(params.get("page", 1)), int(params.get("offset", 1000))
+        batch = rows[(page - 1) * offset: page * offset]
+        if not batch:
+            return {"status": "0", "message": "No transactions found", "result": []}
+        return {"status": "1", "message": "OK", "result": [dict(row) for row in batch]}
+
+
+@lru_cache(maxsize=64)
+def _fixture_transfers(seed: int, address: str, contract: str, start: int, end: int,
+                       tx_per_day: float) -> tuple:
+    if end < start:
+        return ()
+    rng = np.random.default_rng([seed, _seed(address, contract)])
+    n = int(rng.poisson(tx_per_day * (end - start + 1) * _BLOCK_TIME / 86400))
+    blocks = np.sort(rng.integers(start, end + 1, n))
+    peers = [f"0x{rng.bytes(20).hex()}" for _ in range(32)]
+    inbound = rng.random(n) < 0.5
+    peer = rng.integers(0, len(peers), n)
+    amount = np.exp(rng.normal(np.log(500.0), 1.5, n))
+    rows = []
+    for i in range(n):
+        b = int(blocks[i])
+        other = peers[peer[i]]
+        rows.append({
+            "blockNumber": str(b),
+            "timeStamp": str(_ANCHOR_TS + (b - _ANCHOR_BLOCK) * _BLOCK_TIME),
+            "hash": f"0x{rng.bytes(32).hex()}",
+            "from": other if inbound[i] else address,
+            "to": address if inbound[i] else other,
+            "value": str(int(amount[i] * 1e6) * 10 ** 12),
+            "contractAddress": contract,
+            "tokenDecimal": "18",
+        })
+    return tuple(rows)
+
+
+def transfer_provider(name: Optional[str] = None, **kwargs) -> TransferProvider:
+    """Provider de transferts par nom (défaut : TRANSFER_PROVIDER, sinon live)."""
+    name = (name or os.getenv("TRANSFER_PROVIDER", "live") or "live").lower()
+    if name == "live":
+        return LiveTransfers(**kwargs)
+    if name == "cache":
+        return CacheTransfers(**kwargs)
+    if name == "fixture":
+        return FixtureTransfers(**kwargs)
+    raise ValueError(f"provider de transferts inconnu: {name} (choix: {', '.join(TRANSFER_PROVIDERS)})")
+
+
+__all__ = [
+    "MARKET_PROVIDERS", "TRANSFER_PROVIDERS", "ProviderError",
+    "MarketProvider", "LiveMarket", "CacheMarket", "FixtureMarket", "market_provider",
+    "TransferProvider", "LiveTransfers", "CacheTransfers", "FixtureTransfers", "transfer_provider",
+]
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+rolling.py
+
+Noyau NumPy de statistiques glissantes (moyenne, écart-type, z-score) pour un
+ensemble de fenêtres sur un tableau 2-D (temps x séries), par sommes cumulées
+internes à des blocs de w lignes (cf. _moments) : O(T x S) par fenêtre, toutes
+les séries d'un coup, précision indépendante de l'historique (changement de
+niveau, grandes valeurs).
+
+Détecteur robuste (médiane / MAD glissantes) : toutes les fenêtres de toutes
+les séries vues d'un coup (sliding_window_view), triées par blocs de lignes
+(np.sort vectorisé), médiane puis MAD par un second tri des distances :
+O(T x S x w log w) en C, boucle Python par bloc de lignes seulement (le suivi
+incrémental O(log w) par point est celui de common.streaming). MAD_SCALE et
+DETECTORS viennent de common.streaming (mêmes détecteurs, mêmes conventions).
+
+Conventions (alignées sur pandas .rolling) :
+  - la fenêtre se termine sur le point courant (inclus) ;
+  - les NaN sont ignorés, min_periods porte sur le nombre de points valides ;
+  - min_periods=None -> égal à la fenêtre ; un callable reçoit la fenêtre
+    (ex: lambda w: max(3, w // 2), règle des scripts d'anomalies) ;
+  - zero_std : traitement d'un écart-type nul
+        "nan"  -> z = NaN
+        "zero" -> z = 0
+        "inf"  -> division brute (±inf, NaN si x == moyenne), comme pandas ;
+  - groups : pour x 1-D, codes de groupe contigus (table longue triée par
+    groupe puis date) -> équivalent d'un groupby().rolling() : les fenêtres
+    ne franchissent pas les frontières de groupe, sans boucle par groupe.
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+
+from .streaming import DETECTORS, MAD_SCALE
+
+MinPeriods = Union[None, int, Callable[[int], int]]
+
+# variance relative en dessous de laquelle la fenêtre est considérée constante
+_ZERO_VAR_RTOL = 1e-12
+
+
+def _as_2d(x) -> Tuple[np.ndarray, bool]:
+    arr = np.asarray(x, dtype=float)
+    if arr.ndim == 1:
+        return arr[:, None], True
+    if arr.ndim != 2:
+        raise ValueError("x doit être 1-D (temps) ou 2-D (temps x séries)")
+    return arr, False
+
+
+def _windows(windows) -> Tuple[np.ndarray, bool]:
+    scalar = np.isscalar(windows)
+    w = np.atleast_1d(np.asarray(windows, dtype=np.int64))
+    if np.any(w < 1):
+        raise ValueError("les fenêtres doivent être >= 1")
+    return w, scalar
+
+
+def _min_periods(min_periods: MinPeriods, w: np.ndarray) -> np.ndarray:
+    if min_periods is None:
+        return w.copy()
+    if callable(min_periods):
+        return np.asarray([int(min_periods(int(v))) for v in w], dtype=np.int64)
+    return np.full(len(w), int(min_periods), dtype=np.int64)
+
+
+def _group_bounds(groups, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Codes de groupe contigus -> (segment 0..G-1, indice de début du segment) par ligne."""
+    g = np.asarray(groups)
+    if g.shape != (n,):
+        raise ValueError("groups doit être 1-D, de même longueur que x")
+    brk = np.ones(n, dtype=bool)
+    if n:
+        brk[1:] = g[1:] != g[:-1]
+    starts = np.flatnonzero(brk)
+    if len(starts) != len(np.unique(g)):
+        raise ValueError("groups doit être contigu (trier la table par groupe puis par date)")
+    seg = np.cumsum(brk) - 1
+    return seg, starts[seg]
+
+
+def _shape_out(a: np.ndarray, scalar_w: bool, one_d: bool) -> np.ndarray:
+    if one_d:
+        a = a[..., 0]
+    if scalar_w:
+        a = a[0]
+    return a
+
+
+def _chunks(t: int, w: int, gstart: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Blocs de w lignes alignés sur le début de la série (ou de chaque groupe) -> (bloc, rang, nb blocs)."""
+    pos = np.arange(t) if gstart is None else np.arange(t) - gstart
+    off = pos % w
+    k = np.cumsum(off == 0) - 1
+    return k, off, (int(k[-1]) + 1 if t else 0)
+
+
+def _chunk_cumsum(d: np.ndarray, k: np.ndarray, off: np.ndarray, nk: int, w: int,
+                  reverse: bool = False) -> np.ndarray:
+    """Somme cumulée de d à l'intérieur de chaque bloc (depuis son début, ou jusqu'à sa fin si reverse)."""
+    buf = np.zeros((nk, w) + d.shape[1:])
+    buf[k, off] = d
+    c = np.cumsum(buf[:, ::-1], axis=1)[:, ::-1] if reverse else np.cumsum(buf, axis=1)
+    return c[k, off]
+
+
+def _chunk_refs(x2d: np.ndarray, valid: np.ndarray, k: np.ndarray, off: np.ndarray, nk: int,
+                w: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Première et dernière valeur valide du bloc de chaque ligne (0 si aucune), forme de x2d."""
+    vb = np.zeros((nk, w) + x2d.shape[1:], dtype=bool)
+    xb = np.zeros((nk, w) + x2d.shape[1:])
+    vb[k, off] = valid
+    xb[k, off] = np.where(valid, x2d, 0.0)
+    first = np.argmax(vb, axis=1)[:, None]
+    last = (w - 1 - np.argmax(vb[:, ::-1], axis=1))[:, None]
+    return np.take_along_axis(xb, first, axis=1)[:, 0][k], np.take_along_axis(xb, last, axis=1)[:, 0][k]
+
+
+def _moments(x2d: np.ndarray, w: np.ndarray, minp: np.ndarray, ddof: int, groups=None):
+    """
+    Renvoie (mean, var, zero) de forme (W, T, S). groups : (seg, start) cf. _group_bounds.
+
+    Pour chaque fenêtre w, le temps est découpé en blocs de w lignes : une fenêtre
+    [t - w + 1, t] est la fin d'un bloc (suffixe) + le début du suivant (préfixe).
+    Sommes cumulées de préfixe / suffixe internes à chaque bloc, centrées sur la
+    première / dernière valeur valide du bloc (un point de la partie sommée), puis
+    combinaison des deux parties (n, moyenne, M2) par la formule de Chan : aucune
+    somme ne traîne l'historique, un changement de niveau ne dégrade pas les
+    fenêtres suivantes.
+    """
+    t, n_series = x2d.shape
+    valid = ~np.isnan(x2d)
+    v = valid.astype(float)
+    gstart = None if groups is None else groups[1]
+    rows = np.arange(t)
+    lo = np.zeros(t, dtype=np.int64) if gstart is None else gstart
+    tiny = np.finfo(float).tiny
+
+    mean = np.empty((len(w), t, n_series))
+    var = np.empty((len(w), t, n_series))
+    zero = np.empty((len(w), t, n_series), dtype=bool)
+    for i, wi in enumerate(int(x) for x in w):
+        k, off, nk = _chunks(t, wi, gstart)
+        rf, rl = _chunk_refs(x2d, valid, k, off, nk, wi)
+        da = np.where(valid, x2d - rf, 0.0)
+        db = np.where(valid, x2d - rl, 0.0)
+        na, a1, a2 = (_chunk_cumsum(q, k, off, nk, wi) for q in (v, da, da * da))
+        # début de fenêtre ; s'il précède le bloc de t, la partie suffixe [s, fin du bloc précédent] s'ajoute
+        s = np.maximum(rows - wi + 1, lo)
+        two = (s < rows - off)[:, None]
+        nb, b1, b2 = (np.where(two, _chunk_cumsum(q, k, off, nk, wi, reverse=True)[s], 0.0)
+                      for q in (v, db, db * db))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ma = rf + a1 / np.maximum(na, 1.0)
+            mb = rl[s] + b1 / np.maximum(nb, 1.0)
+            m2a = np.maximum(a2 - a1 * a1 / np.maximum(na, 1.0), 0.0)
+            m2b = np.maximum(b2 - b1 * b1 / np.maximum(nb, 1.0), 0.0)
+            n = na + nb
+            both = (na > 0) & (nb > 0)
+            delta = np.where(both, mb - ma, 0.0)
+            cross = delta * delta * na * nb / np.maximum(n, 1.0)
+            mu = np.where(na > 0, ma, mb) + np.where(both, delta * nb / np.maximum(n, 1.0), 0.0)
+            m2 = m2a + m2b + cross
+            z = m2 <= _ZERO_VAR_RTOL * np.maximum(a2 + b2 + cross, tiny)
+            vi = np.where(z, 0.0, m2) / (n - ddof)
+
+        ok = (n >= minp[i]) & (n > 0)
+        mean[i] = np.where(ok, mu, np.nan)
+        var[i] = np.where(ok & (n - ddof > 0), vi, np.nan)
+        zero[i] = z & ok
+    return mean, var, zero
+
+
+def _groups_arg(groups, x2d: np.ndarray, one_d: bool):
+    if groups is None:
+        return None
+    if not one_d:
+        raise ValueError("groups n'est accepté que pour x 1-D (table longue)")
+    return _group_bounds(groups, x2d.shape[0])
+
+
+def rolling_mean_std(x, windows, min_periods: MinPeriods = None, ddof: int = 0, groups=None):
+    """
+    Moyenne et écart-type glissants pour chaque fenêtre.
+    x : (T,) ou (T, S) ; windows : int ou séquence d'int.
+    Renvoie (mean, std) de forme ([W,] T[, S]).
+    """
+    x2d, one_d = _as_2d(x)
+    w, scalar_w = _windows(windows)
+    mean, var, _ = _moments(x2d, w, _min_periods(min_periods, w), ddof, _groups_arg(groups, x2d, one_d))
+    std = np.sqrt(var)
+    return _shape_out(mean, scalar_w, one_d), _shape_out(std, scalar_w, one_d)
+
+
+def rolling_zscore(x, windows, min_periods: MinPeriods = None, ddof: int = 0,
+                   zero_std: str = "nan", return_stats: bool = False, groups=None):
+    """
+    z = (x - moyenne glissante) / écart-type glissant, pour toutes les fenêtres
+    en une passe. Renvoie z de forme ([W,] T[, S]) ou (z, mean, std) si return_stats.
+    """
+    if zero_std not in ("nan", "zero", "inf"):
+        raise ValueError("zero_std doit valoir 'nan', 'zero' ou 'inf'")
+    x2d, one_d = _as_2d(x)
+    w, scalar_w = _windows(windows)
+    mean, var, zero = _moments(x2d, w, _min_periods(min_periods, w), ddof, _groups_arg(groups, x2d, one_d))
+    std = np.sqrt(var)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (x2d[None] - mean) / std
+    if zero_std == "nan":
+        z = np.where(zero, np.nan, z)
+    elif zero_std == "zero":
+        z = np.where(zero & ~np.isnan(x2d)[None], 0.0, z)
+
+    z = _shape_out(z, scalar_w, one_d)
+    if return_stats:
+        return z, _shape_out(mean, scalar_w, one_d), _shape_out(std, scalar_w, one_d)
+    return z
+
+
+# -----------------------------------------------------------------------------
+# Médiane / MAD glissantes
+# -----------------------------------------------------------------------------
+# éléments (lignes x séries x w) triés par bloc : borne la mémoire des fenêtres copiées
+_MEDIAN_BLOCK = 1 << 22
+
+
+def rolling_median_mad(x, window: int, min_periods: MinPeriods = None, groups=None):
+    """
+    Médiane et MAD_SCALE * MAD glissantes (NaN ignorés). x : (T,) ou (T, S).
+    Renvoie (median, scale) de même forme que x. Fenêtres vues par
+    sliding_window_view et triées par blocs de lignes (np.sort vectorisé, deux tris
+    par bloc : valeurs puis distances à la médiane) : O(T * S * w log w) en C,
+    mémoire bornée par _MEDIAN_BLOCK, boucle Python par bloc et non par pas de temps.
+    Avec groups, les cases d'une fenêtre antérieures au début du groupe sont
+    ignorées (comme les NaN) : pas de matrice dense groupes x longueur.
+    """
+    x2d, one_d = _as_2d(x)
+    gb = _groups_arg(groups, x2d, one_d)
+    gstart = gb[1] if gb is not None else None
+    w = int(window)
+    if w < 1:
+        raise ValueError("la fenêtre doit être >= 1")
+    minp = max(int(_min_periods(min_periods, np.asarray([w]))[0]), 1)
+    t_len, n_s = x2d.shape
+    med_out = np.full(x2d.shape, np.nan)
+    mad_out = np.full(x2d.shape, np.nan)
+    if t_len == 0 or n_s == 0:
+        return (med_out[:, 0], mad_out[:, 0]) if one_d else (med_out, mad_out)
+
+    # NaN et cases hors série / hors groupe = +inf : rangées en fin de fenêtre triée
+    valid = ~np.isnan(x2d)
+    padded = np.concatenate([np.full((w - 1, n_s), np.inf), np.where(valid, x2d, np.inf)])
+    # points valides par fenêtre (sommes cumulées, fenêtre coupée au début du groupe)
+    cs = np.concatenate([np.zeros((1, n_s), dtype=np.int64), np.cumsum(valid, axis=0)])
+    t_idx = np.arange(t_len)
+    begin = np.maximum(t_idx - w + 1, 0 if gstart is None else gstart)
+    count = cs[t_idx + 1] - cs[begin]
+    view = np.lib.stride_tricks.sliding_window_view(padded, w, axis=0)      # (T, S, w)
+    slot = np.arange(w)
+    step = max(1, _MEDIAN_BLOCK // (n_s * w))
+    for a in range(0, t_len, step):
+        b = min(a + step, t_len)
+        win = view[a:b]
+        if gstart is not None:
+            first = gstart[a:b] - (np.arange(a, b) - w + 1)             # 1re case dans le groupe
+            win = np.where(slot[None, None, :] < first[:, None, None], np.inf, win)
+        win = np.sort(win, axis=2)
+        cnt = count[a:b]
+        c = np.maximum(cnt, 1)
+        lo_k, hi_k = ((c - 1) // 2)[..., None], (c // 2)[..., None]
+        med = 0.5 * (np.take_along_axis(win, lo_k, 2) + np.take_along_axis(win, hi_k, 2))
+        # |v - med| : cases libres à +inf, toujours après les cnt distances valides
+        with np.errstate(invalid="ignore"):
+            np.subtract(win, med, out=win)
+        dist = np.sort(np.abs(win, out=win), axis=2)
+        mad = 0.5 * (np.take_along_axis(dist, lo_k, 2) + np.take_along_axis(dist, hi_k, 2))
+        ok = cnt >= minp
+        med_out[a:b] = np.where(ok, med[..., 0], np.nan)
+        mad_out[a:b] = np.where(ok, MAD_SCALE * mad[..., 0], np.nan)
+
+    if one_d:
+        return med_out[:, 0], mad_out[:, 0]
+    return med_out, mad_out
+
+
+def rolling_robust_zscore(x, window: int, min_periods: MinPeriods = None,
+                          zero_std: str = "nan", return_stats: bool = False, groups=None):
+    """
+    z robuste = (x - médiane glissante) / (MAD_SCALE * MAD glissante).
+    Mêmes options que rolling_zscore (zero_std s'applique à une MAD nulle).
+    """
+    if zero_std not in ("nan", "zero", "inf"):
+        raise ValueError("zero_std doit valoir 'nan', 'zero' ou 'inf'")
+    x2d, one_d = _as_2d(x)
+    med, scale = rolling_median_mad(x2d[:, 0] if one_d else x2d, window, min_periods, groups)
+    if one_d:
+        med, scale = med[:, None], scale[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (x2d - med) / scale
+    zero = scale == 0
+    if zero_std == "nan":
+        z = np.where(zero, np.nan, z)
+    elif zero_std == "zero":
+        z = np.where(zero & ~np.isnan(x2d), 0.0, z)
+    if one_d:
+        z, med, scale = z[:, 0], med[:, 0], scale[:, 0]
+    if return_stats:
+        return z, med, scale
+    return z
+
+
+# -----------------------------------------------------------------------------
+# Sélection du détecteur (option --detector des scripts et de l'agent ;
+# DETECTORS : noms -> détecteurs en flux, cf. common.streaming)
+# -----------------------------------------------------------------------------
+# colonnes (centre, échelle) écrites par les scripts selon le détecteur
+DETECTOR_COLUMNS = {"zscore": ("roll_mean", "roll_std"), "mad": ("roll_median", "roll_mad")}
+
+
+def rolling_detector(x, window: int, detector: str = "zscore", min_periods: MinPeriods = None,
+                     zero_std: str = "nan", groups=None):
+    """
+    z glissant selon le détecteur : 'zscore' (moyenne / écart-type, ddof=0) ou
+    'mad' (médiane / MAD normalisée). Renvoie (z, centre, échelle).
+    """
+    if detector == "zscore":
+        return rolling_zscore(x, window, min_periods=min_periods, ddof=0,
+                              zero_std=zero_std, return_stats=True, groups=groups)
+    if detector == "mad":
+        return rolling_robust_zscore(x, window, min_periods=min_periods,
+                                     zero_std=zero_std, return_stats=True, groups=groups)
+    raise ValueError(f"Détecteur inconnu: {detector} (choix: {', '.join(DETECTORS)})")
+
+
+__all__ = [
+    "rolling_mean_std", "rolling_zscore",
+    "MAD_SCALE", "rolling_median_mad", "rolling_robust_zscore",
+    "DETECTORS", "DETECTOR_COLUMNS", "rolling_detector",
+]
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+streaming.py
+
+Statistiques glissantes incrémentales (stdlib uniquement, import quasi nul) :
+chaque nouvelle observation coûte O(1) (moyenne / écart-type) ou O(log w)
+espéré (médiane / MAD : fenêtre triée dans une skiplist indexable, insertion,
+retrait et accès par rang en O(log w), MAD en O(log² w)), l'état complet est
+sérialisable en JSON pour être persisté entre deux exécutions de l'agent.
+Source unique de MAD_SCALE et DETECTORS (repris par common.rolling).
+"""
+from __future__ import annotations
+
+import math
+import random
+from collections import deque
+from typing import List, Optional, Tuple
+
+# MAD -> écart-type équivalent pour une loi normale
+MAD_SCALE = 1.4826
+
+
+def _score(x: float, m: Optional[float], s: Optional[float], min_scale: float
+           ) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """
+    (centre, échelle, z) avec échelle = max(s, min_scale) ; z = None si fenêtre
+    incomplète ou échelle nulle (fenêtre constante, p. ex. MAD nulle d'un groupe
+    peu actif, sans plancher min_scale) : jamais de z infini.
+    """
+    if m is None:
+        return m, s, None
+    scale = max(s, min_scale)
+    if scale > 0:
+        return m, scale, (x - m) / scale
+    return m, scale, None
+
+
+class RollingStats:
+    """
+    Moyenne / écart-type (ddof=0) sur une fenêtre glissante de `win` points,
+    par Welford avec éviction. Mêmes conventions que netflow_agent.roll_mean_std :
+    la fenêtre inclut le point courant, (None, None) tant qu'elle n'est pas pleine.
+    """
+
+    # recalcul exact périodique pour borner la dérive numérique (coût amorti O(1))
+    RESYNC_EVERY = 1024
+
+    def __init__(self, win: int):
+        if win < 1:
+            raise ValueError("win doit être >= 1")
+        self.win = int(win)
+        self.buf: deque = deque(maxlen=self.win)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._since_resync = 0
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    @property
+    def full(self) -> bool:
+        return len(self.buf) == self.win
+
+    def _resync(self) -> None:
+        n = len(self.buf)
+        self.mean = sum(self.buf) / n if n else 0.0
+        self.m2 = sum((v - self.mean) ** 2 for v in self.buf)
+        self._since_resync = 0
+
+    def push(self, x: float) -> Tuple[Optional[float], Optional[float]]:
+        """Ajoute x et renvoie (moyenne, écart-type) de la fenêtre qui se termine en x."""
+        x = float(x)
+        if self.full:
+            old = self.buf[0]
+            self.buf.append(x)
+            delta = x - old
+            old_mean = self.mean
+            self.mean += delta / self.win
+            self.m2 += delta * (x - self.mean + old - old_mean)
+        else:
+            self.buf.append(x)
+            n = len(self.buf)
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+
+        self._since_resync += 1
+        if self._since_resync >= self.RESYNC_EVERY:
+            self._resync()
+
+        if not self.full:
+            return None, None
+        return self.mean, math.sqrt(max(self.m2, 0.0) / self.win)
+
+    def zscore(self, x: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """push(x) puis (moyenne, écart-type, z) ; z = None si fenêtre incomplète ou écart-type nul."""
+        m, s = self.push(x)
+        if m is None or not s:
+            return m, s, None
+        return m, s, (x - m) / s
+
+    def current(self) -> Tuple[Optional[float], Optional[float]]:
+        """(moyenne, écart-type) de la fenêtre actuelle, sans ajout ; (None, None) si incomplète."""
+        if not self.full:
+            return None, None
+        return self.mean, math.sqrt(max(self.m2, 0.0) / self.win)
+
+    def score(self, x: float, min_scale: float = 0.0) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """z de x par rapport à la fenêtre actuelle, sans l'ajouter (point en cours de formation)."""
+        return _score(float(x), *self.current(), min_scale)
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {"win": self.win, "buf": list(self.buf), "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingStats":
+        rs = cls(int(d["win"]))
+        rs.buf.extend(float(v) for v in d.get("buf", [])[-rs.win:])
+        if "mean" in d and "m2" in d:
+            rs.mean, rs.m2 = float(d["mean"]), float(d["m2"])
+        else:
+            rs._resync()
+        return rs
+
+
+def _kth_of_split(s: "_IndexableSkiplist", p: int, med: float, k: int) -> float:
+    """
+    k-ième plus petite (0-based) distance |v - med| dans la suite triée indexable s,
+    coupée en p : à gauche A[i] = med - s[p-1-i], à droite B[j] = s[p+j] - med,
+    toutes deux croissantes -> sélection dans l'union de deux suites triées en
+    O(log w) accès à s.
+    """
+    na, nb = p, len(s) - p
+    lo, hi = max(0, k + 1 - nb), min(k + 1, na)   # i = nb d'éléments pris dans A
+    while lo < hi:
+        i = (lo + hi) // 2
+        j = k + 1 - i                             # et j = k + 1 - i dans B
+        if j > 0 and s[p + j - 1] - med > med - s[p - 1 - i]:   # B[j-1] > A[i]
+            lo = i + 1
+        else:
+            hi = i
+    i = lo
+    j = k + 1 - i
+    a_last = med - s[p - i] if i > 0 else -math.inf   # A[i-1]
+    b_last = s[p + j - 1] - med if j > 0 else -math.inf
+    return max(a_last, b_last)
+
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value: float, levels: int):
+        self.value = value
+        self.next: List[Optional[_Node]] = [None] * levels
+        self.width: List[int] = [1] * levels
+
+
+class _IndexableSkiplist:
+    """
+    Multi-ensemble trié de flottants : insert / remove / s[i] / bisect_left en
+    O(log n) espéré (skiplist dont chaque lien porte le nombre d'éléments qu'il
+    saute). Niveaux tirés par un générateur à graine fixe : structure reproductible.
+    """
+
+    def __init__(self, expected_size: int = 64):
+        self.levels = max(1, int(math.log2(max(expected_size, 2))) + 1)
+        self.size = 0
+        self._tail = _Node(math.inf, 0)
+        self.head = _Node(-math.inf, self.levels)
+        self.head.next = [self._tail] * self.levels
+        self._rng = random.Random(0)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> float:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node, i = self.head, i + 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def bisect_left(self, value: float) -> int:
+        """Nombre d'éléments < value."""
+        node, rank = self.head, 0
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                rank += node.width[level]
+                node = node.next[level]
+        return rank
+
+    def insert(self, value: float) -> None:
+        chain: List[_Node] = [self.head] * self.levels
+        steps = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        height = 1
+        while height < self.levels and self._rng.random() < 0.5:
+            height += 1
+        new = _Node(value, height)
+        passed = 0
+        for level in range(height):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - passed
+            prev.width[level] = passed + 1
+            passed += steps[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value: float) -> None:
+        chain: List[_Node] = [self.head] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+class RollingMedianMAD:
+    """
+    Médiane et MAD glissantes sur `win` points (détecteur robuste) : fenêtre triée
+    dans une skiplist indexable (insertion, retrait, accès par rang en O(log w)
+    espéré), MAD par sélection dans deux demi-fenêtres triées (O(log w) accès,
+    soit O(log² w)). Mêmes conventions que RollingStats ; l'échelle renvoyée est
+    MAD_SCALE * MAD (comparable à un écart-type).
+    """
+
+    def __init__(self, win: int):
+        if win < 1:
+            raise ValueError("win doit être >= 1")
+        self.win = int(win)
+        self.buf: deque = deque(maxlen=self.win)
+        self.sorted = _IndexableSkiplist(self.win)
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    @property
+    def full(self) -> bool:
+        return len(self.buf) == self.win
+
+    def median(self) -> float:
+        s, n = self.sorted, len(self.sorted)
+        return s[n // 2] if n % 2 else 0.5 * (s[n // 2 - 1] + s[n // 2])
+
+    def mad(self) -> float:
+        s, n = self.sorted, len(self.sorted)
+        med = self.median()
+        p = s.bisect_left(med)
+        if n % 2:
+            return _kth_of_split(s, p, med, n // 2)
+        return 0.5 * (_kth_of_split(s, p, med, n // 2 - 1) + _kth_of_split(s, p, med, n // 2))
+
+    def push(self, x: float) -> Tuple[Optional[float], Optional[float]]:
+        """Ajoute x et renvoie (médiane, MAD_SCALE * MAD) de la fenêtre qui se termine en x."""
+        x = float(x)
+        if self.full:
+            self.sorted.remove(self.buf[0])
+        self.buf.append(x)
+        self.sorted.insert(x)
+        if not self.full:
+            return None, None
+        return self.median(), MAD_SCALE * self.mad()
+
+    def zscore(self, x: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """push(x) puis (médiane, échelle, z robuste) ; z = None si fenêtre incomplète ou MAD nulle."""
+        m, s = self.push(x)
+        if m is None or not s:
+            return m, s, None
+        return m, s, (x - m) / s
+
+    def current(self) -> Tuple[Optional[float], Optional[float]]:
+        """(médiane, MAD_SCALE * MAD) de la fenêtre actuelle, sans ajout."""
+        if not self.full:
+            return None, None
+        return self.median(), MAD_SCALE * self.mad()
+
+    def score(self, x: float, min_scale: float = 0.0) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """z robuste de x par rapport à la fenêtre actuelle, sans l'ajouter."""
+        return _score(float(x), *self.current(), min_scale)
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {"win": self.win, "buf": list(self.buf)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingMedianMAD":
+        rm = cls(int(d["win"]))
+        rm.buf.extend(float(v) for v in d.get("buf", [])[-rm.win:])
+        for v in rm.buf:
+            rm.sorted.insert(v)
+        return rm
+
+
+DETECTORS = {"zscore": RollingStats, "mad": RollingMedianMAD}
+
+
+def make_detector(kind: str, win: int):
+    """Instancie le détecteur glissant 'zscore' (moyenne/écart-type) ou 'mad' (médiane/MAD)."""
+    try:
+        return DETECTORS[kind](win)
+    except KeyError:
+        raise ValueError(f"Détecteur inconnu: {kind} (choix: {', '.join(DETECTORS)})") from None
+
+
+__all__ = ["RollingStats", "RollingMedianMAD", "DETECTORS", "make_detector", "MAD_SCALE"]
@@ -1,5 +1,6 @@
 ﻿import pandas as pd
-from src.common.utils import zscore, ema
+from src.common.utils import ema
+from src.common.rolling import rolling_zscore
 
 # ✅ fenêtre réduite à 30 pour séries courtes/factices
 def mask_events(df: pd.DataFrame, col='netflow', z_window=30, z_thresh=2.5, events=None):
@@ -9,7 +10,7 @@ def mask_events(df: pd.DataFrame, col='netflow', z_window=30, z_thresh=2.5, even
         df.index = pd.to_datetime(df.index)
     df = df.sort_index()
 
-    df['z'] = zscore(df[col], window=z_window)
+    df['z'] = rolling_zscore(df[col].to_numpy(dtype=float), z_window, ddof=0, zero_std="inf")
     mask = df['z'].abs() > z_thresh
     if events is not None and len(events) > 0:
         mask = mask | df.index.normalize().isin(pd.to_datetime(events).normalize())
@@ -1,5 +1,6 @@
 ﻿import os
 import argparse
+import logging
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -8,9 +9,10 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-from common.utils import cg_market_chart_range
+from common.correlation import rolling_corr_matrix
+from common.providers import MARKET_PROVIDERS, market_provider
 # helpers ajoutés dans common.utils (vois Option B si tu ne les as pas encore)
-from common.utils import savefig_stable, _ensure_series_for_rolling
+from common.utils import savefig_stable, _ensure_series_for_rolling, rolling_apy
 
 LPT = "livepeer"
 BTC = "bitcoin"
@@ -29,8 +31,7 @@ def plot_apy_30d(lpt_df, out="docs/img/lpt_apy_30d.png"):
     if not _ensure_series_for_rolling(s, 30):
         print("[skip] APY 30d: not enough data")
         return
-    apy30 = s.rolling(30).apply(lambda x: x.prod()-1)
-    apy30 = apy30.dropna()
+    apy30 = rolling_apy(lpt_df["price"], 30).dropna()
     if apy30.empty:
         print("[skip] APY 30d: empty after dropna")
         return
@@ -51,12 +52,12 @@ def plot_corr(lpt, btc, eth, window=30, out="docs/img/lpt_corr_30d.png"):
         print(f"[skip] Corr {window}d: not enough data")
         return
     rets = prices.pct_change().dropna()
-    corr_btc = rets["lpt"].rolling(window).corr(rets["btc"])
-    corr_eth = rets["lpt"].rolling(window).corr(rets["eth"])
+    # matrice glissante (T x 3 x 3) en une passe ; ligne 0 = LPT
+    mat = rolling_corr_matrix(rets.to_numpy(dtype=float), window)
     corr = pd.DataFrame({
-        f"corr_btc_{window}": corr_btc,
-        f"corr_eth_{window}": corr_eth
-    }).dropna()
+        f"corr_btc_{window}": mat[:, 0, 1],
+        f"corr_eth_{window}": mat[:, 0, 2]
+    }, index=rets.index).dropna()
     if corr.empty:
         print(f"[skip] Corr {window}d: empty after dropna")
         return
@@ -66,13 +67,19 @@ def plot_corr(lpt, btc, eth, window=30, out="docs/img/lpt_corr_30d.png"):
     plt.xlabel("ts"); plt.ylabel("corr")
     savefig_stable(out)
 
-def main(days:int=90):
+def main(days:int=90, provider:str="live", seed:int=0):
     os.makedirs("outputs", exist_ok=True)
     os.makedirs("docs/img", exist_ok=True)
 
-    lpt = ensure_daily(cg_market_chart_range(LPT, days=days))
-    btc = ensure_daily(cg_market_chart_range(BTC, days=days))
-    eth = ensure_daily(cg_market_chart_range(ETH, days=days))
+    # un seul lot (live : fetch concurrent sous le budget CoinGecko commun, sans cache)
+    if provider == "live":
+        src = market_provider(provider, cache=False)
+    elif provider == "fixture":
+        src = market_provider(provider, seed=seed)
+    else:
+        src = market_provider(provider)
+    charts = src.market_charts([LPT, BTC, ETH], days=days)
+    lpt, btc, eth = (ensure_daily(charts[c]) for c in (LPT, BTC, ETH))
 
     # sauvegarde core CSV pour debug/analyses
     core = pd.concat([lpt["price"].rename("lpt_price"),
@@ -90,5 +97,8 @@ def main(days:int=90):
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--days", type=int, default=90)
+    ap.add_argument("--provider", choices=MARKET_PROVIDERS, default=os.getenv("MARKET_PROVIDER", "live"))
+    ap.add_argument("--seed", type=int, default=0)
     args = ap.parse_args()
-    main(args.days)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main(args.days, args.provider, args.seed)